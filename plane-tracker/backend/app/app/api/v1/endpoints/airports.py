@@ -1,28 +1,125 @@
-from typing import Annotated
-from fastapi import APIRouter, Query
+from typing import Annotated, AsyncIterator, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+import orjson
 from asyncer import asyncify, create_task_group, syncify
 from app.core.config import settings
 import httpx
-from app.schemas.response_schema import IGetResponseBase, create_response
-from app.core.dependencies import AirportServiceDep
+from app.core.database import async_session
+from app.schemas.response_schema import CursorPageBase, IGetResponseBase, create_response
+from app.core.dependencies import AirportCacheDep, AirportServiceDep, verify_admin
+from app.services.airport_service import AirportService, BBox
+from app.schemas.airport_schema import NearestAirportsBatchRequest
 from app.utils.mappers.airport_mapper import map_airport_from_airportdb
 
 router = APIRouter()
 
 @router.get("/info")
 async def get_airport_info(
-    icao: Annotated[str, Query(description="ICAO code of the airport")],
     airport_service: AirportServiceDep,
+    icao: Annotated[str | None, Query(description="ICAO code of the airport")] = None,
+    iata: Annotated[str | None, Query(description="IATA code of the airport")] = None,
 ) -> IGetResponseBase:
-    airport_data = await airport_service.get_airport_data(icao)
-    print("airport_data:")
-    print(airport_data)
+    if icao:
+        airport_data = await airport_service.get_airport_data(icao)
+    elif iata:
+        airport_data = await airport_service.get_airport_data_by_iata(iata)
+    else:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Either icao or iata is required")
     return create_response(data=airport_data, message="Airport data retrieved successfully")
 
+@router.get("/batch")
+async def get_airports_batch(
+    airport_service: AirportServiceDep,
+    codes: Annotated[
+        list[str],
+        Query(description="ICAO and/or IATA codes, repeated or comma-separated"),
+    ],
+) -> IGetResponseBase:
+    codes = [code for value in codes for code in value.split(",") if code.strip()]
+    if len(codes) > 500:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At most 500 codes per request")
+    airports = await airport_service.get_airports_by_codes(codes)
+    return create_response(data=airports, message="Airports retrieved successfully")
+
+@router.get("/nearest")
+async def get_nearest_airports(
+    airport_service: AirportServiceDep,
+    lat: Annotated[float, Query(ge=-90, le=90, description="Latitude of the point")],
+    lon: Annotated[float, Query(ge=-180, le=180, description="Longitude of the point")],
+    k: Annotated[int, Query(ge=1, le=50, description="Number of airports")] = 5,
+) -> IGetResponseBase:
+    airports = await airport_service.get_nearest_airports(lon, lat, k)
+    return create_response(data=airports, message="Nearest airports retrieved successfully")
+
+@router.get("/within")
+async def get_airports_within(
+    airport_service: AirportServiceDep,
+    lat: Annotated[float, Query(ge=-90, le=90, description="Latitude of the point")],
+    lon: Annotated[float, Query(ge=-180, le=180, description="Longitude of the point")],
+    radius_km: Annotated[float, Query(gt=0, le=1000, description="Search radius in km")],
+    limit: Annotated[int, Query(ge=1, le=1000, description="Maximum number of airports")] = 100,
+) -> IGetResponseBase:
+    airports = await airport_service.get_airports_within(lon, lat, radius_km, limit)
+    return create_response(data=airports, message="Airports within radius retrieved successfully")
+
+@router.post("/nearest/batch")
+async def get_nearest_airports_batch(
+    batch_request: NearestAirportsBatchRequest,
+    airport_service: AirportServiceDep,
+) -> IGetResponseBase:
+    points = [(point.lon, point.lat) for point in batch_request.points]
+    results = await airport_service.get_nearest_airports_batch(points, batch_request.k)
+    return create_response(data=results, message="Nearest airports retrieved successfully")
+
+@router.post("/cache/reload", dependencies=[Depends(verify_admin)])
+async def reload_airport_cache(airport_cache: AirportCacheDep) -> IGetResponseBase:
+    # Only reloads the worker serving this request; the others pick the
+    # change up on their next fingerprint check
+    count = await airport_cache.reload()
+    return create_response(data={"airports": count}, message="Airport cache reloaded")
+
 @router.get("/all")
-async def get_all_airports()->IGetResponseBase:
-    #work in progess
-    pass
+async def get_all_airports(
+    airport_service: AirportServiceDep,
+    size: Annotated[int, Query(ge=1, le=1000, description="Airports per page")] = 100,
+    cursor: Annotated[int | None, Query(ge=0, description="next_cursor of the previous page")] = None,
+    country: Annotated[str | None, Query(description="Country of the airports")] = None,
+    lamin: Annotated[float | None, Query(ge=-90, le=90)] = None,
+    lomin: Annotated[float | None, Query(ge=-180, le=180)] = None,
+    lamax: Annotated[float | None, Query(ge=-90, le=90)] = None,
+    lomax: Annotated[float | None, Query(ge=-180, le=180)] = None,
+    format: Annotated[
+        Literal["json", "ndjson"],
+        Query(description="ndjson streams every matching airport, one per line"),
+    ] = "json",
+) -> IGetResponseBase:
+    bbox_values = (lomin, lamin, lomax, lamax)
+    if all(value is None for value in bbox_values):
+        bbox = None
+    elif any(value is None for value in bbox_values):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A bbox needs lamin, lomin, lamax and lomax")
+    else:
+        bbox = bbox_values
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_airports(country, bbox, cursor), media_type="application/x-ndjson"
+        )
+
+    airports, next_cursor = await airport_service.get_airports_page(size, cursor, country, bbox)
+    page = CursorPageBase(items=airports, size=size, cursor=cursor, next_cursor=next_cursor)
+    return create_response(data=page, message="Airports retrieved successfully")
+
+
+async def _stream_airports(
+    country: Optional[str], bbox: Optional[BBox], after_id: Optional[int]
+) -> AsyncIterator[bytes]:
+    # Own session: the request's one may be closed while the body streams
+    async with async_session() as session:
+        airport_service = AirportService(session)
+        async for batch in airport_service.iter_airport_batches(country, bbox, after_id):
+            yield b"".join(orjson.dumps(airport) + b"\n" for airport in batch)
 
 
 
@@ -1,30 +1,159 @@
-from fastapi import APIRouter, Depends,Query
-from app.schemas.response_schema import IGetResponseBase, create_response
+import asyncio
+import time
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from app.schemas.response_schema import IGetResponseBase, create_fast_response, create_response
 from app.schemas.vector_schema import VectorRequest
-from app.core.dependencies import OskyServiceDep
-from app.utils.mappers.vector_mapper import map_vector_from_osky
+from app.core.config import settings
+from app.core.dependencies import OskyServiceDep, StateVectorPollerDep, StateVectorTileCacheDep, TrackStoreDep, VectorStreamHubDep
+from app.services.vectors.tracks import merge_tracks, trim_track
+from app.utils.exceptions import UpstreamUnavailableException
 from typing import Annotated
 router = APIRouter()
 
-@router.get("/vectors")
-def get_vectors_for_plane() -> IGetResponseBase:
-    return create_response(data=[], message="Vectors retrieved successfully")
 
-@router.get("/vectors/area")
-async def get_vectors_in_area(osky_service: OskyServiceDep, vector_request: VectorRequest = Depends()) -> IGetResponseBase:
-    # The service expects a tuple: (lomin, lamin, lomax, lamax)
-    bbox = (
+def _bbox(vector_request: VectorRequest) -> tuple[float, float, float, float]:
+    # The services expect a tuple: (lomin, lamin, lomax, lamax)
+    return (
         vector_request.lomin,
         vector_request.lamin,
         vector_request.lomax,
         vector_request.lamax,
     )
-    osky_data = await osky_service.get_state_vectors_area(bbox=bbox)
-    mapped_data = map_vector_from_osky(osky_data)
-    return create_response(data=mapped_data.model_dump(), message="Vectors in area retrieved successfully")
+
+@router.get("/vectors")
+def get_vectors_for_plane() -> IGetResponseBase:
+    return create_response(data=[], message="Vectors retrieved successfully")
+
+@router.get("/vectors/area")
+async def get_vectors_in_area(
+    poller: StateVectorPollerDep,
+    tile_cache: StateVectorTileCacheDep,
+    vector_request: Annotated[VectorRequest, Query()],
+) -> IGetResponseBase:
+    bbox = _bbox(vector_request)
+    # Serve from the poller's snapshot while it is fresh enough
+    snapshot = poller.snapshot
+    if snapshot is not None and snapshot.age <= settings.STATE_VECTOR_MAX_AGE:
+        columns = snapshot.in_bbox(bbox)
+        meta = {
+            "source": "snapshot",
+            "stale": False,
+            "snapshot_age": round(snapshot.age, 3),
+            "snapshot_time": snapshot.time,
+        }
+    else:
+        try:
+            area = await tile_cache.get_area(bbox)
+            columns = area.columns
+            meta = {
+                "source": "upstream",
+                "stale": False,
+                "snapshot_age": round(area.age, 3),
+                "snapshot_time": area.time,
+            }
+        except UpstreamUnavailableException:
+            # OpenSky is down: serve the most recent data we still hold
+            area = tile_cache.get_stale_area(bbox)
+            if area is not None and (snapshot is None or area.age < snapshot.age):
+                columns = area.columns
+                meta = {
+                    "source": "tiles",
+                    "stale": True,
+                    "snapshot_age": round(area.age, 3),
+                    "snapshot_time": area.time,
+                }
+            elif snapshot is not None:
+                columns = snapshot.in_bbox(bbox)
+                meta = {
+                    "source": "snapshot",
+                    "stale": True,
+                    "snapshot_age": round(snapshot.age, 3),
+                    "snapshot_time": snapshot.time,
+                }
+            else:
+                raise
+    return create_fast_response(data=columns.to_vectors(), message="Vectors in area retrieved successfully", meta=meta)
+
+
+@router.websocket("/vectors/stream")
+async def stream_vectors_in_area(
+    websocket: WebSocket,
+    hub: VectorStreamHubDep,
+    vector_request: Annotated[VectorRequest, Query()],
+):
+    """
+    Streams the aircraft in a bbox: a {"type": "snapshot"} message first,
+    then {"type": "diff"} messages with added (full records, to upsert),
+    moved (position fields only) and removed (icao24) aircraft after every
+    poll. Sending {"lamin", "lomin", "lamax", "lomax"} moves the bbox and
+    starts over with a new snapshot.
+    """
+    if not settings.STATE_VECTOR_POLL_ENABLED:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="State vector polling is disabled")
+        return
+
+    await websocket.accept()
+    subscriber = hub.subscribe(_bbox(vector_request))
+
+    async def send_updates():
+        while True:
+            await websocket.send_text(await subscriber.queue.get())
+
+    async def receive_bboxes():
+        while True:
+            message = await websocket.receive_text()
+            try:
+                new_request = VectorRequest.model_validate_json(message)
+            except ValidationError as e:
+                await websocket.send_json({"type": "error", "detail": e.errors(include_url=False, include_context=False)})
+                continue
+            hub.update(subscriber, _bbox(new_request))
+
+    tasks = [asyncio.create_task(send_updates()), asyncio.create_task(receive_bboxes())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not isinstance(task.exception(), WebSocketDisconnect):
+                task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        hub.unsubscribe(subscriber)
 
 
 @router.get("/vector")
-async def get_vector_for_plane(icao: Annotated[str, Query(description="ICAO24 for Aircraft")], osky_service: OskyServiceDep) -> IGetResponseBase:
-    response=await osky_service.get_state_vector_from_flight(icao)
-    return create_response(data=response, message="Vector retrieved successfully")
\ No newline at end of file
+async def get_vector_for_plane(
+    icao: Annotated[str, Query(description="ICAO24 for Aircraft")],
+    osky_service: OskyServiceDep,
+    track_store: TrackStoreDep,
+    since: Annotated[int | None, Query(ge=0, description="Unix time the track must reach back to")] = None,
+) -> IGetResponseBase:
+    # Recent positions are held locally; OpenSky is only asked when our
+    # buffers don't reach back far enough: to since or, without since, to
+    # the takeoff of the current flight
+    icao24 = icao.lower()
+    track = track_store.get_track(icao24, since)
+    if track is not None:
+        return create_response(data=track, message="Vector retrieved successfully", meta={"source": "tracks", "stale": False})
+    held = track_store.get_held_track(icao24)
+    try:
+        response=await osky_service.get_state_vector_from_flight(icao)
+    except UpstreamUnavailableException:
+        # OpenSky is down: whatever part of the track we hold beats an error
+        if held is None:
+            raise
+        meta = {"source": "tracks", "stale": True, "data_age": round(time.time() - held["endTime"], 3)}
+        return create_response(data=trim_track(held, since), message="Vector retrieved successfully", meta=meta)
+    # OpenSky returns the whole flight: keep the part asked for, plus the
+    # positions polled after its last one
+    track = merge_tracks(trim_track(response, since), held)
+    return create_response(data=track, message="Vector retrieved successfully", meta={"source": "upstream", "stale": False})
+
+
+@router.get("/upstream/status")
+async def get_upstream_status(osky_service: OskyServiceDep) -> IGetResponseBase:
+    # Credit budget, queue depth per priority, 429 counters and circuit
+    # breaker state of this worker
+    data = {**osky_service.scheduler.stats(), "circuit": osky_service.breaker.stats()}
+    return create_response(data=data, message="Upstream status retrieved successfully")
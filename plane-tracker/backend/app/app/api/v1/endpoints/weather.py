@@ -1,73 +1,73 @@
 from typing import Annotated
 from fastapi import APIRouter, Query
 from asyncer import asyncify, create_task_group, syncify
-from app.core.config import settings
-import httpx
+from app.core.dependencies import WeatherServiceDep
 from app.schemas.response_schema import IGetResponseBase, create_response
+from app.services.weather_service import WeatherService
 
 router = APIRouter()
 
 api_reference: dict[str, str] = {"api_reference": "https://github.com/chubin/wttr.in"}
 
 
-def get_weather_sync(city: str):
+def get_weather_sync(city: str, weather_service: WeatherService):
     """
-    Gets weather by goweather API with sync client
+    Gets weather from a worker thread, through the shared client and cache
     """
-    response = httpx.get(f"{settings.WHEATER_URL}/{city}?format=j1")
-    weather = response.json()
-    weather["city"] = city
-    return weather
+    # Runs the cached lookup on the event loop and waits for it
+    return syncify(weather_service.get_weather)(city)
 
 
-async def get_weather_async(city: str):
+async def get_weather_async(city: str, weather_service: WeatherService):
     """
-    Gets weather by goweather API with async client
+    Gets weather with the shared async client and cache
     """
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{settings.WHEATER_URL}/{city}?format=j1")
-        weather = response.json()
-        weather["city"] = city
-        return weather
+    return await weather_service.get_weather(city)
 
 
-def do_sync_work(city: str):
+def do_sync_work(city: str, weather_service: WeatherService):
     """
     Gets weather by sync work
     """
     # This similar aproach will be used to interface with celery
-    weather = syncify(get_weather_async)(city=city)
+    weather = syncify(get_weather_async)(city=city, weather_service=weather_service)
     return weather
 
 
 @router.get("/weather_sync/sync1")
-async def get_weather_sync_work_by_city(city: str = "Quito") -> IGetResponseBase:
+async def get_weather_sync_work_by_city(
+    weather_service: WeatherServiceDep, city: str = "Quito"
+) -> IGetResponseBase:
     """
     Gets Weather by city using sync work
     """
-    weather = await asyncify(do_sync_work)(city=city)
+    weather = await asyncify(do_sync_work)(city=city, weather_service=weather_service)
     return create_response(
         message=f"Weather in {city}", data=weather, meta=api_reference
     )
 
 
 @router.get("/weather_sync/sync2")
-async def get_weather_sync_client_by_city(city: str = "Quito") -> IGetResponseBase:
+async def get_weather_sync_client_by_city(
+    weather_service: WeatherServiceDep, city: str = "Quito"
+) -> IGetResponseBase:
     """
     Gets Weather by city using sync client
     """
-    weather = await asyncify(get_weather_sync)(city=city)
+    weather = await asyncify(get_weather_sync)(city=city, weather_service=weather_service)
     return create_response(
         message=f"Weather in {city}", data=weather, meta=api_reference
     )
 
 
 @router.get("/weather_async")
-async def get_weather_async_client_by_city(city: str = "Quito") -> IGetResponseBase:
+async def get_weather_async_client_by_city(
+    weather_service: WeatherServiceDep, city: str = "Quito"
+) -> IGetResponseBase:
     """
     Gets Weather by city using async client
     """
-    weather = await get_weather_async(city=city)
+    weather = await get_weather_async(city=city, weather_service=weather_service)
     return create_response(
         message=f"Weather in {city}", data=weather, meta=api_reference
     )
@@ -75,6 +75,7 @@ async def get_weather_async_client_by_city(city: str = "Quito") -> IGetResponseB
 
 @router.get("/weather_async_list/sequencial")
 async def get_weather_async_sequencial_by_cities(
+    weather_service: WeatherServiceDep,
     cities: Annotated[list[str], Query(title="Cities")] = [
         "Quito",
         "Miami",
@@ -87,7 +88,7 @@ async def get_weather_async_sequencial_by_cities(
     """
     weather_list = []
     for city in cities:
-        weather = await get_weather_async(city=city)
+        weather = await get_weather_async(city=city, weather_service=weather_service)
         weather_list.append(weather)
 
     return create_response(
@@ -97,6 +98,7 @@ async def get_weather_async_sequencial_by_cities(
 
 @router.get("/weather_async_list/concurrent")
 async def get_weather_async_concurrent_by_cities(
+    weather_service: WeatherServiceDep,
     cities: Annotated[list[str], Query(title="Cities")] = [
         "Quito",
         "Miami",
@@ -110,7 +112,9 @@ async def get_weather_async_concurrent_by_cities(
     weather_list = [{}] * len(cities)
     async with create_task_group() as task_group:
         for index, city in enumerate(cities):
-            weather_list[index] = task_group.soonify(get_weather_async)(city=city)
+            weather_list[index] = task_group.soonify(get_weather_async)(
+                city=city, weather_service=weather_service
+            )
 
     weather_list = [weather.value for weather in weather_list]
     return create_response(
@@ -0,0 +1,187 @@
+"""
+Bulk load of the airports table from a CSV file.
+
+Usage:
+    python -m app.commands.ingest_airports airports_cleaned.csv [--chunk-size 5000]
+
+The CSV is streamed in chunks into a temporary staging table with COPY and
+merged into `airports` with a single INSERT ... ON CONFLICT (icao) DO
+UPDATE, so running it again with the same file changes nothing. When an
+icao appears more than once, its last row wins. Accepted
+columns: icao, iata, name, country, elevation_ft (or altitude), and either
+latitude/longitude or a location column in (E)WKT, as written by
+db_init/csv_parse.py.
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import asyncpg
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+STAGING_COLUMNS = ("icao", "iata", "name", "country", "elevation_ft", "longitude", "latitude")
+
+CREATE_STAGING_SQL = """
+CREATE TEMPORARY TABLE airports_staging (
+    icao TEXT,
+    iata TEXT,
+    name TEXT,
+    country TEXT,
+    elevation_ft INTEGER,
+    longitude DOUBLE PRECISION,
+    latitude DOUBLE PRECISION,
+    -- File order, filled as COPY appends: the last row of an icao wins
+    line BIGSERIAL
+) ON COMMIT DROP
+"""
+
+# Rows identical to the stored ones are skipped, so re-runs don't rewrite
+# (and bloat) the table. xmax = 0 tells inserted rows from updated ones.
+MERGE_SQL = """
+WITH merged AS (
+    INSERT INTO airports (icao, iata, name, country, elevation_ft, location)
+    SELECT DISTINCT ON (icao)
+        icao, iata, name, country, elevation_ft,
+        CASE WHEN longitude IS NOT NULL AND latitude IS NOT NULL
+            THEN ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+        END
+    FROM airports_staging
+    ORDER BY icao, line DESC
+    ON CONFLICT (icao) DO UPDATE SET
+        iata = EXCLUDED.iata,
+        name = EXCLUDED.name,
+        country = EXCLUDED.country,
+        elevation_ft = EXCLUDED.elevation_ft,
+        location = EXCLUDED.location,
+        updated_at = now()
+    WHERE (airports.iata, airports.name, airports.country, airports.elevation_ft,
+           airports.location::text)
+        IS DISTINCT FROM (EXCLUDED.iata, EXCLUDED.name, EXCLUDED.country,
+                          EXCLUDED.elevation_ft, EXCLUDED.location::text)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    count(*) FILTER (WHERE inserted) AS inserted,
+    count(*) FILTER (WHERE NOT inserted) AS updated
+FROM merged
+"""
+
+_POINT_RE = re.compile(r"POINT\s*\(\s*(\S+)\s+(\S+)\s*\)", re.IGNORECASE)
+
+StagingRow = Tuple[str, Optional[str], str, Optional[str], Optional[int], Optional[float], Optional[float]]
+
+
+def parse_row(row: Dict[str, str]) -> Optional[StagingRow]:
+    """Staging tuple of a CSV row, or None if the row can't be loaded."""
+    icao = (row.get("icao") or "").strip().upper()
+    name = (row.get("name") or "").strip()
+    if len(icao) != 4 or not name:
+        return None
+    iata = (row.get("iata") or "").strip().upper()
+
+    longitude = _float(row.get("longitude"))
+    latitude = _float(row.get("latitude"))
+    if (longitude is None or latitude is None) and row.get("location"):
+        match = _POINT_RE.search(row["location"])
+        if match:
+            longitude, latitude = _float(match.group(1)), _float(match.group(2))
+
+    elevation = _float(row.get("elevation_ft", row.get("altitude")))
+    return (
+        icao,
+        iata if len(iata) == 3 else None,
+        name,
+        (row.get("country") or "").strip() or None,
+        None if elevation is None else int(round(elevation)),
+        longitude,
+        latitude,
+    )
+
+
+def read_chunks(path: str, chunk_size: int, stats: Dict[str, int]) -> Iterator[List[StagingRow]]:
+    """Streams the CSV in chunks of parsed rows; skipped rows are counted in stats."""
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        chunk: List[StagingRow] = []
+        for row in csv.DictReader(csv_file):
+            parsed = parse_row(row)
+            if parsed is None:
+                stats["skipped"] += 1
+                continue
+            chunk.append(parsed)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+async def ingest(path: str, dsn: str, chunk_size: int = 5000) -> Dict[str, Any]:
+    stats = {"read": 0, "skipped": 0, "inserted": 0, "updated": 0}
+    started = time.perf_counter()
+    connection = await asyncpg.connect(dsn)
+    try:
+        async with connection.transaction():
+            await connection.execute(CREATE_STAGING_SQL)
+            for chunk in read_chunks(path, chunk_size, stats):
+                await connection.copy_records_to_table(
+                    "airports_staging", records=chunk, columns=STAGING_COLUMNS
+                )
+                stats["read"] += len(chunk)
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    "staged %d rows (%s rows/s)", stats["read"], f"{stats['read'] / elapsed:,.0f}"
+                )
+            merged = await connection.fetchrow(MERGE_SQL)
+            stats["inserted"], stats["updated"] = merged["inserted"], merged["updated"]
+    finally:
+        await connection.close()
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """asyncpg DSN from the SQLAlchemy DATABASE_URL (drops the +driver part)."""
+    return re.sub(r"^postgresql\+\w+://", "postgresql://", database_url)
+
+
+def _float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load airports from a CSV file.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    stats = asyncio.run(ingest(args.csv_path, asyncpg_dsn(args.database_url), args.chunk_size))
+    logger.info(
+        "%d rows read, %d skipped, %d inserted, %d updated in %ss",
+        stats["read"],
+        stats["skipped"],
+        stats["inserted"],
+        stats["updated"],
+        stats["seconds"],
+    )
+    if stats["inserted"] or stats["updated"]:
+        logger.info(
+            "Running workers reload their airport cache within %gs",
+            settings.AIRPORT_CACHE_CHECK_INTERVAL,
+        )
+
+
+if __name__ == "__main__":
+    main()
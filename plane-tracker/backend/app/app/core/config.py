@@ -1,8 +1,9 @@
 import os
 from pydantic_settings import BaseSettings
-from pydantic import AnyHttpUrl
+from pydantic import AnyHttpUrl, model_validator
 from enum import Enum
 from dotenv import load_dotenv
+from app.services.clients.upstream_scheduler import poll_credits_per_day
 load_dotenv(os.path.expanduser("../../.env"))
 
 class ModeEnum(str, Enum):
@@ -18,12 +19,162 @@ class Settings(BaseSettings, extra='ignore'):
     API_VERSION: str = "v1"
     API_V1_STR: str = f"/api/{API_VERSION}"
     WHEATER_URL: str = "https://wttr.in"
+    WEATHER_TIMEOUT: float = 10.0
+    # Seconds a city's report is fresh, then served stale while it refreshes
+    WEATHER_CACHE_TTL: float = 300.0
+    WEATHER_CACHE_STALE_TTL: float = 3600.0
+    WEATHER_CACHE_MAX_ENTRIES: int = 1024
     AIRPORT_DB_TOKEN: str | None = os.getenv("AIRPORT_DB_TOKEN")
     CLIENT_ID: str | None = os.getenv("CLIENT_ID")
-    SECRET: str | None =os.getenv
+    SECRET: str | None = os.getenv("SECRET")
     DATABASE_URL:str = os.getenv("DATABASE_URL")
+    # Prometheus metrics at /metrics
+    METRICS_ENABLED: bool = True
+    # pyinstrument profiling: ?profile=1 plus X-Admin-Secret returns the
+    # request's profile; PROFILING_SAMPLE_RATE of all requests are written to
+    # PROFILING_DIR, keeping the newest PROFILING_MAX_FILES
+    PROFILING_ENABLED: bool = False
+    PROFILING_INTERVAL: float = 0.001
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_DIR: str = "/tmp/plane-tracker/profiles"
+    PROFILING_MAX_FILES: int = 100
+    # Shared secret for admin endpoints (X-Admin-Secret header); unset disables them
+    ADMIN_SECRET: str | None = os.getenv("ADMIN_SECRET")
+
+    # In-memory copy of the airports table answering /airports lookups
+    AIRPORT_CACHE_ENABLED: bool = True
+    # Seconds between checks for table changes (row count, max id and
+    # max updated_at). Every worker checks on its own, so this bounds how
+    # long an import takes to reach all of them.
+    AIRPORT_CACHE_CHECK_INTERVAL: float = 300.0
+
+    # OpenSky upstream client, shared by every request of a worker
+    OSKY_BASE_URL: str = "https://opensky-network.org/api"
+    OSKY_TOKEN_ENDPOINT: str = "https://auth.opensky-network.org/auth/realms/opensky-network/protocol/openid-connect/token"
+    OSKY_TIMEOUT: float = 10.0
+    OSKY_MAX_CONNECTIONS: int = 20
+    OSKY_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OSKY_KEEPALIVE_EXPIRY: float = 60.0
+    OSKY_HTTP2: bool = False
+    # Where workers share the OAuth token: "memory" (per worker), "file" or "redis"
+    OSKY_TOKEN_STORE: str = "file"
+    OSKY_TOKEN_FILE: str = "/tmp/plane-tracker/osky_token.json"
+    REDIS_URL: str = "redis://redis:6379/0"
+
+    # Upstream scheduler. OpenSky gives an account 4000 credits a day (8000
+    # to feeders), shared by the OSKY_WORKERS processes using it (gunicorn -w).
+    OSKY_DAILY_CREDITS: float = 4000.0
+    OSKY_WORKERS: int = 3
+    # Daily budget of each worker besides the state-vector polls, which go
+    # to the worker polling; None splits what the polls leave of
+    # OSKY_DAILY_CREDITS between the workers and 0 only counts the credits
+    # spent
+    OSKY_CREDITS_PER_DAY: float | None = None
+    # Credits a worker may spend at once, on top of its daily budget
+    OSKY_CREDITS_BURST: float = 100.0
+    # Requests in flight; the rest queue by priority (poller first)
+    OSKY_MAX_CONCURRENT_REQUESTS: int = 8
+    # Seconds a request waits for its turn before failing with 503
+    OSKY_QUEUE_MAX_WAIT: float = 30.0
+    # 429 retries; longer Retry-After waits fail straight away
+    OSKY_MAX_RETRIES: int = 3
+    OSKY_MAX_BACKOFF: float = 60.0
+    # Consecutive upstream failures (network, timeout, 5xx) that open the
+    # circuit, and seconds it stays open before a probe request
+    OSKY_BREAKER_FAILURE_THRESHOLD: int = 5
+    OSKY_BREAKER_RESET_TIMEOUT: float = 30.0
+
+    # Background state-vector poller answering /planes/vectors/area. The
+    # workers sharing STATE_VECTOR_SHARED_DIR (all of them on a host) elect
+    # one to poll; the others read its snapshots from there. A global
+    # states/all poll costs 4 credits, so 120s spends 2880 of the 4000 daily
+    # credits; the rest is split between the workers (OSKY_CREDITS_PER_DAY).
+    # Shorter intervals need smaller STATE_VECTOR_POLL_REGIONS or a feeder
+    # account (OSKY_DAILY_CREDITS=8000 allows 60s).
+    STATE_VECTOR_POLL_ENABLED: bool = True
+    STATE_VECTOR_POLL_INTERVAL: float = 120.0
+    # (lomin, lamin, lomax, lamax) regions to poll; empty polls the whole world
+    STATE_VECTOR_POLL_REGIONS: list[tuple[float, float, float, float]] = []
+    # None makes every worker poll on its own
+    STATE_VECTOR_SHARED_DIR: str | None = "/tmp/plane-tracker/poller"
+    # Older snapshots are ignored and requests go upstream; keep it above
+    # STATE_VECTOR_POLL_INTERVAL so a failed poll doesn't empty the map
+    STATE_VECTOR_MAX_AGE: float = 360.0
+    # Cell size in degrees of the snapshot's spatial grid index
+    STATE_VECTOR_GRID_CELL_DEG: float = 1.0
+
+    # flights/all history: fetched in 2 h chunks, at most this many at once
+    OSKY_FLIGHTS_CONCURRENCY: int = 4
+    # Chunks ending more than OSKY_FLIGHTS_SETTLE_SECONDS ago are considered
+    # final and cached on disk. OpenSky builds flights in a nightly batch,
+    # so an interval can change for up to a day. Only the newest
+    # OSKY_FLIGHTS_CACHE_MAX_FILES chunks are kept (168 = two weeks).
+    OSKY_FLIGHTS_CACHE_DIR: str = "/tmp/plane-tracker/flights"
+    OSKY_FLIGHTS_SETTLE_SECONDS: float = 86400.0
+    OSKY_FLIGHTS_CACHE_MAX_FILES: int = 168
+
+    # Live upstream bbox fetches, snapped to tiles shared between requests
+    OSKY_TILE_DEG: float = 5.0
+    OSKY_TILE_TTL: float = 10.0
+    # Expired tiles are kept this long to be served stale if OpenSky is down
+    OSKY_TILE_STALE_TTL: float = 600.0
+    # Bboxes spanning more tiles are fetched with a single direct call
+    OSKY_TILE_MAX_PER_REQUEST: int = 8
+
+    # Departure/arrival airports joined onto the snapshot from flights/all.
+    # OpenSky fills flights/all in a nightly batch, so routes come from the
+    # flights of FLIGHT_ENRICHMENT_DELAY seconds earlier, matched by
+    # callsign: right for scheduled flights, missing or stale for the rest.
+    # FLIGHT_ENRICHMENT_HOURS_BACK covers the long-haul flights in the air.
+    # Its settled 2h chunks are cached on disk, so a refresh only fetches
+    # the newest one (4 credits, about 150 a day), in the polling worker only
+    FLIGHT_ENRICHMENT_ENABLED: bool = True
+    FLIGHT_ENRICHMENT_INTERVAL: float = 3600.0
+    FLIGHT_ENRICHMENT_HOURS_BACK: float = 16.0
+    FLIGHT_ENRICHMENT_DELAY: float = 86400.0
+
+    # /planes/vectors/stream: diffs are bucketed by tiles of this size
+    STREAM_TILE_DEG: float = 5.0
+    # Pending messages per subscriber before it is resynced with a snapshot
+    STREAM_QUEUE_SIZE: int = 8
+
+    # Hourly Arrow IPC files of every polled snapshot, for analytics and
+    # replay. One worker writes (flock) and deletes the day folders older
+    # than STATE_VECTOR_ARCHIVE_RETENTION_DAYS (0 keeps everything).
+    # Compression: None (default) files are read memory-mapped without
+    # copies; "lz4" or "zstd" make them several times smaller, but every
+    # batch read is decompressed into new buffers.
+    STATE_VECTOR_ARCHIVE_ENABLED: bool = False
+    STATE_VECTOR_ARCHIVE_DIR: str = "/var/lib/plane-tracker/archive"
+    STATE_VECTOR_ARCHIVE_COMPRESSION: str | None = None
+    STATE_VECTOR_ARCHIVE_RETENTION_DAYS: int = 30
+
+    # Track ring buffers answering /planes/vector, fed by the poller. They
+    # grow to fit the aircraft in the snapshots (a global poll reports well
+    # over 10k) up to TRACK_MAX_AIRCRAFT. Memory is about
+    # 21 bytes * points * aircraft (30 MB for 12k aircraft, 126 MB at the cap).
+    TRACK_MAX_AIRCRAFT: int = 50000
+    TRACK_POINTS_PER_AIRCRAFT: int = 120
+    # Seconds without a position before an aircraft's track is dropped
+    TRACK_STALE_AFTER: float = 900.0
+
+    @model_validator(mode="after")
+    def split_daily_credits(self) -> "Settings":
+        if self.OSKY_CREDITS_PER_DAY is None:
+            credits = self.OSKY_DAILY_CREDITS
+            if self.STATE_VECTOR_POLL_ENABLED:
+                polls = poll_credits_per_day(self.STATE_VECTOR_POLL_INTERVAL, self.STATE_VECTOR_POLL_REGIONS)
+                if self.STATE_VECTOR_SHARED_DIR is None:
+                    polls *= max(self.OSKY_WORKERS, 1)
+                if polls >= credits:
+                    raise ValueError(
+                        f"state vector polls spend {polls:.0f} credits a day, "
+                        f"OSKY_DAILY_CREDITS is {credits:.0f}"
+                    )
+                credits -= polls
+            self.OSKY_CREDITS_PER_DAY = credits / max(self.OSKY_WORKERS, 1)
+        return self
 
-    
     class Config:
         case_sensitive = True
         env_file = os.path.expanduser("../../.env")
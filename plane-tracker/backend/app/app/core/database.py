@@ -12,6 +12,8 @@ DATABASE_URL = settings.DATABASE_URL
 #    connect_args is still needed for SQLite.
 #    echo=True logs SQL statements, useful for debugging.
 engine = create_async_engine(DATABASE_URL, echo=True)
+# Session factory shared by requests and background tasks
+async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 async def init_db():
     """
@@ -32,8 +34,5 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     FastAPI dependency to get an async database session.
     Yields a session and ensures it's closed after the request is handled.
     """
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
     async with async_session() as session:
         yield session
@@ -1,21 +1,91 @@
+import secrets
 from typing import Annotated
-from fastapi import Depends
+from fastapi import Depends, Header, HTTPException, Request, status
+from starlette.requests import HTTPConnection
+from app.core.config import settings
+from app.services.airport_cache import AirportCache
 from app.services.airport_service import AirportService
 from app.services.osky_service import OskyService
+from app.services.weather_service import WeatherService
+from app.services.vectors.poller import StateVectorPoller
+from app.services.vectors.stream import VectorStreamHub
+from app.services.vectors.tiles import StateVectorTileCache
+from app.services.vectors.tracks import TrackStore
 from app.core.database import get_session
 from sqlmodel.ext.asyncio.session import AsyncSession  # ¡Importa AsyncSession!
 
 # Nota: Si AirportService u OskyService necesitan acceso a la base de datos,
 # necesitarás inyectarles la sesión aquí. Por ahora, asumimos que no.
-def provide_airport_service(db_session: Annotated[AsyncSession, Depends(get_session)]) -> AirportService:
+def provide_airport_cache(request: Request) -> AirportCache:
+    """
+    Provides the worker-wide in-memory airports table.
+    """
+    return request.app.state.airport_cache
+
+def provide_airport_service(
+    db_session: Annotated[AsyncSession, Depends(get_session)],
+    cache: Annotated[AirportCache, Depends(provide_airport_cache)],
+) -> AirportService:
     """
     Provides an AirportService with a database session dependency.
     """
-    return AirportService(session=db_session)
+    return AirportService(session=db_session, cache=cache)
+
+def verify_admin(x_admin_secret: Annotated[str | None, Header()] = None) -> None:
+    """
+    Guards admin endpoints with the ADMIN_SECRET setting, sent in the
+    X-Admin-Secret header. Admin endpoints are disabled while it is unset.
+    """
+    if (
+        not settings.ADMIN_SECRET
+        or x_admin_secret is None
+        or not secrets.compare_digest(x_admin_secret, settings.ADMIN_SECRET)
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+def provide_osky_service(request: Request) -> OskyService:
+    """
+    Provides the worker-wide OskyService created in the app lifespan.
+    """
+    return request.app.state.osky_service
+
+def provide_weather_service(request: Request) -> WeatherService:
+    """
+    Provides the worker-wide wttr.in client and its cache.
+    """
+    return request.app.state.weather_service
 
-def provide_osky_service() -> OskyService:
-    return OskyService()
+def provide_state_vector_poller(request: Request) -> StateVectorPoller:
+    """
+    Provides the worker-wide poller holding the latest state-vector snapshot.
+    """
+    return request.app.state.state_vector_poller
+
+def provide_state_vector_tiles(request: Request) -> StateVectorTileCache:
+    """
+    Provides the worker-wide tile cache used for live upstream bbox fetches.
+    """
+    return request.app.state.state_vector_tiles
+
+def provide_track_store(request: Request) -> TrackStore:
+    """
+    Provides the worker-wide ring buffers of recent aircraft positions.
+    """
+    return request.app.state.track_store
+
+def provide_vector_stream_hub(connection: HTTPConnection) -> VectorStreamHub:
+    """
+    Provides the worker-wide hub streaming state-vector diffs. Takes an
+    HTTPConnection so it can be used by WebSocket routes.
+    """
+    return connection.app.state.vector_stream_hub
 
 OskyServiceDep = Annotated[OskyService, Depends(provide_osky_service)]
+WeatherServiceDep = Annotated[WeatherService, Depends(provide_weather_service)]
+StateVectorPollerDep = Annotated[StateVectorPoller, Depends(provide_state_vector_poller)]
+StateVectorTileCacheDep = Annotated[StateVectorTileCache, Depends(provide_state_vector_tiles)]
+TrackStoreDep = Annotated[TrackStore, Depends(provide_track_store)]
+VectorStreamHubDep = Annotated[VectorStreamHub, Depends(provide_vector_stream_hub)]
+AirportCacheDep = Annotated[AirportCache, Depends(provide_airport_cache)]
 AirportServiceDep = Annotated[AirportService, Depends(provide_airport_service)]
 
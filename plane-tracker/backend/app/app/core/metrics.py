@@ -0,0 +1,270 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Request and upstream latencies are recorded as they happen. Everything else
+(cache counters, upstream budget and circuit, DB pool) is kept by the
+services as plain attributes and only read when /metrics is scraped, so hot
+paths pay an integer increment at most.
+
+Each gunicorn worker has its own metrics and a scrape reaches one of them.
+Setting PROMETHEUS_MULTIPROC_DIR aggregates the request and upstream
+histograms across workers; the other metrics describe the worker that
+answered the scrape.
+"""
+
+import os
+import time
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from fastapi import FastAPI
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.multiprocess import MultiProcessCollector
+from prometheus_client.registry import Collector
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.database import engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by route template",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_COUNT = Counter(
+    "http_requests",
+    "HTTP requests by route template and status code",
+    ["method", "route", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "opensky_request_duration_seconds",
+    "Latency of OpenSky API calls by endpoint, without the scheduler queue",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_RESPONSES = Counter(
+    "opensky_responses",
+    "OpenSky API responses by endpoint and status code ('error' for network errors)",
+    ["endpoint", "status"],
+)
+
+
+def observe_upstream(endpoint: str, status: str, seconds: float) -> None:
+    UPSTREAM_LATENCY.labels(endpoint).observe(seconds)
+    UPSTREAM_RESPONSES.labels(endpoint, status).inc()
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Path template of the route that handled the request, e.g.
+    /api/v1/planes/vector, or "unmatched".
+    """
+    # The router stores the matched route in the scope. Older FastAPI copies
+    # included routes with their prefix, so route.path is the full template;
+    # newer releases keep the router's own route there and the prefixed path
+    # on the effective route context
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    route = context if getattr(context, "path", None) else scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class PrometheusMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request. Requests are labelled
+    with their route template (/api/v1/planes/vector, not the raw path) so
+    the number of series stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = route_template(scope)
+            REQUEST_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - started)
+            REQUEST_COUNT.labels(scope["method"], route, str(status)).inc()
+
+
+# (cache, hits, misses, evictions, entries); None where it doesn't apply
+CacheCounters = Tuple[str, int, int, Optional[int], Optional[int]]
+
+
+class AppStateCollector(Collector):
+    """Reads the counters of the services on app.state at scrape time."""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+
+    def collect(self) -> Iterable[Metric]:
+        state = self.app.state
+        yield from self._caches(state)
+        yield from self._upstream(state)
+        yield from self._db_pool()
+
+        poller = getattr(state, "state_vector_poller", None)
+        if poller is not None and poller.snapshot is not None:
+            yield GaugeMetricFamily(
+                "state_vector_snapshot_age_seconds",
+                "Seconds since the poller's snapshot was fetched",
+                value=poller.snapshot.age,
+            )
+
+    def _caches(self, state: Any) -> Iterable[Metric]:
+        caches: List[CacheCounters] = []
+        airport_cache = getattr(state, "airport_cache", None)
+        if airport_cache is not None:
+            index = airport_cache.index
+            caches.append(
+                ("airports", airport_cache.hits, airport_cache.misses, None, len(index) if index else 0)
+            )
+        tiles = getattr(state, "state_vector_tiles", None)
+        if tiles is not None:
+            caches.append(("tiles", tiles.hits + tiles.shared, tiles.misses, tiles.evictions, len(tiles)))
+        tracks = getattr(state, "track_store", None)
+        if tracks is not None:
+            caches.append(("tracks", tracks.hits, tracks.misses, tracks.evictions, len(tracks)))
+        weather = getattr(state, "weather_service", None)
+        if weather is not None:
+            cache = weather.cache
+            caches.append(
+                ("weather", cache.hits + cache.stale_hits, cache.misses, cache.evictions, len(cache))
+            )
+        osky = getattr(state, "osky_service", None)
+        if osky is not None:
+            caches.append(("flights", osky.flights_cache_hits, osky.flights_cache_misses, None, None))
+
+        hits = CounterMetricFamily("cache_hits", "Lookups answered by a cache", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Lookups a cache could not answer", labels=["cache"])
+        evictions = CounterMetricFamily("cache_evictions", "Entries dropped from a cache", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries held by a cache", labels=["cache"])
+        for name, hit_count, miss_count, eviction_count, entry_count in caches:
+            hits.add_metric([name], hit_count)
+            misses.add_metric([name], miss_count)
+            if eviction_count is not None:
+                evictions.add_metric([name], eviction_count)
+            if entry_count is not None:
+                entries.add_metric([name], entry_count)
+        yield from (hits, misses, evictions, entries)
+
+        if weather is not None:
+            stale = CounterMetricFamily(
+                "cache_stale_hits", "Stale entries served while refreshing", labels=["cache"]
+            )
+            stale.add_metric(["weather"], weather.cache.stale_hits)
+            yield stale
+
+    def _upstream(self, state: Any) -> Iterable[Metric]:
+        osky = getattr(state, "osky_service", None)
+        if osky is None:
+            return
+        yield CounterMetricFamily(
+            "opensky_token_fetches", "OAuth tokens fetched from OpenSky", value=osky.oauth_client.token_fetches
+        )
+
+        stats = osky.scheduler.stats()
+        yield CounterMetricFamily(
+            "opensky_credits_spent", "Estimated OpenSky credits spent", value=stats["credits_spent"]
+        )
+        if stats["tokens"] is not None:
+            yield GaugeMetricFamily(
+                "opensky_credits_available", "Credits left in the scheduler's bucket", value=stats["tokens"]
+            )
+        if stats["upstream_remaining"] is not None:
+            yield GaugeMetricFamily(
+                "opensky_credits_remaining",
+                "Credits left according to X-Rate-Limit-Remaining",
+                value=stats["upstream_remaining"],
+            )
+        queued = GaugeMetricFamily(
+            "opensky_queue_depth", "Requests waiting for the scheduler", labels=["priority"]
+        )
+        for priority, depth in stats["queued"].items():
+            queued.add_metric([priority], depth)
+        yield queued
+        yield GaugeMetricFamily("opensky_requests_in_flight", "Requests sent to OpenSky", value=stats["active"])
+        yield GaugeMetricFamily(
+            "opensky_paused_seconds", "Seconds left of a 429 pause", value=stats["paused_for"]
+        )
+        for name, documentation in (
+            ("rate_limited", "429 responses from OpenSky"),
+            ("retries", "Requests retried after a 429"),
+            ("rejected", "Requests failed by the scheduler (no credits or turn)"),
+        ):
+            yield CounterMetricFamily(f"opensky_{name}", documentation, value=stats[name])
+
+        circuit = osky.breaker.stats()
+        state_gauge = GaugeMetricFamily(
+            "opensky_circuit_state", "1 for the current circuit breaker state", labels=["state"]
+        )
+        for value in ("closed", "open", "half_open"):
+            state_gauge.add_metric([value], 1 if circuit["state"] == value else 0)
+        yield state_gauge
+        yield CounterMetricFamily("opensky_circuit_opened", "Times the circuit opened", value=circuit["opened"])
+        yield CounterMetricFamily(
+            "opensky_short_circuited", "Requests failed fast by the open circuit", value=circuit["short_circuited"]
+        )
+
+    def _db_pool(self) -> Iterable[Metric]:
+        pool = engine.sync_engine.pool
+        # Only queue pools report these (not SQLite's NullPool/StaticPool)
+        for name, documentation, read in (
+            ("db_pool_size", "Connections the pool keeps", "size"),
+            ("db_pool_checked_out", "Connections in use", "checkedout"),
+            ("db_pool_checked_in", "Idle connections in the pool", "checkedin"),
+            ("db_pool_overflow", "Connections opened beyond the pool size", "overflow"),
+        ):
+            method: Optional[Callable[[], int]] = getattr(pool, read, None)
+            if method is not None:
+                # overflow() counts down from -pool_size while the pool fills
+                yield GaugeMetricFamily(name, documentation, value=max(0, method()))
+
+
+def setup_metrics(app: FastAPI) -> None:
+    """Adds the timing middleware and the /metrics endpoint."""
+    app.add_middleware(PrometheusMiddleware)
+    collector = AppStateCollector(app)
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+
+        def registry() -> CollectorRegistry:
+            registry = CollectorRegistry()
+            MultiProcessCollector(registry)
+            registry.register(collector)
+            return registry
+
+    else:
+        REGISTRY.register(collector)
+
+        def registry() -> CollectorRegistry:
+            return REGISTRY
+
+    async def metrics(request: Request) -> Response:
+        return Response(generate_latest(registry()), media_type=CONTENT_TYPE_LATEST)
+
+    app.add_route("/metrics", metrics, include_in_schema=False)
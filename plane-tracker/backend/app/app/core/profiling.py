@@ -0,0 +1,153 @@
+"""
+Opt-in request profiling with pyinstrument.
+
+- On demand: a request with ?profile=1 (or an X-Profile: 1 header) and the
+  admin secret in X-Admin-Secret is run under the sampling profiler and
+  answered with its profile instead of the normal response: an HTML
+  flamegraph, or speedscope JSON with ?profile_format=speedscope (open it
+  at https://www.speedscope.app).
+- Sampled: with PROFILING_SAMPLE_RATE > 0, that fraction of all requests is
+  profiled and written as speedscope JSON to PROFILING_DIR, keeping the
+  newest PROFILING_MAX_FILES files.
+
+Unprofiled requests only pay a header lookup and a random draw.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import re
+import secrets
+import time
+from typing import List, Optional
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling selected requests (see module docstring)."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        admin_secret: Optional[str] = None,
+        output_dir: str = "/tmp/plane-tracker/profiles",
+        sample_rate: float = 0.0,
+        max_files: int = 100,
+        interval: float = 0.001,
+    ):
+        """
+        Args:
+            admin_secret: Secret required for on-demand profiles; None
+                disables them.
+            output_dir: Where sampled profiles are written.
+            sample_rate: Fraction of requests profiled to output_dir.
+            max_files: Sampled profiles kept; older ones are deleted.
+            interval: Seconds between profiler samples.
+        """
+        self.app = app
+        self.admin_secret = admin_secret
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.admin_secret and self._requested(scope):
+            await self._profile_on_demand(scope, receive, send)
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            await self._profile_sampled(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    def _requested(self, scope: Scope) -> bool:
+        headers = Headers(scope=scope)
+        flag = headers.get("x-profile") or QueryParams(scope["query_string"]).get("profile")
+        if flag not in ("1", "true"):
+            return False
+        secret = headers.get("x-admin-secret", "")
+        return secrets.compare_digest(secret.encode(), self.admin_secret.encode())
+
+    async def _profile_on_demand(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async def discard(message: Message) -> None:
+            # The profile replaces the response
+            pass
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        if QueryParams(scope["query_string"]).get("profile_format") == "speedscope":
+            body = profiler.output(renderer=SpeedscopeRenderer()).encode()
+            content_type = b"application/json"
+        else:
+            body = profiler.output_html().encode()
+            content_type = b"text/html; charset=utf-8"
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", content_type),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _profile_sampled(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            name = _UNSAFE_CHARS.sub("_", f"{scope['method']}{route_template(scope)}").strip("_")
+            # The suffix keeps profiles of the same second (or worker) apart
+            filename = (
+                f"{time.strftime('%Y%m%dT%H%M%S')}_{name}_{duration_ms:.0f}ms_"
+                f"{secrets.token_hex(3)}.speedscope.json"
+            )
+            try:
+                # Rendering and writing stay off the event loop
+                await asyncio.to_thread(self._write, filename, profiler)
+            except OSError:
+                logger.exception("Could not write profile %s", filename)
+
+    def _write(self, filename: str, profiler: Profiler) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, filename), "w") as f:
+            f.write(profiler.output(renderer=SpeedscopeRenderer()))
+        self._rotate()
+
+    def _rotate(self) -> None:
+        profiles: List[os.DirEntry] = [
+            entry for entry in os.scandir(self.output_dir) if entry.name.endswith(".speedscope.json")
+        ]
+        if len(profiles) <= self.max_files:
+            return
+        profiles.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in profiles[: len(profiles) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                # Removed by another worker
+                pass
@@ -1,10 +1,22 @@
+import asyncio
 from fastapi import (
     FastAPI,
     Depends,  # Import Depends
 )
 from app.api.v1.api import api_router as api_router_v1
 from app.core.config import settings
-from app.core.database import init_db, get_session, close_db  # Import get_session and close_db
+from app.core.metrics import setup_metrics
+from app.core.profiling import ProfilingMiddleware
+from app.core.database import async_session, init_db, get_session, close_db  # Import get_session and close_db
+from app.services.airport_cache import AirportCache
+from app.services.osky_service import OskyService
+from app.services.weather_service import WeatherService
+from app.services.vectors.enrichment import FlightEnrichment
+from app.services.vectors.archive import SnapshotArchive
+from app.services.vectors.poller import StateVectorPoller
+from app.services.vectors.stream import VectorStreamHub
+from app.services.vectors.tiles import StateVectorTileCache
+from app.services.vectors.tracks import TrackStore
 from contextlib import asynccontextmanager
 from sqlmodel import select  # Import select
 from sqlmodel.ext.asyncio.session import AsyncSession  # Import AsyncSession
@@ -16,8 +28,73 @@ async def lifespan(app: FastAPI):
     # Startup
     print("startup fastapi")
     #await init_db()
+    app.state.airport_cache = AirportCache(
+        async_session, check_interval=settings.AIRPORT_CACHE_CHECK_INTERVAL
+    )
+    if settings.AIRPORT_CACHE_ENABLED:
+        try:
+            await app.state.airport_cache.reload()
+        except Exception as e:
+            # Lookups go to the database until the next successful check
+            print(f"airport cache not loaded: {e!r}")
+        await app.state.airport_cache.start()
+    # One OpenSky client per worker: keeps the connection pool and token alive
+    app.state.osky_service = OskyService()
+    app.state.weather_service = WeatherService()
+    app.state.state_vector_poller = StateVectorPoller(
+        app.state.osky_service,
+        interval=settings.STATE_VECTOR_POLL_INTERVAL,
+        regions=settings.STATE_VECTOR_POLL_REGIONS,
+        grid_cell_deg=settings.STATE_VECTOR_GRID_CELL_DEG,
+        shared_dir=settings.STATE_VECTOR_SHARED_DIR,
+    )
+    app.state.state_vector_tiles = StateVectorTileCache(
+        app.state.osky_service,
+        tile_deg=settings.OSKY_TILE_DEG,
+        ttl=settings.OSKY_TILE_TTL,
+        max_tiles=settings.OSKY_TILE_MAX_PER_REQUEST,
+        stale_ttl=settings.OSKY_TILE_STALE_TTL,
+    )
+    app.state.flight_enrichment = FlightEnrichment(
+        app.state.osky_service,
+        app.state.airport_cache,
+        interval=settings.FLIGHT_ENRICHMENT_INTERVAL,
+        hours_back=settings.FLIGHT_ENRICHMENT_HOURS_BACK,
+        delay=settings.FLIGHT_ENRICHMENT_DELAY,
+        # Followers get the routes with the leader's snapshots
+        is_active=lambda: app.state.state_vector_poller.is_leader,
+    )
+    app.state.state_vector_poller.add_processor(app.state.flight_enrichment.process)
+    app.state.track_store = TrackStore(
+        max_aircraft=settings.TRACK_MAX_AIRCRAFT,
+        points=settings.TRACK_POINTS_PER_AIRCRAFT,
+        stale_after=settings.TRACK_STALE_AFTER,
+    )
+    app.state.state_vector_poller.add_listener(app.state.track_store.on_snapshot)
+    app.state.snapshot_archive = SnapshotArchive(
+        settings.STATE_VECTOR_ARCHIVE_DIR,
+        compression=settings.STATE_VECTOR_ARCHIVE_COMPRESSION,
+        retention_days=settings.STATE_VECTOR_ARCHIVE_RETENTION_DAYS,
+    )
+    if settings.STATE_VECTOR_ARCHIVE_ENABLED:
+        app.state.state_vector_poller.add_listener(app.state.snapshot_archive.on_snapshot)
+    app.state.vector_stream_hub = VectorStreamHub(
+        app.state.state_vector_poller,
+        tile_deg=settings.STREAM_TILE_DEG,
+        queue_size=settings.STREAM_QUEUE_SIZE,
+    )
+    if settings.STATE_VECTOR_POLL_ENABLED:
+        if settings.FLIGHT_ENRICHMENT_ENABLED:
+            await app.state.flight_enrichment.start()
+        await app.state.state_vector_poller.start()
     yield
     # shutdown
+    await app.state.state_vector_poller.stop()
+    await asyncio.to_thread(app.state.snapshot_archive.close)
+    await app.state.flight_enrichment.stop()
+    await app.state.airport_cache.stop()
+    await app.state.osky_service.close()
+    await app.state.weather_service.close()
     await close_db()
     print("shutdown fastapi")
     
@@ -41,6 +118,21 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# Profiles cover routing, the endpoint and serialization
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        admin_secret=settings.ADMIN_SECRET,
+        output_dir=settings.PROFILING_DIR,
+        sample_rate=settings.PROFILING_SAMPLE_RATE,
+        max_files=settings.PROFILING_MAX_FILES,
+        interval=settings.PROFILING_INTERVAL,
+    )
+
+# Outermost middleware, so request latency covers the whole stack
+if settings.METRICS_ENABLED:
+    setup_metrics(app)
+
 @app.get("/")
 async def root(session: AsyncSession = Depends(get_session)):
     """
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional, Any, List
 from sqlmodel import SQLModel, Field
 from geoalchemy2 import Geography
@@ -12,7 +13,20 @@ class Airport(SQLModel, table=True):
     icao: str = Field(sa_column_kwargs={"unique": True})
     iata: Optional[str] = Field(default=None)
     name: str
+    country: Optional[str] = Field(default=None)
+    elevation_ft: Optional[int] = Field(default=None)
     location: Any = Field(sa_column=sa.Column(Geography("POINT", srid=4326)))
+    # Set by the database on insert and update; part of the airport cache
+    # fingerprint
+    updated_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=sa.Column(
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+            onupdate=sa.func.now(),
+        ),
+    )
 
     # This is the magic part that fixes your error
     @field_serializer("location")
@@ -1,5 +1,5 @@
 from app.schemas.response_schema import IGetResponseBase
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List
 
 class AirportOut(BaseModel):
@@ -15,3 +15,17 @@ class AirportResponse(IGetResponseBase[List[AirportOut]]):
     airports:List[AirportOut]
 
 
+class GeoPoint(BaseModel):
+    lat:float = Field(ge=-90, le=90)
+    lon:float = Field(ge=-180, le=180)
+
+
+class NearestAirportsBatchRequest(BaseModel):
+    """
+    Positions (e.g. of aircraft) to find the nearest airports of, answered
+    in one database round-trip.
+    """
+    points:List[GeoPoint] = Field(max_length=1000)
+    k:int = Field(default=1, ge=1, le=20)
+
+
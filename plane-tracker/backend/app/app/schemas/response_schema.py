@@ -5,6 +5,8 @@ from fastapi_pagination import Params, Page
 from fastapi_pagination.bases import AbstractPage, AbstractParams
 from pydantic import Field
 from pydantic.generics import GenericModel
+from starlette.responses import Response
+import orjson
 
 DataType = TypeVar("DataType")
 T = TypeVar("T")
@@ -17,6 +19,21 @@ class PageBase(Page[T], Generic[T]):
     next_page: int | None = Field(None, description="Page number of the next page")
 
 
+class CursorPageBase(PageBase[T], Generic[T]):
+    """
+    Keyset page: the next page starts after next_cursor (an id). Page
+    numbers and totals aren't known without counting, so they are unset.
+    """
+
+    total: int | None = None
+    page: int | None = None
+    pages: int | None = None
+    cursor: int | None = Field(None, description="Cursor this page starts after")
+    next_cursor: int | None = Field(
+        None, description="Cursor of the next page, None on the last page"
+    )
+
+
 class IResponseBase(GenericModel, Generic[T]):
     message: str = ""
     meta: dict = {}
@@ -90,3 +107,39 @@ def create_response(
     if message is None:
         return {"data": data, "meta": meta}
     return {"data": data, "message": message, "meta": meta}
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response rendered with orjson. Returning it from an endpoint skips
+    FastAPI's response-model validation and jsonable_encoder pass.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+
+
+def create_fast_response(
+    data: Any,
+    message: str | None = None,
+    meta: dict | None = {},
+) -> FastJSONResponse:
+    """
+    Opt-in fast path of create_response for large payloads: same
+    {message, meta, data} envelope, serialized straight to bytes.
+    `data` must already be JSON-shaped (dicts, lists, numbers, strings or
+    numeric numpy arrays); it is not validated.
+    """
+    return FastJSONResponse(
+        {
+            "message": IGetResponseBase.model_fields["message"].default
+            if message is None
+            else message,
+            "meta": meta,
+            "data": data,
+        }
+    )
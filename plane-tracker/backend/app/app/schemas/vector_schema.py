@@ -1,25 +1,46 @@
 from app.schemas.response_schema import IGetResponseBase
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from typing import List
 
 
+class RouteAirport(BaseModel):
+    icao:str
+    iata:str|None = None
+    name:str|None = None
+    location:List[float]|None = None
+
+
 class VectorOut(BaseModel):
     icao24:str
     callsign:str|None
     origin_country:str
-    time_position:int
+    time_position:int|None
     longitude:float|None
     latitude:float|None
-    baro_altitude:float
-    category:int
+    baro_altitude:float|None
+    velocity:float|None = None
+    true_track:float|None = None
+    on_ground:bool = False
+    category:int = 0
+    departure:RouteAirport|None = None
+    arrival:RouteAirport|None = None
 
 class VectorsResponse(BaseModel):
     vectors: List[VectorOut]
     
     
 class VectorRequest(BaseModel):
-    lamin:float
-    lomin:float
-    lamax:float
-    lomax:float
-    
\ No newline at end of file
+    """
+    Bounding box query. lomin > lomax selects a box crossing the antimeridian.
+    """
+    lamin:float = Field(ge=-90, le=90)
+    lomin:float = Field(ge=-180, le=180)
+    lamax:float = Field(ge=-90, le=90)
+    lomax:float = Field(ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def check_latitudes(self) -> "VectorRequest":
+        # Only longitudes may wrap around; swapped latitudes are a client error
+        if self.lamin > self.lamax:
+            raise ValueError("lamin must not be greater than lamax")
+        return self
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from geoalchemy2.elements import WKBElement, WKTElement
+from geoalchemy2.shape import to_shape
+from shapely import wkb, wkt
+import sqlalchemy as sa
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.airport_model import Airport
+from app.utils.kdtree import KDTree, chord_to_km, km_to_chord, to_unit_vectors
+
+logger = logging.getLogger(__name__)
+
+# Columns loaded for every airport, in row order
+AIRPORT_COLUMNS = ("id", "icao", "iata", "name", "country", "elevation_ft")
+
+# (row count, max id, max updated_at) of the airports table
+Fingerprint = Tuple[int, Optional[int], Optional[datetime]]
+
+
+@dataclass
+class AirportIndex:
+    """
+    Immutable, columnar copy of the airports table. Coordinates are decoded
+    once into the longitude/latitude arrays (NaN when missing).
+    """
+
+    rows: List[Tuple[Any, ...]]
+    longitude: np.ndarray
+    latitude: np.ndarray
+    fingerprint: Optional[Fingerprint] = None
+    by_icao: Dict[str, int] = field(init=False)
+    by_iata: Dict[str, int] = field(init=False)
+    _tree: Optional[KDTree] = field(default=None, init=False, repr=False)
+    _tree_positions: Optional[np.ndarray] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        self.by_icao = {row[1].strip().upper(): i for i, row in enumerate(self.rows)}
+        self.by_iata = {
+            row[2].strip().upper(): i for i, row in enumerate(self.rows) if row[2]
+        }
+
+    @classmethod
+    def from_rows(
+        cls, rows: Sequence[Sequence[Any]], fingerprint: Optional[Fingerprint] = None
+    ) -> "AirportIndex":
+        """
+        Builds the index from (id, icao, iata, name, country, elevation_ft,
+        location) rows.
+        """
+        points = [decode_location(row[-1]) for row in rows]
+        return cls(
+            rows=[tuple(row[:-1]) for row in rows],
+            longitude=np.array([p[0] for p in points], dtype=np.float64),
+            latitude=np.array([p[1] for p in points], dtype=np.float64),
+            fingerprint=fingerprint,
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def record(self, position: int) -> Dict[str, Any]:
+        """Airport at `position` with the same keys as a serialized Airport."""
+        record = dict(zip(AIRPORT_COLUMNS, self.rows[position]))
+        longitude = float(self.longitude[position])
+        latitude = float(self.latitude[position])
+        record["location"] = None if math.isnan(longitude) else [longitude, latitude]
+        return record
+
+    def _kdtree(self) -> KDTree:
+        # Built on first use; the index is replaced, not mutated, on reload
+        if self._tree is None:
+            positioned = np.flatnonzero(~np.isnan(self.longitude) & ~np.isnan(self.latitude))
+            self._tree_positions = positioned
+            self._tree = KDTree(
+                to_unit_vectors(self.longitude[positioned], self.latitude[positioned])
+            )
+        return self._tree
+
+    def nearest(self, longitude: float, latitude: float, k: int) -> List[Dict[str, Any]]:
+        """The k airports closest to a point, with their distance_km."""
+        tree = self._kdtree()
+        chords, found = tree.query(to_unit_vectors([longitude], [latitude])[0], k)
+        return self._records_with_distance(chords, found)
+
+    def within(
+        self, longitude: float, latitude: float, radius_km: float, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Airports within radius_km of a point, closest first."""
+        tree = self._kdtree()
+        chords, found = tree.query_radius(
+            to_unit_vectors([longitude], [latitude])[0], km_to_chord(radius_km)
+        )
+        return self._records_with_distance(chords[:limit], found[:limit])
+
+    def _records_with_distance(
+        self, chords: np.ndarray, found: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        records = []
+        for position, distance in zip(
+            self._tree_positions[found].tolist(), chord_to_km(chords).tolist()
+        ):
+            record = self.record(position)
+            record["distance_km"] = round(distance, 3)
+            records.append(record)
+        return records
+
+
+class AirportCache:
+    """
+    The whole airports table held in memory, indexed by ICAO and IATA.
+
+    Loaded at startup and reloaded when the table's fingerprint changes:
+    inserts and deletes move the row count or max id, in-place updates the
+    max updated_at. Each worker checks its own copy every check_interval
+    seconds; reload() (the admin endpoint) only refreshes the worker that
+    runs it.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        check_interval: float = 300.0,
+    ):
+        """
+        Args:
+            session_factory: Opens the sessions used to load the table.
+            check_interval: Seconds between fingerprint checks.
+        """
+        self.session_factory = session_factory
+        self.check_interval = check_interval
+        self._index: Optional[AirportIndex] = None
+        self._reload_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @property
+    def index(self) -> Optional[AirportIndex]:
+        return self._index
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def get_by_icao(self, icao: str) -> Optional[Dict[str, Any]]:
+        return self._lookup(self._index.by_icao, icao)
+
+    def get_by_iata(self, iata: str) -> Optional[Dict[str, Any]]:
+        return self._lookup(self._index.by_iata, iata)
+
+    def _lookup(self, codes: Dict[str, int], code: str) -> Optional[Dict[str, Any]]:
+        position = codes.get(code.strip().upper())
+        if position is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._index.record(position)
+
+    async def reload(self) -> int:
+        """Loads the whole table and swaps the index. Returns the airport count."""
+        async with self._reload_lock:
+            async with self.session_factory() as session:
+                fingerprint = await self._fingerprint(session)
+                # As text (hex EWKB on PostGIS): skips the ST_AsBinary wrapper,
+                # which backends without spatial functions don't have
+                statement = select(
+                    *[getattr(Airport, name) for name in AIRPORT_COLUMNS],
+                    sa.cast(Airport.location, sa.Text),
+                ).order_by(Airport.id)
+                rows = (await session.exec(statement)).all()
+            self._index = AirportIndex.from_rows(rows, fingerprint)
+            self.reloads += 1
+            logger.info("Loaded %d airports into the cache", len(self._index))
+            return len(self._index)
+
+    async def reload_if_changed(self) -> bool:
+        async with self.session_factory() as session:
+            fingerprint = await self._fingerprint(session)
+        if self._index is not None and fingerprint == self._index.fingerprint:
+            return False
+        await self.reload()
+        return True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.reload_if_changed()
+            except Exception:
+                # Keep serving the current index
+                logger.exception("Airport cache check failed")
+
+    @staticmethod
+    async def _fingerprint(session: AsyncSession) -> Fingerprint:
+        result = await session.exec(
+            select(func.count(Airport.id), func.max(Airport.id), func.max(Airport.updated_at))
+        )
+        count, max_id, updated_at = result.one()
+        return count, max_id, updated_at
+
+
+def decode_location(location: Any) -> Tuple[float, float]:
+    """
+    (longitude, latitude) of a location column value, which depending on the
+    driver is a geoalchemy2 element, WKB bytes or (E)WKT text.
+    """
+    if location is None:
+        return math.nan, math.nan
+    if isinstance(location, (WKBElement, WKTElement)):
+        point = to_shape(location)
+    elif isinstance(location, (bytes, memoryview)):
+        point = wkb.loads(bytes(location))
+    elif isinstance(location, str) and re.fullmatch(r"[0-9a-fA-F]+", location):
+        point = wkb.loads(location, hex=True)
+    else:
+        point = wkt.loads(re.sub(r"^SRID=\d+;", "", str(location)))
+    return point.x, point.y
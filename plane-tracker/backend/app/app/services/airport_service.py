@@ -1,6 +1,60 @@
+import math
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import sqlalchemy as sa
+from sqlalchemy import func, text
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 from app.models.airport_model import Airport 
+from app.services.airport_cache import AIRPORT_COLUMNS, AirportCache, AirportIndex, decode_location
+from app.utils.exceptions import AirportIndexUnavailableException
+
+# (lomin, lamin, lomax, lamax); lomin > lomax crosses the antimeridian
+BBox = Tuple[float, float, float, float]
+
+# Point parameter as geography, inlined so PostGIS can use the GIST index
+_POINT_SQL = "ST_SetSRID(ST_MakePoint({lon}, {lat}), 4326)::geography"
+_AIRPORT_SQL = (
+    "a.id, a.icao, a.iata, a.name, a.country, a.elevation_ft, "
+    "ST_X(a.location::geometry) AS longitude, ST_Y(a.location::geometry) AS latitude, "
+    "ST_Distance(a.location, {point}) AS distance_m"
+)
+
+_NEAREST_SQL = text(
+    f"""
+    SELECT {_AIRPORT_SQL.format(point=_POINT_SQL.format(lon=":lon", lat=":lat"))}
+    FROM airports a
+    WHERE a.location IS NOT NULL
+    ORDER BY a.location <-> {_POINT_SQL.format(lon=":lon", lat=":lat")}
+    LIMIT :k
+    """
+)
+
+_WITHIN_SQL = text(
+    f"""
+    SELECT {_AIRPORT_SQL.format(point=_POINT_SQL.format(lon=":lon", lat=":lat"))}
+    FROM airports a
+    WHERE ST_DWithin(a.location, {_POINT_SQL.format(lon=":lon", lat=":lat")}, :radius_m)
+    ORDER BY distance_m
+    LIMIT :limit
+    """
+)
+
+# One round-trip for many points: a KNN scan per point through LATERAL
+_NEAREST_BATCH_SQL = text(
+    f"""
+    SELECT p.ord, n.*
+    FROM unnest(CAST(:lons AS double precision[]), CAST(:lats AS double precision[]))
+        WITH ORDINALITY AS p(lon, lat, ord)
+    CROSS JOIN LATERAL (
+        SELECT {_AIRPORT_SQL.format(point=_POINT_SQL.format(lon="p.lon", lat="p.lat"))}
+        FROM airports a
+        WHERE a.location IS NOT NULL
+        ORDER BY a.location <-> {_POINT_SQL.format(lon="p.lon", lat="p.lat")}
+        LIMIT :k
+    ) n
+    ORDER BY p.ord, n.distance_m
+    """
+)
 
 class AirportService:
     """
@@ -8,14 +62,54 @@ class AirportService:
     It's designed to be initialized with a database session.
     """
 
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, cache: Optional[AirportCache] = None):
         """
         Initializes the AirportService with a database session.
 
         Args:
             session: An asynchronous database session.
+            cache: In-memory airports table; lookups fall back to the
+                database while it isn't loaded.
         """
         self.session = session
+        self.cache = cache
+
+    def _use_cache(self) -> bool:
+        return self.cache is not None and self.cache.loaded
+
+    def _use_postgis(self) -> bool:
+        return self.session.bind.dialect.name == "postgresql"
+
+    def _location_columns(self) -> List[Any]:
+        # Longitude and latitude on PostGIS; elsewhere the raw column, decoded
+        # by decode_location
+        if self._use_postgis():
+            geometry = func.geometry(Airport.location)
+            return [func.ST_X(geometry), func.ST_Y(geometry)]
+        return [sa.cast(Airport.location, sa.Text)]
+
+    def _select_records(self) -> Any:
+        """Select of the columns _to_record turns into an airport record."""
+        return select(
+            *[getattr(Airport, name) for name in AIRPORT_COLUMNS], *self._location_columns()
+        )
+
+    def _to_record(self, row: Sequence[Any]) -> Dict[str, Any]:
+        """Airport record, the same the cache returns, from a _select_records row."""
+        record = dict(zip(AIRPORT_COLUMNS, row))
+        if self._use_postgis():
+            longitude, latitude = row[-2:]
+        else:
+            longitude, latitude = decode_location(row[-1])
+        missing = longitude is None or math.isnan(longitude)
+        record["location"] = None if missing else [longitude, latitude]
+        return record
+
+    def _cached_index(self) -> AirportIndex:
+        # Without PostGIS, spatial queries are answered from the cache's KD-tree
+        if not self._use_cache():
+            raise AirportIndexUnavailableException()
+        return self.cache.index
 
     async def get_airport_data(self, icao: str):
         """
@@ -25,10 +119,299 @@ class AirportService:
             icao: The ICAO code of the airport to retrieve.
         
         Returns:
-            An Airport model instance or None if not found.
+            The airport record or None if not found.
         """
-        statement = select(Airport).where(Airport.icao == icao)
+        if self._use_cache():
+            return self.cache.get_by_icao(icao)
+
+        statement = self._select_records().where(Airport.icao == icao.upper())
         
-        result = await self.session.exec(statement)
+        row = (await self.session.exec(statement)).first()
+
+        return None if row is None else self._to_record(row)
+
+    async def get_airport_data_by_iata(self, iata: str):
+        """
+        Retrieves airport data by its IATA code.
+
+        Args:
+            iata: The IATA code of the airport to retrieve.
+
+        Returns:
+            The airport record or None if not found.
+        """
+        if self._use_cache():
+            return self.cache.get_by_iata(iata)
+
+        statement = self._select_records().where(Airport.iata == iata.upper())
+
+        row = (await self.session.exec(statement)).first()
+
+        return None if row is None else self._to_record(row)
+
+    async def get_airports_by_codes(self, codes: Sequence[str]) -> Dict[str, Any]:
+        """
+        Resolves many airport codes at once: 4 characters are looked up as
+        ICAO, 3 as IATA.
+
+        Args:
+            codes: ICAO and/or IATA codes, in any case.
+
+        Returns:
+            A dict with every (upper-cased) code as key and the airport
+            record, or None when it isn't found, as value.
+        """
+        codes = [code.strip().upper() for code in codes]
+        icaos = {code for code in codes if len(code) == 4}
+        iatas = {code for code in codes if len(code) == 3}
+        if self._use_cache():
+            return {
+                code: self.cache.get_by_icao(code) if code in icaos
+                else self.cache.get_by_iata(code) if code in iatas
+                else None
+                for code in codes
+            }
+
+        found: Dict[str, Any] = {}
+        if icaos or iatas:
+            # One query for every code, whatever the batch size
+            statement = self._select_records().where(
+                sa.or_(Airport.icao.in_(icaos), Airport.iata.in_(iatas))
+            )
+            for row in (await self.session.exec(statement)).all():
+                airport = self._to_record(row)
+                if airport["icao"] in icaos:
+                    found[airport["icao"]] = airport
+                if airport["iata"] in iatas:
+                    found.setdefault(airport["iata"], airport)
+        return {code: found.get(code) for code in codes}
+
+    async def iter_airport_batches(
+        self,
+        country: Optional[str] = None,
+        bbox: Optional[BBox] = None,
+        after_id: Optional[int] = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Walks the airports table in id order with keyset pagination
+        (id > last id seen), so no batch costs more than the previous one
+        and the table is never held in memory.
+
+        Args:
+            country: Only airports of this country (case-insensitive).
+            bbox: Only airports inside this box.
+            after_id: Start after this id.
+            batch_size: Rows fetched per query.
+
+        Yields:
+            Non-empty lists of airport records.
+        """
+        postgis = self._use_postgis()
+        location_columns = self._location_columns()
+
+        while True:
+            statement = self._select_records().order_by(Airport.id).limit(batch_size)
+            if after_id is not None:
+                statement = statement.where(Airport.id > after_id)
+            if country:
+                statement = statement.where(func.lower(Airport.country) == country.lower())
+            if bbox is not None and postgis:
+                statement = statement.where(_bbox_clause(Airport.location, *location_columns, bbox))
+            rows = (await self.session.exec(statement)).all()
+            if not rows:
+                return
+            after_id = rows[-1][0]
+
+            records = [self._to_record(row) for row in rows]
+            if bbox is not None and not postgis:
+                # Without PostGIS the bbox is checked here
+                records = [
+                    record for record in records
+                    if record["location"] is not None
+                    and _in_bbox(*record["location"], bbox)
+                ]
+            if records:
+                yield records
+            if len(rows) < batch_size:
+                return
+
+    async def get_airports_page(
+        self,
+        size: int,
+        cursor: Optional[int] = None,
+        country: Optional[str] = None,
+        bbox: Optional[BBox] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Retrieves one keyset page of airports.
+
+        Args:
+            size: Airports per page.
+            cursor: Id the page starts after; None for the first page.
+            country: Only airports of this country.
+            bbox: Only airports inside this box.
+
+        Returns:
+            The airports and the cursor of the next page (None if last).
+        """
+        airports: List[Dict[str, Any]] = []
+        # One extra row tells whether there is a next page
+        async for batch in self.iter_airport_batches(country, bbox, cursor, size + 1):
+            airports.extend(batch)
+            if len(airports) > size:
+                break
+        if len(airports) > size:
+            airports = airports[:size]
+            return airports, airports[-1]["id"]
+        return airports, None
+
+    async def get_nearest_airports(
+        self, longitude: float, latitude: float, k: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieves the k airports closest to a point, closest first.
+
+        Args:
+            longitude: Longitude of the point in degrees.
+            latitude: Latitude of the point in degrees.
+            k: Number of airports to return.
+
+        Returns:
+            Airport records with their distance_km.
+        """
+        if not self._use_postgis():
+            return self._cached_index().nearest(longitude, latitude, k)
+
+        result = await self.session.execute(
+            _NEAREST_SQL, {"lon": longitude, "lat": latitude, "k": k}
+        )
+        return [_record_from_row(row) for row in result]
+
+    async def get_airports_within(
+        self, longitude: float, latitude: float, radius_km: float, limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieves the airports within radius_km of a point, closest first.
+
+        Args:
+            longitude: Longitude of the point in degrees.
+            latitude: Latitude of the point in degrees.
+            radius_km: Search radius in kilometres.
+            limit: Maximum number of airports to return.
+
+        Returns:
+            Airport records with their distance_km.
+        """
+        if not self._use_postgis():
+            return self._cached_index().within(longitude, latitude, radius_km, limit)
+
+        result = await self.session.execute(
+            _WITHIN_SQL,
+            {"lon": longitude, "lat": latitude, "radius_m": radius_km * 1000, "limit": limit},
+        )
+        return [_record_from_row(row) for row in result]
+
+    async def get_nearest_airports_batch(
+        self, points: Sequence[Tuple[float, float]], k: int = 1
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieves the k nearest airports of many points in one query.
+
+        Args:
+            points: (longitude, latitude) pairs.
+            k: Number of airports per point.
+
+        Returns:
+            One list of airport records per point, in the same order.
+        """
+        if not self._use_postgis():
+            index = self._cached_index()
+            return [index.nearest(longitude, latitude, k) for longitude, latitude in points]
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in points]
+        if not points:
+            return results
+        result = await self.session.execute(
+            _NEAREST_BATCH_SQL,
+            {
+                "lons": [longitude for longitude, _ in points],
+                "lats": [latitude for _, latitude in points],
+                "k": k,
+            },
+        )
+        for row in result:
+            # WITH ORDINALITY counts from 1
+            results[row[0] - 1].append(_record_from_row(row[1:]))
+        return results
+
+
+def _bbox_clause(location: Any, longitude: Any, latitude: Any, bbox: BBox) -> Any:
+    lomin, lamin, lomax, lamax = bbox
+    if lomin <= lomax:
+        spans = [(lomin, lomax)]
+        in_longitude = longitude.between(lomin, lomax)
+    else:
+        # Across the antimeridian: one envelope on each side
+        spans = [(lomin, 180.0), (-180.0, lomax)]
+        in_longitude = sa.or_(longitude >= lomin, longitude <= lomax)
+    # location && envelope is answered from the GIST index. Geography edges
+    # are great circles, so envelopes are kept under 90 degrees wide, padded
+    # to hold the whole box (_geodesic_envelope), and the exact
+    # longitude/latitude check drops what their bounding boxes let in
+    envelopes = [
+        location.op("&&")(
+            func.geography(func.ST_MakeEnvelope(*_geodesic_envelope(west, lamin, east, lamax), 4326))
+        )
+        for start, end in spans
+        for west, east in _split_span(start, end, 90.0)
+    ]
+    return sa.and_(sa.or_(*envelopes), in_longitude, latitude.between(lamin, lamax))
+
+
+def _geodesic_envelope(west: float, south: float, east: float, north: float) -> BBox:
+    """
+    Envelope whose geography polygon holds the whole box. Its edges along
+    parallels become great circles, which bow toward the pole between the
+    corners: on the edge nearer the equator, points of the box in the middle
+    of a wide span would be left out. That edge is moved toward the equator
+    until its great circle peaks at the box's latitude.
+    """
+    # Peak of a great circle through two points at `latitude` (degrees)
+    # half_width apart: tan(peak) = tan(latitude) / cos(half_width)
+    shrink = math.cos(math.radians(east - west) / 2)
+
+    def equatorward(latitude: float) -> float:
+        return math.degrees(math.atan(math.tan(math.radians(latitude)) * shrink))
+
+    if south > 0:
+        south = equatorward(south)
+    elif north < 0:
+        north = equatorward(north)
+    return west, south, east, north
+
+
+def _split_span(start: float, end: float, max_width: float) -> List[Tuple[float, float]]:
+    parts = max(1, math.ceil((end - start) / max_width))
+    width = (end - start) / parts
+    return [(start + i * width, start + (i + 1) * width) for i in range(parts)]
+
+
+def _in_bbox(longitude: float, latitude: float, bbox: BBox) -> bool:
+    lomin, lamin, lomax, lamax = bbox
+    # NaN (no location) never matches
+    if not lamin <= latitude <= lamax:
+        return False
+    if lomin <= lomax:
+        return lomin <= longitude <= lomax
+    return longitude >= lomin or longitude <= lomax
+
 
-        return result.first()
\ No newline at end of file
+def _record_from_row(row: Sequence[Any]) -> Dict[str, Any]:
+    """Airport record from a row of the PostGIS queries above."""
+    n = len(AIRPORT_COLUMNS)
+    record = dict(zip(AIRPORT_COLUMNS, row[:n]))
+    longitude, latitude, distance_m = row[n:n + 3]
+    record["location"] = None if longitude is None else [longitude, latitude]
+    record["distance_km"] = round(distance_m / 1000, 3)
+    return record
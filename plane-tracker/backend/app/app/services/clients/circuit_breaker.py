@@ -0,0 +1,126 @@
+"""
+Circuit breaker para las peticiones a OpenSky.
+"""
+
+import logging
+import time
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict
+
+import httpx
+
+from app.utils.exceptions import UpstreamUnavailableException
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Corta las peticiones a un upstream caído para fallar al instante.
+
+    - closed: las peticiones pasan; failure_threshold fallos seguidos
+      (errores de red, timeouts o respuestas 5xx) lo abren.
+    - open: las peticiones fallan sin salir durante reset_timeout segundos.
+    - half_open: pasado ese tiempo se deja pasar una sola petición de
+      prueba; si va bien se cierra, si falla se vuelve a abrir.
+
+    Las respuestas 4xx y los límites de créditos no cuentan como fallo.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Fallos consecutivos que abren el circuito.
+            reset_timeout: Segundos abierto antes de probar de nuevo.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        # Métricas
+        self.opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.OPEN and self.retry_after == 0:
+            return CircuitState.HALF_OPEN
+        return self._state
+
+    @property
+    def retry_after(self) -> float:
+        """Segundos hasta la próxima petición de prueba."""
+        if self._state is not CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """
+        Ejecuta send() si el circuito lo permite.
+
+        Raises:
+            UpstreamUnavailableException: Circuito abierto, o la petición
+                falló por red, timeout o 5xx.
+        """
+        if not self._allow():
+            self.short_circuited += 1
+            raise UpstreamUnavailableException(retry_after=self.retry_after or self.reset_timeout)
+        try:
+            response = await send()
+        except httpx.TransportError as e:
+            self._on_failure()
+            raise UpstreamUnavailableException(retry_after=self.retry_after or None) from e
+        except BaseException:
+            # Ni éxito ni fallo del upstream (cancelación, límite de créditos)
+            self._probing = False
+            raise
+        if response.status_code >= 500:
+            self._on_failure()
+            raise UpstreamUnavailableException(retry_after=self.retry_after or None)
+        self._on_success()
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._failures,
+            "retry_after": round(self.retry_after, 3),
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
+
+    def _allow(self) -> bool:
+        state = self.state
+        if state is CircuitState.CLOSED:
+            return True
+        if state is CircuitState.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def _on_success(self) -> None:
+        if self._state is not CircuitState.CLOSED:
+            logger.info("OpenSky circuit closed")
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def _on_failure(self) -> None:
+        self._failures += 1
+        # Una prueba fallida vuelve a abrir el circuito sin esperar al umbral
+        if self._probing or self._failures >= self.failure_threshold:
+            if self._state is CircuitState.CLOSED:
+                self.opened += 1
+                logger.warning("OpenSky circuit opened after %d failures", self._failures)
+            self._state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+        self._probing = False
@@ -1,18 +1,15 @@
 """
-OpenSky Network Service con cliente OAuth2 asíncrono y refresh automático.
+Cliente OAuth2 asíncrono con refresh automático de tokens.
 """
 
-import os
 import time
+import asyncio
 import httpx
 from typing import Optional, Dict, Any
-from datetime import datetime
-from dotenv import load_dotenv
+from app.services.clients.token_store import TOKEN_STORE_ERRORS, TokenStore
 
-load_dotenv()
-
-CLIENT_ID = os.getenv("CLIENT_ID")
-SECRET = os.getenv("SECRET")
+# Espera mínima entre renovaciones programadas, aunque el token dure poco
+MIN_PROACTIVE_REFRESH_DELAY = 5.0
 
 
 class AsyncOAuth2Client:
@@ -25,28 +22,53 @@ class AsyncOAuth2Client:
         client_id: str,
         client_secret: str,
         token_endpoint: str,
-        token: Optional[Dict[str, Any]] = None
+        token: Optional[Dict[str, Any]] = None,
+        client_kwargs: Optional[Dict[str, Any]] = None,
+        refresh_margin: int = 300,
+        expiry_margin: int = 10,
+        token_store: Optional[TokenStore] = None
     ):
+        """
+        Args:
+            client_kwargs: Argumentos para el httpx.AsyncClient subyacente
+                (limits, timeout, http2, ...). El cliente se reutiliza en
+                todas las peticiones, así que conserva conexiones keep-alive.
+            refresh_margin: Segundos antes de expires_at en los que se
+                renueva el token en segundo plano. Con tokens que duran
+                menos del doble se renueva a mitad de su vida.
+            expiry_margin: Segundos antes de expires_at a partir de los que
+                el token ya no se usa y las peticiones esperan al refresh.
+            token_store: Almacén compartido entre procesos. Si se indica,
+                los workers reutilizan el mismo token y solo uno lo renueva.
+        """
         self.client_id = client_id
         self.client_secret = client_secret
         self.token_endpoint = token_endpoint
         self.token = token
+        self.client_kwargs = client_kwargs or {}
+        self.refresh_margin = refresh_margin
+        self.expiry_margin = expiry_margin
+        self.token_store = token_store
         self._http_client: Optional[httpx.AsyncClient] = None
+        # Refresh en curso compartido por todas las corrutinas (single-flight)
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._proactive_refresh: Optional[asyncio.TimerHandle] = None
+        # Tokens pedidos al servidor (métrica)
+        self.token_fetches = 0
     
     async def __aenter__(self):
         """Context manager para usar con async with."""
-        self._http_client = httpx.AsyncClient()
+        self._get_client()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Cierra el cliente HTTP al salir del contexto."""
-        if self._http_client:
-            await self._http_client.aclose()
+        await self.close()
     
     def _get_client(self) -> httpx.AsyncClient:
         """Obtiene o crea el cliente HTTP."""
         if self._http_client is None:
-            self._http_client = httpx.AsyncClient()
+            self._http_client = httpx.AsyncClient(**self.client_kwargs)
         return self._http_client
     
     async def fetch_token(self) -> Dict[str, Any]:
@@ -78,6 +100,7 @@ class AsyncOAuth2Client:
             token_data["expires_at"] = time.time() + token_data["expires_in"]
         
         self.token = token_data
+        self.token_fetches += 1
         print(f"✓ Token obtenido. Expira en: {token_data.get('expires_in', 'N/A')} segundos")
         return token_data
     
@@ -91,21 +114,151 @@ class AsyncOAuth2Client:
         Returns:
             True si el token está expirado o no existe
         """
-        if not self.token:
+        return self._expires_within(self.token, margin)
+
+    @staticmethod
+    def _expires_within(token: Optional[Dict[str, Any]], margin: int) -> bool:
+        if not token:
             return True
         
-        if "expires_at" not in self.token:
+        if "expires_at" not in token:
             return False
         
-        return time.time() >= (self.token["expires_at"] - margin)
+        return time.time() >= (token["expires_at"] - margin)
     
     async def ensure_valid_token(self) -> None:
         """
         Asegura que hay un token válido, obteniendo uno nuevo si es necesario.
+
+        Si el token aún sirve pero está dentro de refresh_margin, se devuelve
+        de inmediato y la renovación ocurre en segundo plano.
         """
-        if self.is_token_expired():
+        if self.is_token_expired(margin=self.expiry_margin):
             print("🔄 Token expirado o inexistente, obteniendo nuevo token...")
-            await self.fetch_token()
+            await self.refresh_token()
+        elif self.is_token_expired(margin=self._refresh_margin_for(self.token)):
+            self._start_background_refresh()
+
+    async def refresh_token(self, stale_token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Renueva el token con una sola petición al endpoint de autenticación,
+        aunque muchas corrutinas lo pidan a la vez: todas esperan el mismo
+        refresh y comparten su resultado.
+
+        Args:
+            stale_token: access_token que la llamada considera inválido. Si
+                otra corrutina ya lo reemplazó, no se vuelve a renovar.
+
+        Returns:
+            Token data vigente
+        """
+        if (
+            stale_token is not None
+            and self.token
+            and self.token.get("access_token") != stale_token
+        ):
+            return self.token
+
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        # shield: si una corrutina se cancela, el refresh sigue para las demás
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh(self) -> Dict[str, Any]:
+        if self.token_store is None:
+            token_data = await self.fetch_token()
+        else:
+            token_data = await self._refresh_shared()
+        self._schedule_proactive_refresh()
+        return token_data
+
+    async def _refresh_shared(self) -> Dict[str, Any]:
+        """
+        Renueva el token coordinándose con otros procesos: si alguno ya
+        publicó un token válido distinto del actual, se reutiliza.
+
+        Si el almacén falla (Redis caído, disco inaccesible), el token se
+        renueva solo para este worker en lugar de fallar la petición.
+        """
+        fetches = self.token_fetches
+        try:
+            return await self._refresh_with_store()
+        except TOKEN_STORE_ERRORS as e:
+            print(f"✗ Error en el almacén de tokens, renovando localmente: {e!r}")
+            if self.token_fetches > fetches:
+                # Ya se obtuvo un token nuevo; solo falló publicarlo
+                return self.token
+            return await self.fetch_token()
+
+    async def _refresh_with_store(self) -> Dict[str, Any]:
+        stale_token = self.token.get("access_token") if self.token else None
+
+        shared = await self.token_store.load()
+        if self._is_reusable(shared, stale_token):
+            self.token = shared
+            return shared
+
+        async with self.token_store.lock() as acquired:
+            if not acquired:
+                print("✗ Timeout esperando el lock del token compartido, renovando localmente")
+            # Otro proceso pudo renovar mientras esperábamos el lock
+            shared = await self.token_store.load()
+            if self._is_reusable(shared, stale_token):
+                self.token = shared
+                return shared
+
+            token_data = await self.fetch_token()
+            await self.token_store.save(token_data)
+            return token_data
+
+    def _is_reusable(self, token: Optional[Dict[str, Any]], stale_token: Optional[str]) -> bool:
+        return (
+            token is not None
+            and "access_token" in token
+            and token["access_token"] != stale_token
+            and not self._expires_within(token, self._refresh_margin_for(token))
+        )
+
+    def _refresh_margin_for(self, token: Optional[Dict[str, Any]]) -> float:
+        """
+        refresh_margin, acotado a la mitad de la vida del token: con un
+        margen mayor que la vida, cada token nuevo ya pediría renovarse.
+        """
+        expires_in = token.get("expires_in") if token else None
+        if isinstance(expires_in, (int, float)) and expires_in > 0:
+            return min(self.refresh_margin, expires_in / 2)
+        return self.refresh_margin
+
+    def _start_background_refresh(self) -> None:
+        """Lanza el refresh sin esperarlo, si no hay uno en curso."""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh())
+        self._refresh_task.add_done_callback(self._log_background_refresh)
+
+    @staticmethod
+    def _log_background_refresh(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"✗ Error renovando el token en segundo plano: {task.exception()}")
+
+    def _schedule_proactive_refresh(self) -> None:
+        """
+        Programa la renovación refresh_margin segundos antes de expirar, y
+        nunca antes de MIN_PROACTIVE_REFRESH_DELAY segundos.
+        """
+        if self._proactive_refresh is not None:
+            self._proactive_refresh.cancel()
+            self._proactive_refresh = None
+
+        if not self.token or "expires_at" not in self.token:
+            return
+
+        margin = self._refresh_margin_for(self.token)
+        delay = self.token["expires_at"] - margin - time.time()
+        loop = asyncio.get_running_loop()
+        self._proactive_refresh = loop.call_later(
+            max(delay, MIN_PROACTIVE_REFRESH_DELAY), self._start_background_refresh
+        )
     
     def get_auth_headers(self) -> Dict[str, str]:
         """
@@ -127,6 +280,9 @@ class AsyncOAuth2Client:
     ) -> httpx.Response:
         """
         Realiza una petición HTTP con token automático.
+
+        Si el servidor responde 401, renueva el token una vez y repite la
+        petición, por si el token fue revocado antes de su expiración.
         
         Args:
             method: Método HTTP (GET, POST, etc.)
@@ -139,11 +295,22 @@ class AsyncOAuth2Client:
         await self.ensure_valid_token()
         
         # Agregar headers de autenticación
-        headers = kwargs.pop("headers", {})
-        headers.update(self.get_auth_headers())
+        headers = kwargs.pop("headers", None) or {}
+        auth_headers = self.get_auth_headers()
+        used_token = self.token["access_token"]
         
         client = self._get_client()
-        response = await client.request(method, url, headers=headers, **kwargs)
+        response = await client.request(
+            method, url, headers={**headers, **auth_headers}, **kwargs
+        )
+
+        if response.status_code == httpx.codes.UNAUTHORIZED:
+            print("🔄 Respuesta 401, renovando token y repitiendo la petición...")
+            await response.aclose()
+            await self.refresh_token(stale_token=used_token)
+            response = await client.request(
+                method, url, headers={**headers, **self.get_auth_headers()}, **kwargs
+            )
         
         return response
     
@@ -157,162 +324,12 @@ class AsyncOAuth2Client:
     
     async def close(self):
         """Cierra el cliente HTTP."""
+        if self._proactive_refresh is not None:
+            self._proactive_refresh.cancel()
+            self._proactive_refresh = None
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
         if self._http_client:
             await self._http_client.aclose()
             self._http_client = None
 
-
-class OpenSkyService:
-    """
-    Servicio para interactuar con OpenSky Network API usando OAuth2.
-    """
-    
-    def __init__(self, client_id: str = None, client_secret: str = None):
-        self.client_id = client_id or CLIENT_ID
-        self.client_secret = client_secret or SECRET
-        self.base_url = "https://opensky-network.org/api"
-        self.token_endpoint = "https://auth.opensky-network.org/auth/realms/opensky-network/protocol/openid-connect/token"
-        
-        # Crear cliente OAuth2
-        self.oauth_client = AsyncOAuth2Client(
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-            token_endpoint=self.token_endpoint
-        )
-    
-    async def __aenter__(self):
-        """Context manager para usar con async with."""
-        await self.oauth_client.__aenter__()
-        return self
-    
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Cierra recursos al salir del contexto."""
-        await self.oauth_client.__aexit__(exc_type, exc_val, exc_tb)
-    
-    async def authenticate(self) -> Dict[str, Any]:
-        """
-        Autentica y obtiene un token de acceso.
-        
-        Returns:
-            Token data
-        """
-        return await self.oauth_client.fetch_token()
-    
-    def get_token(self) -> Optional[str]:
-        """
-        Obtiene el access token actual.
-        
-        Returns:
-            Access token o None si no existe
-        """
-        if self.oauth_client.token:
-            return self.oauth_client.token.get("access_token")
-        return None
-    
-    async def get_current_flights(
-        self,
-        hours_back: float = 1.0
-    ) -> Dict[str, Any]:
-        """
-        Obtiene todos los vuelos actuales en un rango de tiempo.
-        
-        Args:
-            hours_back: Horas hacia atrás desde ahora (default: 1 hora)
-            
-        Returns:
-            JSON con datos de vuelos
-        """
-        url = f"{self.base_url}/flights/all"
-        
-        end_time = int(time.time())
-        start_time = end_time - int(hours_back * 3600)
-        
-        params = {
-            "begin": start_time,
-            "end": end_time
-        }
-        
-        response = await self.oauth_client.get(url, params=params)
-        response.raise_for_status()
-        
-        return response.json()
-    
-    async def get_state_vectors_area(
-        self,
-        bbox: tuple[float, float, float, float]
-    ) -> Dict[str, Any]:
-        """
-        Obtiene vectores de estado de aeronaves en un área específica.
-        
-        Args:
-            bbox: Tupla con (lon_min, lat_min, lon_max, lat_max)
-            
-        Returns:
-            JSON con vectores de estado
-        """
-        url = f"{self.base_url}/states/all"
-        
-        params = {
-            "lomin": bbox[0],
-            "lamin": bbox[1],
-            "lomax": bbox[2],
-            "lamax": bbox[3],
-        }
-        
-        response = await self.oauth_client.get(url, params=params)
-        response.raise_for_status()
-        
-        return response.json()
-    
-    async def get_all_state_vectors(self) -> Dict[str, Any]:
-        """
-        Obtiene todos los vectores de estado disponibles.
-        
-        Returns:
-            JSON con vectores de estado
-        """
-        url = f"{self.base_url}/states/all"
-        
-        response = await self.oauth_client.get(url)
-        response.raise_for_status()
-        
-        return response.json()
-    
-    async def close(self):
-        """Cierra el cliente OAuth2."""
-        await self.oauth_client.close()
-
-
-# Ejemplo de uso
-async def main():
-    # Opción 1: Usar context manager (recomendado)
-    async with OpenSkyService() as service:
-        # Autenticar (opcional, se hace automáticamente en la primera petición)
-        await service.authenticate()
-        print(f"Token obtenido: {service.get_token()[:20]}...\n")
-        
-        # Obtener vuelos actuales (última hora)
-        try:
-            flights = await service.get_current_flights(hours_back=0.5)
-            print(f"✓ Vuelos obtenidos: {len(flights)} registros")
-        except httpx.HTTPError as e:
-            print(f"✗ Error al obtener vuelos: {e}")
-        
-        # Obtener estado de aeronaves en un área (ejemplo: sobre Europa)
-        try:
-            bbox = (-10, 35, 20, 60)  # lon_min, lat_min, lon_max, lat_max
-            states = await service.get_state_vectors_area(bbox)
-            print(f"✓ Estados obtenidos: {states.get('time', 'N/A')}")
-        except httpx.HTTPError as e:
-            print(f"✗ Error al obtener estados: {e}")
-    
-    # Opción 2: Gestión manual
-    # service = OpenSkyService()
-    # await service.authenticate()
-    # flights = await service.get_current_flights()
-    # await service.close()
-
-
-if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+Almacenes de tokens OAuth2 compartidos entre procesos.
+
+Con gunicorn cada worker tiene su propio AsyncOAuth2Client. Un TokenStore
+permite que todos reutilicen el mismo token y que solo uno lo renueve.
+"""
+
+import os
+import json
+import time
+import fcntl
+import asyncio
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, AsyncIterator
+
+from redis import asyncio as aioredis
+from redis.exceptions import LockError, RedisError
+
+# Fallos de un almacén inaccesible (disco, Redis caído): quien lo usa puede
+# seguir sin él
+TOKEN_STORE_ERRORS = (OSError, RedisError)
+
+
+class TokenStore(ABC):
+    """
+    Interfaz de un almacén de tokens con lock entre procesos.
+    """
+
+    @abstractmethod
+    async def load(self) -> Optional[Dict[str, Any]]:
+        """Devuelve el token compartido o None si no existe."""
+
+    @abstractmethod
+    async def save(self, token: Dict[str, Any]) -> None:
+        """Publica un token recién obtenido para el resto de procesos."""
+
+    @abstractmethod
+    def lock(self) -> AsyncIterator[bool]:
+        """
+        Context manager asíncrono con el lock de renovación.
+
+        Produce True si se obtuvo el lock y False si se agotó la espera; en
+        ese caso el llamador puede renovar igualmente el token.
+        """
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Libera los recursos del almacén."""
+
+
+class FileTokenStore(TokenStore):
+    """
+    Token en un fichero local protegido con flock. Sirve para workers que
+    comparten disco (mismo contenedor o máquina).
+    """
+
+    def __init__(self, path: str, lock_timeout: float = 30.0):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.lock_timeout = lock_timeout
+
+    async def load(self) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read)
+
+    async def save(self, token: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, token)
+
+    @asynccontextmanager
+    async def lock(self) -> AsyncIterator[bool]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            acquired = await self._acquire(fd)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    async def _acquire(self, fd: int) -> bool:
+        # flock no bloqueante + sleep: no ocupa hilos ni bloquea el event loop
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                await asyncio.sleep(0.05)
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, token: Dict[str, Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(token, tmp_file)
+        # Reemplazo atómico: los lectores nunca ven un fichero a medias
+        os.replace(tmp_path, self.path)
+
+    async def close(self) -> None:
+        # Cada operación abre y cierra sus ficheros: nada que liberar
+        return None
+
+
+class RedisTokenStore(TokenStore):
+    """
+    Token en Redis con un lock distribuido. Sirve para workers repartidos
+    en varias máquinas o contenedores.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str = "plane-tracker:osky:token",
+        lock_timeout: float = 30.0,
+    ):
+        self.key = key
+        self.lock_timeout = lock_timeout
+        self._redis = aioredis.from_url(url)
+
+    async def load(self) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(self.key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    async def save(self, token: Dict[str, Any]) -> None:
+        ttl = None
+        if "expires_at" in token:
+            ttl = max(int(token["expires_at"] - time.time()), 1)
+        await self._redis.set(self.key, json.dumps(token), ex=ttl)
+
+    @asynccontextmanager
+    async def lock(self) -> AsyncIterator[bool]:
+        # timeout: el lock caduca solo si el worker que lo tiene muere
+        redis_lock = self._redis.lock(
+            f"{self.key}:lock",
+            timeout=self.lock_timeout,
+            blocking_timeout=self.lock_timeout,
+        )
+        acquired = await redis_lock.acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    await redis_lock.release()
+                except LockError:
+                    # El lock ya expiró; otro worker puede haberlo tomado
+                    pass
+
+    async def close(self) -> None:
+        await self._redis.aclose()
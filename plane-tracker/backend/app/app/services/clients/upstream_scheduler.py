@@ -0,0 +1,341 @@
+"""
+Planificador de peticiones a OpenSky: presupuesto de créditos, prioridades
+y reintentos ante 429.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence
+
+import httpx
+
+from app.utils.exceptions import UpstreamRateLimitedException
+
+logger = logging.getLogger(__name__)
+
+# Coste aproximado en créditos de OpenSky. states/all depende del área
+# pedida (grados cuadrados); tracks y flights no están documentados y se
+# cuentan como una consulta global.
+STATES_AREA_CREDITS = ((25.0, 1), (100.0, 2), (400.0, 3))
+STATES_GLOBAL_CREDITS = 4
+TRACKS_CREDITS = 4
+FLIGHTS_CREDITS = 4
+
+
+class UpstreamPriority(IntEnum):
+    """Menor valor, antes sale de la cola."""
+
+    POLLER = 0
+    INTERACTIVE = 1
+    TRACKS = 2
+    BULK = 3
+
+
+def estimate_credits(url: str, params: Optional[Mapping[str, Any]] = None) -> int:
+    """
+    Créditos que costará una petición, según el endpoint y el área.
+    """
+    params = params or {}
+    if "/states/" in url:
+        try:
+            area = (float(params["lamax"]) - float(params["lamin"])) * (
+                float(params["lomax"]) - float(params["lomin"])
+            )
+        except (KeyError, TypeError, ValueError):
+            return STATES_GLOBAL_CREDITS
+        for max_area, credits in STATES_AREA_CREDITS:
+            if abs(area) <= max_area:
+                return credits
+        return STATES_GLOBAL_CREDITS
+    if "/tracks/" in url:
+        return TRACKS_CREDITS
+    if "/flights/" in url:
+        return FLIGHTS_CREDITS
+    return 1
+
+
+def poll_credits_per_day(interval: float, regions: Sequence[Sequence[float]] = ()) -> float:
+    """
+    Créditos diarios de un poller que pide regions (lomin, lamin, lomax,
+    lamax) cada interval segundos; sin regiones, states/all global.
+    """
+    if regions:
+        per_poll = sum(
+            estimate_credits(
+                "/states/all", {"lomin": lomin, "lamin": lamin, "lomax": lomax, "lamax": lamax}
+            )
+            for lomin, lamin, lomax, lamax in regions
+        )
+    else:
+        per_poll = STATES_GLOBAL_CREDITS
+    return per_poll * 86400 / interval
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    cost: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class UpstreamScheduler:
+    """
+    Punto único por el que pasan todas las peticiones a OpenSky.
+
+    - Presupuesto: cubo de créditos (token bucket) que se rellena a
+      credits_per_day / 86400 por segundo, con capacidad burst. Sin
+      credits_per_day solo se contabiliza el gasto.
+    - Prioridad: como mucho max_concurrency peticiones en vuelo; el resto
+      espera en una cola ordenada por UpstreamPriority, de modo que el
+      poller sale antes que las consultas de tracks o de históricos.
+    - 429: se respeta X-Rate-Limit-Retry-After-Seconds pausando todas las
+      peticiones y se reintenta con backoff exponencial y jitter.
+
+    El presupuesto es por worker: con varios workers, credits_per_day debe
+    ser la parte de cada uno.
+    """
+
+    def __init__(
+        self,
+        credits_per_day: Optional[float] = None,
+        burst: float = 400.0,
+        max_concurrency: int = 8,
+        max_wait: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        """
+        Args:
+            credits_per_day: Créditos diarios de este worker, su parte de
+                los de la cuenta (4000 estándar, 8000 para quien aporta
+                datos). None o 0 desactivan el presupuesto.
+            burst: Créditos que se pueden gastar de golpe.
+            max_concurrency: Peticiones simultáneas a OpenSky.
+            max_wait: Segundos que una petición espera turno antes de fallar.
+            max_retries: Reintentos tras un 429.
+            backoff_base: Primer backoff si el 429 no indica cuánto esperar.
+            max_backoff: Esperas mayores no se reintentan: la petición falla.
+        """
+        self.credits_per_day = credits_per_day
+        self.capacity = burst
+        self.refill_rate = credits_per_day / 86400 if credits_per_day else 0.0
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+
+        self._tokens = burst
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._active = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        # Métricas
+        self.credits_spent = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.rejected = 0
+        self.upstream_remaining: Optional[int] = None
+
+    @property
+    def budget_enabled(self) -> bool:
+        return self.refill_rate > 0
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    async def request(
+        self,
+        send: Callable[[], Awaitable[httpx.Response]],
+        priority: UpstreamPriority = UpstreamPriority.INTERACTIVE,
+        cost: float = 1,
+    ) -> httpx.Response:
+        """
+        Ejecuta send() cuando le toque y reintenta los 429.
+
+        Args:
+            send: Corrutina que hace la petición HTTP.
+            priority: Posición en la cola.
+            cost: Créditos estimados (ver estimate_credits).
+
+        Returns:
+            La respuesta de OpenSky (cualquier estado salvo 429).
+
+        Raises:
+            UpstreamRateLimitedException: Sin turno en max_wait segundos o
+                límite de OpenSky que no se puede esperar.
+        """
+        attempt = 0
+        while True:
+            await self._acquire(priority, cost)
+            try:
+                response = await send()
+            finally:
+                self._release()
+            self._observe(response)
+            if response.status_code != 429:
+                return response
+
+            self.rate_limited += 1
+            retry_after = _retry_after(response)
+            delay = retry_after if retry_after is not None else self.backoff_base * 2 ** attempt
+            if attempt >= self.max_retries or delay > self.max_backoff:
+                self._pause(delay)
+                self.rejected += 1
+                raise UpstreamRateLimitedException(retry_after=delay)
+            # Jitter: los workers no reintentan todos a la vez
+            self._pause(delay * random.uniform(1.0, 1.25))
+            attempt += 1
+            self.retries += 1
+            logger.warning("OpenSky 429, retry %d in %.1fs", attempt, delay)
+
+    def set_credits_per_day(self, credits_per_day: Optional[float]) -> None:
+        """
+        Cambia el presupuesto diario de este worker, p. ej. cuando pasa a
+        ser el que hace el polling. Los créditos ya acumulados se conservan.
+        """
+        self._refill()
+        self.credits_per_day = credits_per_day
+        self.refill_rate = credits_per_day / 86400 if credits_per_day else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del presupuesto y de la cola."""
+        now = time.monotonic()
+        return {
+            "budget_enabled": self.budget_enabled,
+            "credits_per_day": self.credits_per_day,
+            "tokens": round(self.tokens, 2) if self.budget_enabled else None,
+            "capacity": self.capacity,
+            "credits_spent": self.credits_spent,
+            "upstream_remaining": self.upstream_remaining,
+            "active": self._active,
+            "queued": self.queue_depth(),
+            "paused_for": round(max(0.0, self._paused_until - now), 3),
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+    def queue_depth(self) -> Dict[str, int]:
+        depth = {priority.name.lower(): 0 for priority in UpstreamPriority}
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                depth[UpstreamPriority(waiter.priority).name.lower()] += 1
+        return depth
+
+    async def _acquire(self, priority: UpstreamPriority, cost: float) -> None:
+        # Sin nadie esperando no hace falta pasar por la cola
+        if not self._waiters and self._can_start(cost):
+            self._start(cost)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, _Waiter(int(priority), next(self._seq), cost, future))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise UpstreamRateLimitedException(retry_after=self._wait_time(cost))
+        except asyncio.CancelledError:
+            # Cancelada justo después de recibir turno: devolverlo
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def _can_start(self, cost: float) -> bool:
+        if self._active >= self.max_concurrency or time.monotonic() < self._paused_until:
+            return False
+        # Una petición más cara que el cubo entero espera a tenerlo lleno
+        return not self.budget_enabled or self.tokens >= min(cost, self.capacity)
+
+    def _start(self, cost: float) -> None:
+        self._active += 1
+        self.requests += 1
+        self.credits_spent += cost
+        if self.budget_enabled:
+            self._tokens -= cost
+
+    def _dispatch(self) -> None:
+        """Da turno a los primeros de la cola que puedan salir."""
+        while self._waiters:
+            head = self._waiters[0]
+            if head.future.done():
+                # Cancelada o caducada
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_start(head.cost):
+                break
+            heapq.heappop(self._waiters)
+            self._start(head.cost)
+            head.future.set_result(None)
+
+        if self._waiters and self._active < self.max_concurrency:
+            # Bloqueado por el presupuesto o por una pausa: volver a mirar
+            # cuando haya créditos (las liberaciones ya llaman a _dispatch)
+            self._schedule_wakeup(self._wait_time(self._waiters[0].cost))
+
+    def _wait_time(self, cost: float) -> float:
+        wait = max(0.0, self._paused_until - time.monotonic())
+        if self.budget_enabled:
+            missing = min(cost, self.capacity) - self.tokens
+            wait = max(wait, missing / self.refill_rate)
+        return wait
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(max(delay, 0.01), self._on_wakeup)
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.budget_enabled:
+            self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.refill_rate)
+        self._refilled_at = now
+
+    def _observe(self, response: httpx.Response) -> None:
+        # OpenSky informa de los créditos que le quedan a la cuenta
+        remaining = response.headers.get("X-Rate-Limit-Remaining")
+        if remaining is None:
+            return
+        try:
+            self.upstream_remaining = int(remaining)
+        except ValueError:
+            return
+        if self.budget_enabled:
+            self._tokens = min(self.tokens, float(self.upstream_remaining))
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("X-Rate-Limit-Retry-After-Seconds") or response.headers.get("Retry-After")
+    try:
+        seconds = float(value) if value is not None else None
+    except ValueError:
+        return None
+    return None if seconds is None or math.isnan(seconds) else max(seconds, 0.0)
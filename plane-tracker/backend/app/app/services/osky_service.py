@@ -1,29 +1,124 @@
 
+import asyncio
 import os
 import time
 import httpx
-from typing import Optional, Dict, Any
+import orjson
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
 from app.services.clients.oauth2_client import AsyncOAuth2Client
+from app.services.clients.circuit_breaker import CircuitBreaker
+from app.services.clients.token_store import TokenStore, FileTokenStore, RedisTokenStore
+from app.services.clients.upstream_scheduler import UpstreamPriority, UpstreamScheduler, estimate_credits
 from app.core.config import settings
+from app.core.metrics import observe_upstream
+
+# Intervalo máximo aceptado por flights/all (2 horas)
+FLIGHTS_MAX_INTERVAL = 7200
+
+
 class OskyService:
     """
     Servicio para interactuar con OpenSky Network API usando OAuth2.
     """
     
     def __init__(self, client_id: str = None, client_secret: str = None):
-        self.client_id = settings.CLIENT_ID
-        self.client_secret = settings.SECRET
-        self.base_url = "https://opensky-network.org/api"
-        self.token_endpoint = "https://auth.opensky-network.org/auth/realms/opensky-network/protocol/openid-connect/token"
+        self.client_id = client_id or settings.CLIENT_ID
+        self.client_secret = client_secret or settings.SECRET
+        self.base_url = settings.OSKY_BASE_URL
+        self.token_endpoint = settings.OSKY_TOKEN_ENDPOINT
+        self.token_store = self._build_token_store()
         
-        # Crear cliente OAuth2
+        # Crear cliente OAuth2. Una sola instancia vive durante todo el
+        # worker (ver lifespan en app/main.py), por lo que el pool de
+        # conexiones y el token se reutilizan entre peticiones.
         self.oauth_client = AsyncOAuth2Client(
             client_id=self.client_id,
             client_secret=self.client_secret,
-            token_endpoint=self.token_endpoint
+            token_endpoint=self.token_endpoint,
+            client_kwargs=self._build_client_kwargs(),
+            token_store=self.token_store,
+        )
+        # Todas las peticiones a la API pasan por el planificador
+        self.scheduler = UpstreamScheduler(
+            credits_per_day=settings.OSKY_CREDITS_PER_DAY,
+            burst=settings.OSKY_CREDITS_BURST,
+            max_concurrency=settings.OSKY_MAX_CONCURRENT_REQUESTS,
+            max_wait=settings.OSKY_QUEUE_MAX_WAIT,
+            max_retries=settings.OSKY_MAX_RETRIES,
+            max_backoff=settings.OSKY_MAX_BACKOFF,
+        )
+        # Si OpenSky cae, las peticiones fallan al instante en vez de
+        # agotar el timeout
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.OSKY_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.OSKY_BREAKER_RESET_TIMEOUT,
+        )
+        # Aciertos y fallos de la caché en disco de flights/all (métricas)
+        self.flights_cache_hits = 0
+        self.flights_cache_misses = 0
+
+    @staticmethod
+    def _build_client_kwargs() -> Dict[str, Any]:
+        """
+        Configuración del pool de conexiones HTTP hacia OpenSky.
+        """
+        return {
+            "timeout": httpx.Timeout(settings.OSKY_TIMEOUT),
+            "limits": httpx.Limits(
+                max_connections=settings.OSKY_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OSKY_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OSKY_KEEPALIVE_EXPIRY,
+            ),
+            "http2": settings.OSKY_HTTP2,
+        }
+
+    @staticmethod
+    def _build_token_store() -> Optional[TokenStore]:
+        """
+        Almacén del token compartido entre los workers de gunicorn.
+        """
+        if settings.OSKY_TOKEN_STORE == "file":
+            return FileTokenStore(settings.OSKY_TOKEN_FILE)
+        if settings.OSKY_TOKEN_STORE == "redis":
+            return RedisTokenStore(settings.REDIS_URL)
+        return None
+
+    async def _get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        priority: UpstreamPriority = UpstreamPriority.INTERACTIVE,
+    ) -> httpx.Response:
+        """
+        GET autenticado a OpenSky a través del circuit breaker y del
+        planificador.
+
+        Raises:
+            UpstreamUnavailableException: OpenSky caído, circuito abierto o
+                sin créditos.
+        """
+        return await self.breaker.call(
+            lambda: self.scheduler.request(
+                lambda: self._send(url, params),
+                priority=priority,
+                cost=estimate_credits(url, params),
+            )
         )
+
+    async def _send(self, url: str, params: Optional[Dict[str, Any]]) -> httpx.Response:
+        """
+        Una petición a OpenSky, midiendo su latencia y estado por endpoint.
+        """
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.oauth_client.get(url, params=params)
+            status = str(response.status_code)
+            return response
+        finally:
+            observe_upstream(url[len(self.base_url):], status, time.perf_counter() - started)
     
     async def __aenter__(self):
         """Context manager para usar con async with."""
@@ -57,40 +152,120 @@ class OskyService:
     async def get_current_flights(
         self,
         hours_back: float = 1.0
-    ) -> Dict[str, Any]:
+    ) -> List[Dict[str, Any]]:
         """
         Obtiene todos los vuelos actuales en un rango de tiempo.
-        
+
+        OpenSky rellena flights/all en un proceso nocturno: los vuelos de
+        las últimas horas casi nunca están aún (ver get_flights).
+
         Args:
             hours_back: Horas hacia atrás desde ahora (default: 1 hora)
-            
+
         Returns:
-            JSON con datos de vuelos
+            Lista de vuelos sin duplicados (por icao24 y firstSeen)
         """
-        url = f"{self.base_url}/flights/all"
-        
         end_time = int(time.time())
-        start_time = end_time - int(hours_back * 3600)
-        
-        params = {
-            "begin": start_time,
-            "end": end_time
-        }
-        
-        response = await self.oauth_client.get(url, params=params)
+        return await self.get_flights(end_time - int(hours_back * 3600), end_time)
+
+    async def get_flights(self, begin: int, end: int) -> List[Dict[str, Any]]:
+        """
+        Obtiene todos los vuelos vistos entre begin y end (Unix).
+
+        OpenSky rechaza intervalos de más de 2 horas, así que el rango se
+        divide en bloques alineados a FLIGHTS_MAX_INTERVAL que se piden en
+        paralelo (como mucho OSKY_FLIGHTS_CONCURRENCY a la vez). Los bloques
+        ya cerrados (OSKY_FLIGHTS_SETTLE_SECONDS) se guardan en disco y no
+        se vuelven a pedir.
+
+        Args:
+            begin: Inicio del rango.
+            end: Fin del rango.
+
+        Returns:
+            Lista de vuelos sin duplicados (por icao24 y firstSeen)
+        """
+        now = int(time.time())
+        semaphore = asyncio.Semaphore(settings.OSKY_FLIGHTS_CONCURRENCY)
+
+        async def fetch(chunk: Tuple[int, int]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self._get_flights_chunk(*chunk, now=now)
+
+        chunks = await asyncio.gather(
+            *[fetch(chunk) for chunk in self._flight_chunks(begin, end)]
+        )
+
+        # Un vuelo que cruza el borde entre dos bloques aparece en ambos
+        flights: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        for chunk in chunks:
+            for flight in chunk:
+                # Los bloques alineados empiezan antes de begin
+                last_seen = flight.get("lastSeen")
+                if last_seen is not None and last_seen < begin:
+                    continue
+                flights[(flight.get("icao24"), flight.get("firstSeen"))] = flight
+        return list(flights.values())
+
+    @staticmethod
+    def _flight_chunks(start_time: int, end_time: int) -> List[Tuple[int, int]]:
+        """
+        Bloques [inicio, fin] alineados que cubren el rango. Alinearlos hace
+        que consultas distintas compartan los mismos bloques en caché; el
+        último se recorta a end_time.
+        """
+        chunks = []
+        begin = start_time - start_time % FLIGHTS_MAX_INTERVAL
+        while begin < end_time:
+            chunks.append((begin, min(begin + FLIGHTS_MAX_INTERVAL, end_time)))
+            begin += FLIGHTS_MAX_INTERVAL
+        return chunks
+
+    async def _get_flights_chunk(self, begin: int, end: int, now: int) -> List[Dict[str, Any]]:
+        """
+        Vuelos de un bloque, desde disco si el bloque ya está cerrado.
+
+        Solo se guardan bloques cerrados con vuelos: un 404 o una lista
+        vacía puede deberse a que OpenSky aún no ha procesado el intervalo.
+        """
+        closed = (
+            end - begin == FLIGHTS_MAX_INTERVAL
+            and end <= now - settings.OSKY_FLIGHTS_SETTLE_SECONDS
+        )
+        path = os.path.join(settings.OSKY_FLIGHTS_CACHE_DIR, f"flights_{begin}_{end}.json")
+        if closed:
+            cached = await asyncio.to_thread(_read_json, path)
+            if cached is not None:
+                self.flights_cache_hits += 1
+                return cached
+            self.flights_cache_misses += 1
+
+        response = await self._get(
+            f"{self.base_url}/flights/all",
+            params={"begin": begin, "end": end},
+            priority=UpstreamPriority.BULK,
+        )
+        # OpenSky responde 404 cuando no hay vuelos en el intervalo
+        if response.status_code == 404:
+            return []
         response.raise_for_status()
-        
-        return response.json()
+        flights = response.json() or []
+
+        if closed and flights:
+            await asyncio.to_thread(_write_flights_chunk, path, flights)
+        return flights
     
     async def get_state_vectors_area(
         self,
-        bbox: tuple[float, float, float, float]
+        bbox: tuple[float, float, float, float],
+        priority: UpstreamPriority = UpstreamPriority.INTERACTIVE,
     ) -> Dict[str, Any]:
         """
         Obtiene vectores de estado de aeronaves en un área específica.
         
         Args:
             bbox: Tupla con (lon_min, lat_min, lon_max, lat_max)
+            priority: Prioridad en la cola del planificador
             
         Returns:
             JSON con vectores de estado
@@ -104,12 +279,15 @@ class OskyService:
             "lamax": bbox[3],
         }
         
-        response = await self.oauth_client.get(url, params=params)
+        response = await self._get(url, params=params, priority=priority)
         response.raise_for_status()
         
         return response.json()
     
-    async def get_all_state_vectors(self) -> Dict[str, Any]:
+    async def get_all_state_vectors(
+        self,
+        priority: UpstreamPriority = UpstreamPriority.POLLER,
+    ) -> Dict[str, Any]:
         """
         Obtiene todos los vectores de estado disponibles.
         
@@ -118,7 +296,7 @@ class OskyService:
         """
         url = f"{self.base_url}/states/all"
         
-        response = await self.oauth_client.get(url)
+        response = await self._get(url, priority=priority)
         response.raise_for_status()
         
         return response.json()
@@ -126,13 +304,55 @@ class OskyService:
     
         params={"icao24":icao,"time":0}    
         url= f'{self.base_url}/tracks/all'
-        response = await self.oauth_client.get(url,params=params)
+        response = await self._get(url, params=params, priority=UpstreamPriority.TRACKS)
         response.raise_for_status()
         return response.json()
     
     async def close(self):
         """Cierra el cliente OAuth2."""
         await self.oauth_client.close()
+        if self.token_store is not None:
+            await self.token_store.close()
+
+
+def _read_json(path: str) -> Optional[Any]:
+    try:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return None
+
+
+def _write_json(path: str, data: Any) -> None:
+    # Escritura atómica: un lector nunca ve un archivo a medias
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _write_flights_chunk(path: str, flights: List[Dict[str, Any]]) -> None:
+    _write_json(path, flights)
+    _prune_flights_cache(os.path.dirname(path), settings.OSKY_FLIGHTS_CACHE_MAX_FILES)
+
+
+def _prune_flights_cache(directory: str, max_files: int) -> None:
+    """
+    Borra los bloques más antiguos (por inicio) hasta dejar max_files.
+    """
+    chunks = []
+    for name in os.listdir(directory):
+        parts = name[:-len(".json")].split("_") if name.endswith(".json") else []
+        if len(parts) == 3 and parts[0] == "flights" and parts[1].isdigit():
+            chunks.append((int(parts[1]), name))
+    chunks.sort()
+    for _, name in chunks[:max(len(chunks) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Otro worker lo borró antes
+            pass
 
 
 # Ejemplo de uso
@@ -0,0 +1,343 @@
+"""
+Append-only archive of the poller's snapshots, in hourly Arrow IPC files.
+
+Layout, partitioned by the UTC hour of the snapshot time:
+
+    {directory}/2024-05-01/13.arrow       Arrow IPC stream, one record batch
+                                          per snapshot
+    {directory}/2024-05-01/13.arrow.idx   time index, one JSON line per batch:
+                                          {"time", "fetched_at", "offset",
+                                           "length", "rows"}
+
+The index line of a batch is written after the batch is flushed, so readers
+only ever see complete batches, even in the file of a writer that crashed
+(such a file lacks the end-of-stream marker and is left as is; the next
+writer starts a new part, 13.1.arrow). Readers memory-map the files and
+read the batches in a time range straight from the offsets in the index.
+With compression=None the columns of the batches read point into the
+mapping (no copies); with lz4 or zstd each batch read is decompressed.
+
+Only one process writes to a directory: the one holding an flock on
+{directory}/.writer.lock. The other workers skip their snapshots, and one
+of them takes over when the writer exits. With a retention, the writer
+deletes the day folders that fell out of it whenever it starts a new hour.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from app.services.vectors.columns import (
+    BOOL_COLUMNS,
+    FLOAT_COLUMNS,
+    INT_COLUMNS,
+    MISSING_INT,
+    ROUTE_COLUMNS,
+    STRING_COLUMNS,
+    StateVectorColumns,
+)
+from app.services.vectors.snapshot import StateVectorSnapshot
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = pa.schema(
+    [
+        ("snapshot_time", pa.int64()),
+        *[(name, pa.string()) for name in STRING_COLUMNS],
+        *[(name, pa.int64()) for name in INT_COLUMNS],
+        *[(name, pa.float64()) for name in FLOAT_COLUMNS],
+        *[(name, pa.bool_()) for name in BOOL_COLUMNS],
+        ("category", pa.int8()),
+        # ICAO code of the route airports filled by the flight enrichment
+        *[(name, pa.string()) for name in ROUTE_COLUMNS],
+    ]
+)
+
+INDEX_SUFFIX = ".idx"
+
+
+def snapshot_to_batch(snapshot: StateVectorSnapshot) -> pa.RecordBatch:
+    """Converts a snapshot to a record batch with the archive's SCHEMA."""
+    columns = snapshot.columns
+    arrays: Dict[str, pa.Array] = {
+        "snapshot_time": pa.array(np.full(len(columns), _snapshot_time(snapshot), dtype=np.int64)),
+    }
+    for name in STRING_COLUMNS:
+        arrays[name] = pa.array(getattr(columns, name), type=pa.string())
+    for name in INT_COLUMNS:
+        values = getattr(columns, name)
+        arrays[name] = pa.array(values, mask=values == MISSING_INT)
+    for name in FLOAT_COLUMNS:
+        # NaN becomes null
+        arrays[name] = pa.array(getattr(columns, name), from_pandas=True)
+    for name in BOOL_COLUMNS:
+        arrays[name] = pa.array(getattr(columns, name))
+    arrays["category"] = pa.array(columns.category, type=pa.int8())
+    for name in ROUTE_COLUMNS:
+        arrays[name] = pa.array(
+            [airport["icao"] if airport else None for airport in getattr(columns, name).tolist()],
+            type=pa.string(),
+        )
+    return pa.RecordBatch.from_pydict(arrays, schema=SCHEMA)
+
+
+def batch_to_columns(batch: pa.RecordBatch) -> StateVectorColumns:
+    """Inverse of snapshot_to_batch; route airports only keep their code."""
+    arrays: Dict[str, np.ndarray] = {
+        "icao24": np.array(batch.column("icao24").to_pylist(), dtype=str),
+    }
+    for name in STRING_COLUMNS:
+        if name != "icao24":
+            arrays[name] = np.array(batch.column(name).to_pylist(), dtype=object)
+    for name in INT_COLUMNS:
+        arrays[name] = batch.column(name).fill_null(MISSING_INT).to_numpy()
+    for name in FLOAT_COLUMNS:
+        # Nulls become NaN
+        arrays[name] = batch.column(name).to_numpy(zero_copy_only=False)
+    for name in BOOL_COLUMNS:
+        arrays[name] = batch.column(name).to_numpy(zero_copy_only=False)
+    arrays["category"] = batch.column("category").to_numpy()
+    for name in ROUTE_COLUMNS:
+        arrays[name] = np.array(
+            [{"icao": code} if code else None for code in batch.column(name).to_pylist()],
+            dtype=object,
+        )
+    return StateVectorColumns.from_arrays(arrays)
+
+
+class SnapshotArchive:
+    """Writer of the archive (see module docstring)."""
+
+    def __init__(
+        self,
+        directory: str,
+        compression: Optional[str] = None,
+        retention_days: Optional[int] = None,
+    ):
+        """
+        Args:
+            directory: Root of the archive.
+            compression: IPC buffer compression, "lz4", "zstd" or None.
+            retention_days: Days of snapshots kept, counting the current
+                one; None or 0 keep everything.
+        """
+        self.directory = Path(directory)
+        self.compression = compression
+        self.retention_days = retention_days
+        self.snapshots_written = 0
+        self._options = pa.ipc.IpcWriteOptions(compression=compression)
+        self._lock = threading.Lock()
+        self._lock_fd: Optional[int] = None
+        self._hour: Optional[str] = None
+        self._sink: Optional[pa.OSFile] = None
+        self._writer: Optional[pa.ipc.RecordBatchStreamWriter] = None
+        self._index: Optional[Any] = None
+
+    @property
+    def is_writer(self) -> bool:
+        """Whether this process holds the directory's writer lock."""
+        return self._lock_fd is not None
+
+    async def on_snapshot(
+        self, previous: Optional[StateVectorSnapshot], snapshot: StateVectorSnapshot
+    ) -> None:
+        """Poller listener: archives every new snapshot off the event loop."""
+        await asyncio.to_thread(self.append, snapshot)
+
+    def append(self, snapshot: StateVectorSnapshot) -> bool:
+        """
+        Appends the snapshot to the file of its hour. Returns False when
+        another process is the writer.
+        """
+        with self._lock:
+            if not self._acquire_writer_lock():
+                return False
+            batch = snapshot_to_batch(snapshot)
+            hour = _partition(_snapshot_time(snapshot))
+            if hour != self._hour:
+                self._close_file()
+                self._delete_expired(hour)
+                self._open_file(hour)
+            try:
+                offset = self._sink.tell()
+                self._writer.write_batch(batch)
+                self._sink.flush()
+                entry = {
+                    "time": _snapshot_time(snapshot),
+                    "fetched_at": snapshot.fetched_at,
+                    "offset": offset,
+                    "length": self._sink.tell() - offset,
+                    "rows": batch.num_rows,
+                }
+                self._index.write(json.dumps(entry) + "\n")
+                self._index.flush()
+            except Exception:
+                # The file may end with a partial batch: continue in a new part
+                self._close_file()
+                raise
+            self.snapshots_written += 1
+            return True
+
+    def close(self) -> None:
+        """Ends the current file and releases the writer lock."""
+        with self._lock:
+            self._close_file()
+            if self._lock_fd is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    def _acquire_writer_lock(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.directory / ".writer.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        logger.info("Archiving state vector snapshots to %s", self.directory)
+        return True
+
+    def _delete_expired(self, hour: str) -> None:
+        if not self.retention_days:
+            return
+        day = datetime.strptime(hour.split("T")[0], "%Y-%m-%d")
+        # Folder names sort as dates
+        oldest_kept = (day - timedelta(days=self.retention_days - 1)).strftime("%Y-%m-%d")
+        for folder in self.directory.iterdir():
+            if folder.is_dir() and _is_day(folder.name) and folder.name < oldest_kept:
+                try:
+                    shutil.rmtree(folder)
+                except OSError:
+                    # Retried when the next hour starts
+                    logger.exception("Could not delete archive folder %s", folder)
+                else:
+                    logger.info("Deleted archive folder %s", folder)
+
+    def _open_file(self, hour: str) -> None:
+        day, hh = hour.split("T")
+        folder = self.directory / day
+        folder.mkdir(parents=True, exist_ok=True)
+        # Files left by an earlier writer are never appended to
+        path = folder / f"{hh}.arrow"
+        part = 0
+        while path.exists():
+            part += 1
+            path = folder / f"{hh}.{part}.arrow"
+        self._sink = pa.OSFile(str(path), "wb")
+        self._writer = pa.ipc.new_stream(self._sink, SCHEMA, options=self._options)
+        self._index = open(str(path) + INDEX_SUFFIX, "w")
+        self._hour = hour
+
+    def _close_file(self) -> None:
+        if self._writer is not None:
+            try:
+                self._writer.close()
+                self._sink.close()
+            except Exception:
+                logger.exception("Could not close the archive file of %s", self._hour)
+            self._index.close()
+        self._hour = self._sink = self._writer = self._index = None
+
+
+class SnapshotArchiveReader:
+    """Reads snapshots back from an archive directory by time range."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def files(self, start: float, end: float) -> List[Path]:
+        """Archive files of the hours overlapping [start, end), oldest first."""
+        hour = int(start) - int(start) % 3600
+        paths = []
+        while hour < end:
+            day, hh = _partition(hour).split("T")
+            folder = self.directory / day
+            parts = list(folder.glob(f"{hh}.arrow")) + list(folder.glob(f"{hh}.*.arrow"))
+            paths.extend(sorted(parts, key=_part_number))
+            hour += 3600
+        return paths
+
+    def index(self, path: Path) -> List[Dict[str, Any]]:
+        """Index entries of an archive file."""
+        try:
+            with open(str(path) + INDEX_SUFFIX) as f:
+                return [json.loads(line) for line in f if line.endswith("\n")]
+        except FileNotFoundError:
+            return []
+
+    def read_batches(
+        self, start: float, end: float, columns: Optional[Sequence[str]] = None
+    ) -> Iterator[pa.RecordBatch]:
+        """
+        Batches (one per snapshot) whose snapshot time is in [start, end),
+        in time order, optionally limited to some columns.
+        """
+        for _, batch in self._read(start, end):
+            yield batch.select(columns) if columns else batch
+
+    def read_table(
+        self, start: float, end: float, columns: Optional[Sequence[str]] = None
+    ) -> pa.Table:
+        """All the snapshots in [start, end) as one table."""
+        schema = pa.schema([SCHEMA.field(name) for name in columns]) if columns else SCHEMA
+        return pa.Table.from_batches(list(self.read_batches(start, end, columns)), schema=schema)
+
+    def replay(self, start: float, end: float) -> Iterator[StateVectorSnapshot]:
+        """The snapshots in [start, end), rebuilt as poller snapshots."""
+        for entry, batch in self._read(start, end):
+            yield StateVectorSnapshot(
+                time=entry["time"],
+                columns=batch_to_columns(batch),
+                fetched_at=entry["fetched_at"],
+            )
+
+    def _read(self, start: float, end: float) -> Iterator[Tuple[Dict[str, Any], pa.RecordBatch]]:
+        for path in self.files(start, end):
+            entries = [entry for entry in self.index(path) if start <= entry["time"] < end]
+            if not entries:
+                continue
+            with pa.memory_map(str(path)) as source:
+                schema = pa.ipc.open_stream(source).schema
+                for entry in entries:
+                    source.seek(entry["offset"])
+                    message = pa.ipc.read_message(source)
+                    if message.type == "schema":
+                        # The first batch is preceded by the schema
+                        message = pa.ipc.read_message(source)
+                    yield entry, pa.ipc.read_record_batch(message, schema)
+
+
+def _snapshot_time(snapshot: StateVectorSnapshot) -> int:
+    return int(snapshot.time if snapshot.time is not None else snapshot.fetched_at)
+
+
+def _partition(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H")
+
+
+def _is_day(name: str) -> bool:
+    try:
+        datetime.strptime(name, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+
+def _part_number(path: Path) -> int:
+    # 13.arrow -> 0, 13.2.arrow -> 2
+    parts = path.name.split(".")
+    return int(parts[1]) if len(parts) == 3 else 0
@@ -0,0 +1,215 @@
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.schemas.vector_schema import VectorOut
+
+BBox = tuple[float, float, float, float]
+
+# OpenSky state vector indexes for each stored column
+STRING_COLUMNS = {"icao24": 0, "callsign": 1, "origin_country": 2, "squawk": 14}
+FLOAT_COLUMNS = {
+    "longitude": 5,
+    "latitude": 6,
+    "baro_altitude": 7,
+    "velocity": 9,
+    "true_track": 10,
+    "vertical_rate": 11,
+    "geo_altitude": 13,
+}
+# Nullable integer columns use MISSING_INT instead of None
+INT_COLUMNS = {"time_position": 3, "last_contact": 4}
+BOOL_COLUMNS = {"on_ground": 8}
+# Not from OpenSky states: filled by the flight enrichment (dicts or None)
+ROUTE_COLUMNS = ("departure", "arrival")
+# Only present when OpenSky is queried with extended=1
+CATEGORY_INDEX = 17
+MIN_STATE_LENGTH = 17
+
+MISSING_INT = -1
+
+# Keys of a serialized vector, in the order declared by VectorOut
+VECTOR_OUT_FIELDS = tuple(VectorOut.model_fields)
+
+
+@dataclass
+class StateVectorColumns:
+    """
+    Columnar representation of a set of OpenSky state vectors.
+
+    Built once per upstream response; filtering and serialization work on
+    whole columns instead of validating one Pydantic model per aircraft.
+    """
+
+    icao24: np.ndarray
+    callsign: np.ndarray
+    origin_country: np.ndarray
+    squawk: np.ndarray
+    time_position: np.ndarray
+    last_contact: np.ndarray
+    longitude: np.ndarray
+    latitude: np.ndarray
+    baro_altitude: np.ndarray
+    velocity: np.ndarray
+    true_track: np.ndarray
+    vertical_rate: np.ndarray
+    geo_altitude: np.ndarray
+    on_ground: np.ndarray
+    category: np.ndarray
+    departure: np.ndarray
+    arrival: np.ndarray
+
+    @classmethod
+    def from_states(cls, states: Sequence[list]) -> "StateVectorColumns":
+        """
+        Builds the columns from the `states` list of a states/all response.
+        Malformed (too short) states are dropped.
+        """
+        rows = [state for state in states if len(state) >= MIN_STATE_LENGTH]
+        if not rows:
+            return cls.empty()
+
+        transposed = list(zip(*rows))
+        columns: Dict[str, np.ndarray] = {}
+        columns["icao24"] = np.array(transposed[STRING_COLUMNS["icao24"]], dtype=str)
+        for name in ("callsign", "origin_country", "squawk"):
+            columns[name] = np.array(transposed[STRING_COLUMNS[name]], dtype=object)
+        for name, index in FLOAT_COLUMNS.items():
+            # None becomes NaN
+            columns[name] = np.array(transposed[index], dtype=np.float64)
+        for name, index in INT_COLUMNS.items():
+            values = np.array(transposed[index], dtype=np.float64)
+            columns[name] = np.where(np.isnan(values), MISSING_INT, values).astype(np.int64)
+        for name, index in BOOL_COLUMNS.items():
+            columns[name] = np.array(transposed[index], dtype=bool)
+        columns["category"] = np.array(
+            [state[CATEGORY_INDEX] if len(state) > CATEGORY_INDEX else 0 for state in rows],
+            dtype=np.float64,
+        )
+        columns["category"] = np.nan_to_num(columns["category"]).astype(np.int8)
+        for name in ROUTE_COLUMNS:
+            columns[name] = np.full(len(rows), None, dtype=object)
+        return cls(**columns)
+
+    @classmethod
+    def empty(cls) -> "StateVectorColumns":
+        return cls.from_arrays({})
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "StateVectorColumns":
+        """Builds an instance filling missing columns with empty arrays."""
+        columns = {}
+        for column in fields(cls):
+            if column.name in arrays:
+                columns[column.name] = arrays[column.name]
+            else:
+                columns[column.name] = np.empty(0, dtype=_empty_dtype(column.name))
+        return cls(**columns)
+
+    @classmethod
+    def concat(cls, parts: Sequence["StateVectorColumns"]) -> "StateVectorColumns":
+        if not parts:
+            return cls.empty()
+        return cls(
+            **{
+                column.name: np.concatenate([getattr(part, column.name) for part in parts])
+                for column in fields(cls)
+            }
+        )
+
+    def __len__(self) -> int:
+        return len(self.icao24)
+
+    def take(self, indices: np.ndarray) -> "StateVectorColumns":
+        """Returns the rows at `indices` (an index or boolean array)."""
+        return StateVectorColumns(
+            **{column.name: getattr(self, column.name)[indices] for column in fields(self)}
+        )
+
+    def deduplicate(self) -> "StateVectorColumns":
+        """Keeps the last row seen for every icao24."""
+        if len(self) == 0:
+            return self
+        _, reversed_first = np.unique(self.icao24[::-1], return_index=True)
+        keep = np.sort(len(self) - 1 - reversed_first)
+        return self.take(keep)
+
+    def bbox_indices(self, bbox: BBox) -> np.ndarray:
+        """
+        Indexes of the aircraft inside bbox (lomin, lamin, lomax, lamax).
+        Aircraft without a position never match.
+        """
+        return np.flatnonzero(bbox_mask(self.longitude, self.latitude, bbox))
+
+    def column_values(self, name: str, indices: Optional[np.ndarray] = None) -> List[Any]:
+        """
+        Values of a column as JSON-ready Python objects, with NaN and
+        MISSING_INT converted to None.
+        """
+        values = getattr(self, name)
+        if indices is not None:
+            values = values[indices]
+        if name in FLOAT_COLUMNS:
+            missing = np.isnan(values)
+        elif name in INT_COLUMNS:
+            missing = values == MISSING_INT
+        else:
+            return values.tolist()
+        if not missing.any():
+            return values.tolist()
+        objects = values.astype(object)
+        objects[missing] = None
+        return objects.tolist()
+
+    def to_records(
+        self,
+        indices: Optional[np.ndarray] = None,
+        names: Sequence[str] = VECTOR_OUT_FIELDS,
+    ) -> List[Dict[str, Any]]:
+        """Serializes the rows as a list of dicts, one column at a time."""
+        values = [self.column_values(name, indices) for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def to_vectors(self, indices: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Same payload as VectorsResponse.model_dump()."""
+        return {"vectors": self.to_records(indices)}
+
+
+def split_bbox(bbox: BBox) -> List[BBox]:
+    """
+    Splits a bbox crossing the antimeridian (lomin > lomax) into the two
+    boxes on each side of it.
+    """
+    lomin, lamin, lomax, lamax = bbox
+    if lomin <= lomax:
+        return [bbox]
+    return [(lomin, lamin, 180.0, lamax), (-180.0, lamin, lomax, lamax)]
+
+
+def bbox_mask(longitude: np.ndarray, latitude: np.ndarray, bbox: BBox) -> np.ndarray:
+    """
+    Boolean mask of the positions inside bbox. lomin > lomax selects a box
+    crossing the antimeridian.
+    """
+    lomin, lamin, lomax, lamax = bbox
+    # NaN comparisons are False, so missing positions drop out
+    if lomin <= lomax:
+        in_longitude = (longitude >= lomin) & (longitude <= lomax)
+    else:
+        in_longitude = (longitude >= lomin) | (longitude <= lomax)
+    return in_longitude & (latitude >= lamin) & (latitude <= lamax)
+
+
+def _empty_dtype(name: str) -> Any:
+    if name == "icao24":
+        return str
+    if name in STRING_COLUMNS or name in ROUTE_COLUMNS:
+        return object
+    if name in FLOAT_COLUMNS:
+        return np.float64
+    if name in INT_COLUMNS:
+        return np.int64
+    if name in BOOL_COLUMNS:
+        return bool
+    return np.int8
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.airport_cache import AirportCache, AirportIndex
+from app.services.osky_service import OskyService
+from app.services.vectors.snapshot import StateVectorSnapshot
+
+logger = logging.getLogger(__name__)
+
+# callsign -> (estDepartureAirport, estArrivalAirport)
+RouteIndex = Dict[str, Tuple[Optional[str], Optional[str]]]
+
+
+class FlightEnrichment:
+    """
+    Adds departure and arrival airports to the poller's snapshots.
+
+    OpenSky fills flights/all in a nightly batch, so the flights of the last
+    hours are almost never there yet. The route index is built from the
+    flights of `delay` seconds earlier instead (a day by default), keyed by
+    callsign: a state vector gets the route its callsign flew the day
+    before. That holds for scheduled flights, which repeat their callsign
+    and route daily; flights that don't (charters, general aviation, a
+    changed schedule) get no route or last day's one.
+
+    A background task rebuilds the index every `interval` seconds and
+    resolves its airports through the airport cache, again whenever the
+    cache loads or reloads. Every poll then joins it onto the whole snapshot
+    at once (as a poller processor), so requests serve routes at no extra
+    cost.
+    """
+
+    def __init__(
+        self,
+        osky_service: OskyService,
+        airport_cache: AirportCache,
+        interval: float = 900.0,
+        hours_back: float = 2.0,
+        delay: float = 86400.0,
+        is_active: Optional[Callable[[], bool]] = None,
+        idle_interval: float = 5.0,
+    ):
+        """
+        Args:
+            osky_service: Shared OpenSky client.
+            airport_cache: Resolves airport codes to names and coordinates.
+            interval: Seconds between two rebuilds of the route index.
+            hours_back: Hours of flights, ending `delay` seconds ago, used
+                to build the index. Long-haul flights now in the air took
+                off up to about 16 hours before.
+            delay: Seconds between now and the end of those flights; a
+                whole number of days matches daily schedules.
+            is_active: Whether this worker needs the index, e.g. whether it
+                is the elected poller. None always refreshes.
+            idle_interval: Seconds between two is_active checks while it
+                returns False.
+        """
+        self.osky_service = osky_service
+        self.airport_cache = airport_cache
+        self.interval = interval
+        self.hours_back = hours_back
+        self.delay = delay
+        self.is_active = is_active
+        self.idle_interval = idle_interval
+        self._codes: RouteIndex = {}
+        self._routes: Dict[str, Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]] = {}
+        # Airport cache index the routes were resolved with
+        self._resolved_with: Optional[AirportIndex] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def refresh(self) -> int:
+        """Rebuilds the route index from past flights. Returns its size."""
+        end = int(time.time() - self.delay)
+        flights = await self.osky_service.get_flights(end - int(self.hours_back * 3600), end)
+        self.set_routes(build_route_index(flights))
+        return len(self._routes)
+
+    def set_routes(self, routes: RouteIndex) -> None:
+        """Replaces the route index, resolving every airport code once."""
+        self._codes = routes
+        self._resolve()
+
+    def process(self, snapshot: StateVectorSnapshot) -> None:
+        """Poller processor: fills the departure/arrival columns in place."""
+        if self.airport_cache.index is not self._resolved_with:
+            # Loaded or reloaded since the routes were resolved
+            self._resolve()
+        if not self._routes:
+            return
+        columns = snapshot.columns
+        departure = np.full(len(columns), None, dtype=object)
+        arrival = np.full(len(columns), None, dtype=object)
+        routes = self._routes
+        for row, callsign in enumerate(columns.callsign.tolist()):
+            route = routes.get(callsign.strip()) if callsign else None
+            if route is not None:
+                departure[row], arrival[row] = route
+        columns.departure = departure
+        columns.arrival = arrival
+
+    def _resolve(self) -> None:
+        self._resolved_with = self.airport_cache.index
+        airports: Dict[str, Optional[Dict[str, Any]]] = {}
+
+        def resolve(code: Optional[str]) -> Optional[Dict[str, Any]]:
+            if not code:
+                return None
+            if code not in airports:
+                airports[code] = self._route_airport(code)
+            return airports[code]
+
+        self._routes = {
+            callsign: (resolve(departure), resolve(arrival))
+            for callsign, (departure, arrival) in self._codes.items()
+        }
+
+    def _route_airport(self, code: str) -> Dict[str, Any]:
+        # Shared by every aircraft flying to or from this airport
+        airport = self.airport_cache.get_by_icao(code) if self.airport_cache.loaded else None
+        if airport is None:
+            return {"icao": code, "iata": None, "name": None, "location": None}
+        return {
+            "icao": airport["icao"],
+            "iata": airport["iata"],
+            "name": airport["name"],
+            "location": airport["location"],
+        }
+
+    async def _run(self) -> None:
+        while True:
+            if self.is_active is not None and not self.is_active():
+                # Only the worker running the processors spends credits
+                await asyncio.sleep(self.idle_interval)
+                continue
+            try:
+                await self.refresh()
+            except Exception:
+                # Keep the previous index until the next refresh
+                logger.exception("Flight enrichment refresh failed")
+            await asyncio.sleep(self.interval)
+
+
+def build_route_index(flights: List[Dict[str, Any]]) -> RouteIndex:
+    """
+    callsign -> (estDepartureAirport, estArrivalAirport) of the latest
+    flight of every callsign.
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    for flight in flights:
+        callsign = (flight.get("callsign") or "").strip()
+        if not callsign:
+            continue
+        current = latest.get(callsign)
+        if current is None or (flight.get("firstSeen") or 0) >= (current.get("firstSeen") or 0):
+            latest[callsign] = flight
+    return {
+        callsign: (flight.get("estDepartureAirport"), flight.get("estArrivalAirport"))
+        for callsign, flight in latest.items()
+    }
@@ -0,0 +1,93 @@
+import math
+
+import numpy as np
+
+from app.services.vectors.columns import BBox, bbox_mask, split_bbox
+
+DEFAULT_CELL_DEG = 1.0
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid over a set of aircraft positions.
+
+    Aircraft indexes are sorted by cell id (row-major), with an offsets array
+    giving where every cell starts, so the cells of one grid row covering a
+    longitude range are a single contiguous slice. A bbox query costs one
+    slice per grid row it spans plus the matching aircraft, independently
+    of the fleet size.
+    """
+
+    def __init__(
+        self,
+        longitude: np.ndarray,
+        latitude: np.ndarray,
+        cell_deg: float = DEFAULT_CELL_DEG,
+    ):
+        self.cell_deg = cell_deg
+        self.n_cols = math.ceil(360 / cell_deg)
+        self.n_rows = math.ceil(180 / cell_deg)
+        self._longitude = longitude
+        self._latitude = latitude
+
+        positioned = np.flatnonzero(~np.isnan(longitude) & ~np.isnan(latitude))
+        cells = (
+            self._row_of(latitude[positioned]) * self.n_cols
+            + self._col_of(longitude[positioned])
+        )
+        order = np.argsort(cells, kind="stable")
+        self._sorted_indexes = positioned[order]
+        counts = np.bincount(cells, minlength=self.n_rows * self.n_cols)
+        # Plain list: indexed a few times per query, cheaper than numpy scalars
+        self._offsets = [0] + np.cumsum(counts).tolist()
+
+    def _col_of(self, longitude: np.ndarray) -> np.ndarray:
+        cols = np.floor((longitude + 180) / self.cell_deg).astype(np.int64)
+        return np.clip(cols, 0, self.n_cols - 1)
+
+    def _row_of(self, latitude: np.ndarray) -> np.ndarray:
+        rows = np.floor((latitude + 90) / self.cell_deg).astype(np.int64)
+        return np.clip(rows, 0, self.n_rows - 1)
+
+    # Scalar versions for query bounds: numpy call overhead would dominate
+    def _col(self, longitude: float) -> int:
+        return min(max(int((longitude + 180) // self.cell_deg), 0), self.n_cols - 1)
+
+    def _row(self, latitude: float) -> int:
+        return min(max(int((latitude + 90) // self.cell_deg), 0), self.n_rows - 1)
+
+    def candidates(self, bbox: BBox) -> np.ndarray:
+        """
+        Indexes of the aircraft in the cells overlapping bbox. A superset of
+        the exact result.
+        """
+        _, lamin, _, lamax = bbox
+        if lamin > lamax:
+            return np.empty(0, dtype=np.int64)
+
+        first_row, last_row = self._row(lamin), self._row(lamax)
+        offsets = self._offsets
+        slices = []
+        for lomin, _, lomax, _ in split_bbox(bbox):
+            first_col, last_col = self._col(lomin), self._col(lomax)
+            for row in range(first_row, last_row + 1):
+                start = offsets[row * self.n_cols + first_col]
+                end = offsets[row * self.n_cols + last_col + 1]
+                if end > start:
+                    slices.append(self._sorted_indexes[start:end])
+
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def query(self, bbox: BBox) -> np.ndarray:
+        """
+        Sorted indexes of the aircraft inside bbox (lomin, lamin, lomax,
+        lamax). lomin > lomax selects a box crossing the antimeridian.
+        """
+        candidates = self.candidates(bbox)
+        mask = bbox_mask(self._longitude[candidates], self._latitude[candidates], bbox)
+        if bbox[0] > bbox[2]:
+            # Both halves of an antimeridian box can share their edge cell
+            return np.unique(candidates[mask])
+        return np.sort(candidates[mask])
@@ -0,0 +1,247 @@
+import asyncio
+import fcntl
+import inspect
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Union
+
+from app.services.clients.upstream_scheduler import UpstreamPriority, poll_credits_per_day
+from app.services.osky_service import OskyService
+from app.services.vectors import shared
+from app.services.vectors.columns import BBox, StateVectorColumns
+from app.services.vectors.grid_index import DEFAULT_CELL_DEG
+from app.services.vectors.snapshot import StateVectorSnapshot
+from app.utils.exceptions import UpstreamUnavailableException
+
+logger = logging.getLogger(__name__)
+
+# Called with a new snapshot before it replaces the current one
+SnapshotProcessor = Callable[[StateVectorSnapshot], None]
+# Called with (previous, current) after every successful poll
+SnapshotListener = Callable[
+    [Optional[StateVectorSnapshot], StateVectorSnapshot], Union[None, Awaitable[None]]
+]
+
+
+class StateVectorPoller:
+    """
+    Polls OpenSky state vectors on a fixed cadence and keeps the latest
+    snapshot in memory, so bbox queries don't need an upstream call.
+
+    With a shared_dir, the workers of a host elect a single poller: the one
+    holding an flock on {shared_dir}/.poller.lock. It polls, runs the
+    processors and publishes every snapshot to {shared_dir}/snapshot.arrow
+    (see shared). The other workers load each new file instead of polling
+    and run their own listeners on it, so their tracks and streams keep up.
+    They retry the lock on every check and one of them takes over when the
+    leader exits. Without a shared_dir every instance polls on its own.
+    """
+
+    def __init__(
+        self,
+        osky_service: OskyService,
+        interval: float,
+        regions: Optional[List[BBox]] = None,
+        grid_cell_deg: float = DEFAULT_CELL_DEG,
+        shared_dir: Optional[str] = None,
+        follow_interval: float = 1.0,
+    ):
+        """
+        Args:
+            osky_service: Shared OpenSky client.
+            interval: Seconds between the start of two polls.
+            regions: Bboxes (lomin, lamin, lomax, lamax) to poll. When empty
+                the whole world is fetched with a single call.
+            grid_cell_deg: Cell size of the snapshot's spatial index.
+            shared_dir: Directory where the workers elect the poller and
+                share its snapshots; None polls in every instance.
+            follow_interval: Seconds between two checks of the shared
+                snapshot by the workers that don't poll.
+        """
+        self.osky_service = osky_service
+        self.interval = interval
+        self.regions = regions or []
+        self.grid_cell_deg = grid_cell_deg
+        self.shared_dir = Path(shared_dir) if shared_dir else None
+        self.follow_interval = follow_interval
+        self._snapshot: Optional[StateVectorSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._processors: List[SnapshotProcessor] = []
+        self._listeners: List[SnapshotListener] = []
+        self._lock_fd: Optional[int] = None
+        self._loaded_mtime: Optional[int] = None
+
+    @property
+    def snapshot(self) -> Optional[StateVectorSnapshot]:
+        return self._snapshot
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this instance polls OpenSky."""
+        return self.shared_dir is None or self._lock_fd is not None
+
+    @property
+    def credits_per_day(self) -> float:
+        """OpenSky credits the polls spend in a day."""
+        return poll_credits_per_day(self.interval, self.regions)
+
+    def add_processor(self, processor: SnapshotProcessor) -> None:
+        """
+        Registers a callback that may modify every new snapshot in place
+        before it is served or passed to the listeners.
+        """
+        self._processors.append(processor)
+
+    def add_listener(self, listener: SnapshotListener) -> None:
+        """
+        Registers a callback (sync or async) run with the previous and the
+        new snapshot after every poll.
+        """
+        self._listeners.append(listener)
+
+    async def start(self) -> None:
+        if self._task is None:
+            if self.shared_dir is None:
+                self._reserve_credits(self.credits_per_day)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.shared_dir is None:
+            self._reserve_credits(-self.credits_per_day)
+        self._release_leader_lock()
+
+    async def poll_once(self) -> StateVectorSnapshot:
+        """
+        Fetches the configured regions and replaces the current snapshot.
+        """
+        if not self.regions:
+            osky_data = await self.osky_service.get_all_state_vectors()
+            snapshot = StateVectorSnapshot.from_osky(osky_data, self.grid_cell_deg)
+        else:
+            responses = await asyncio.gather(
+                *[
+                    self.osky_service.get_state_vectors_area(bbox, priority=UpstreamPriority.POLLER)
+                    for bbox in self.regions
+                ]
+            )
+            # Overlapping regions return the same aircraft more than once
+            columns = StateVectorColumns.concat(
+                [StateVectorColumns.from_states(r.get("states") or []) for r in responses]
+            ).deduplicate()
+            times = [r["time"] for r in responses if r.get("time")]
+            snapshot = StateVectorSnapshot(
+                time=min(times) if times else None,
+                columns=columns,
+                grid_cell_deg=self.grid_cell_deg,
+            )
+
+        for processor in self._processors:
+            try:
+                processor(snapshot)
+            except Exception:
+                logger.exception("State vector processor %r failed", processor)
+
+        previous, self._snapshot = self._snapshot, snapshot
+        if self.shared_dir is not None:
+            try:
+                await asyncio.to_thread(shared.write_snapshot, self._shared_path, snapshot)
+            except OSError:
+                # This worker still serves it; the others keep the previous one
+                logger.exception("State vector snapshot not shared")
+        await self._notify(previous, snapshot)
+        return snapshot
+
+    async def load_shared(self) -> Optional[StateVectorSnapshot]:
+        """
+        Loads the snapshot published by the leader if it changed since the
+        last call, and runs the listeners on it. Returns None otherwise.
+        """
+        path = self._shared_path
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime == self._loaded_mtime:
+            return None
+        snapshot = await asyncio.to_thread(shared.read_snapshot, path, self.grid_cell_deg)
+        self._loaded_mtime = mtime
+        previous, self._snapshot = self._snapshot, snapshot
+        await self._notify(previous, snapshot)
+        return snapshot
+
+    @property
+    def _shared_path(self) -> Path:
+        return self.shared_dir / shared.SNAPSHOT_FILE
+
+    async def _notify(
+        self, previous: Optional[StateVectorSnapshot], snapshot: StateVectorSnapshot
+    ) -> None:
+        for listener in self._listeners:
+            try:
+                result = listener(previous, snapshot)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                # A failing listener must not stop the others or the poller
+                logger.exception("State vector listener %r failed", listener)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._acquire_leader_lock():
+                try:
+                    await self.load_shared()
+                except Exception:
+                    # Being replaced or half written by an older version
+                    logger.exception("Shared state vector snapshot not loaded")
+                await asyncio.sleep(self.follow_interval)
+                continue
+
+            started = loop.time()
+            try:
+                await self.poll_once()
+            except UpstreamUnavailableException as e:
+                logger.warning("State vector poll skipped: %s", e.detail)
+            except Exception:
+                # Keep serving the previous snapshot until the next poll
+                logger.exception("State vector poll failed")
+            await asyncio.sleep(max(self.interval - (loop.time() - started), 0))
+
+    def _acquire_leader_lock(self) -> bool:
+        if self.is_leader:
+            return True
+        self.shared_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.shared_dir / ".poller.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        # The daily budget of the workers leaves the polls out: whoever
+        # polls gets their credits on top of its own
+        self._reserve_credits(self.credits_per_day)
+        logger.info("Polling state vectors for the workers sharing %s", self.shared_dir)
+        return True
+
+    def _release_leader_lock(self) -> None:
+        if self._lock_fd is None:
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+        self._reserve_credits(-self.credits_per_day)
+
+    def _reserve_credits(self, credits: float) -> None:
+        scheduler = self.osky_service.scheduler
+        if scheduler.budget_enabled:
+            scheduler.set_credits_per_day(scheduler.credits_per_day + credits)
@@ -0,0 +1,82 @@
+"""
+Latest snapshot shared between the workers of a host.
+
+Only the worker elected to poll OpenSky (see StateVectorPoller) writes it,
+to a single Arrow IPC file replaced atomically (temporary file and
+os.replace), so readers always open a complete snapshot. It uses the
+archive's SCHEMA, except that the route columns hold the whole airport
+record as JSON instead of only its code: followers serve the routes the
+leader resolved without an airport cache of their own.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import orjson
+import pyarrow as pa
+
+from app.services.vectors.archive import batch_to_columns, snapshot_to_batch
+from app.services.vectors.columns import ROUTE_COLUMNS
+from app.services.vectors.grid_index import DEFAULT_CELL_DEG
+from app.services.vectors.snapshot import StateVectorSnapshot
+
+SNAPSHOT_FILE = "snapshot.arrow"
+
+
+def write_snapshot(path: Path, snapshot: StateVectorSnapshot) -> None:
+    """Replaces the shared snapshot at path with snapshot."""
+    batch = snapshot_to_batch(snapshot)
+    for name in ROUTE_COLUMNS:
+        airports = [
+            None if airport is None else orjson.dumps(airport).decode()
+            for airport in getattr(snapshot.columns, name).tolist()
+        ]
+        batch = batch.set_column(
+            batch.schema.get_field_index(name), name, pa.array(airports, type=pa.string())
+        )
+    batch = batch.replace_schema_metadata(
+        {
+            "time": orjson.dumps(snapshot.time),
+            "fetched_at": orjson.dumps(snapshot.fetched_at),
+        }
+    )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def read_snapshot(path: Path, grid_cell_deg: float = DEFAULT_CELL_DEG) -> StateVectorSnapshot:
+    """Loads the shared snapshot at path."""
+    # Read into memory, not mapped: the file is replaced on the next poll
+    with pa.OSFile(str(path), "rb") as source:
+        reader = pa.ipc.open_file(source)
+        metadata = reader.schema.metadata or {}
+        # write_snapshot writes exactly one batch, possibly empty
+        batch = reader.get_batch(0)
+
+    columns = batch_to_columns(batch)
+    for name in ROUTE_COLUMNS:
+        setattr(
+            columns,
+            name,
+            np.array(
+                [None if value is None else orjson.loads(value) for value in batch.column(name).to_pylist()],
+                dtype=object,
+            ),
+        )
+    time: Optional[int] = orjson.loads(metadata[b"time"]) if b"time" in metadata else None
+    return StateVectorSnapshot(
+        time=time,
+        columns=columns,
+        fetched_at=orjson.loads(metadata[b"fetched_at"]) if b"fetched_at" in metadata else 0.0,
+        grid_cell_deg=grid_cell_deg,
+    )
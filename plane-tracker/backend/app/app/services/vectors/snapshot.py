@@ -0,0 +1,47 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from app.services.vectors.columns import BBox, StateVectorColumns
+from app.services.vectors.grid_index import DEFAULT_CELL_DEG, GridIndex
+
+
+@dataclass
+class StateVectorSnapshot:
+    """
+    Latest set of OpenSky state vectors held in memory by the poller.
+    """
+
+    time: Optional[int]
+    columns: StateVectorColumns
+    fetched_at: float = field(default_factory=time.time)
+    grid_cell_deg: float = DEFAULT_CELL_DEG
+    index: GridIndex = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # Rebuilt for every poll; far cheaper than scanning on every query
+        self.index = GridIndex(
+            self.columns.longitude, self.columns.latitude, self.grid_cell_deg
+        )
+
+    @classmethod
+    def from_osky(
+        cls, osky_data: Dict[str, Any], grid_cell_deg: float = DEFAULT_CELL_DEG
+    ) -> "StateVectorSnapshot":
+        return cls(
+            time=osky_data.get("time"),
+            columns=StateVectorColumns.from_states(osky_data.get("states") or []),
+            grid_cell_deg=grid_cell_deg,
+        )
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was fetched from OpenSky."""
+        return time.time() - self.fetched_at
+
+    def in_bbox(self, bbox: BBox) -> StateVectorColumns:
+        """
+        Returns the aircraft inside bbox (lomin, lamin, lomax, lamax), using
+        the grid index. lomin > lomax selects a box crossing the antimeridian.
+        """
+        return self.columns.take(self.index.query(bbox))
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+import orjson
+
+from app.services.vectors.columns import BBox, StateVectorColumns, bbox_mask, split_bbox
+from app.services.vectors.poller import StateVectorPoller
+from app.services.vectors.snapshot import StateVectorSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Fields sent for an aircraft already known by the client
+MOVED_FIELDS = (
+    "icao24",
+    "longitude",
+    "latitude",
+    "baro_altitude",
+    "velocity",
+    "true_track",
+    "on_ground",
+)
+# A change in any of these makes an aircraft part of the cycle's diff
+_POSITION_COLUMNS = ("longitude", "latitude", "baro_altitude", "velocity", "true_track")
+# A change in any of these resends the full record
+_RECORD_COLUMNS = ("callsign", "on_ground", "category", "departure", "arrival")
+
+
+@dataclass(eq=False)
+class StreamSubscriber:
+    """One streaming client: its bbox, what it has seen and its outbox."""
+
+    bbox: BBox
+    tiles: Set[int]
+    queue: asyncio.Queue
+    # icao24 of the aircraft the client currently displays
+    known: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class _CycleDiff:
+    """
+    Changes between two snapshots, computed once per poll. Rows are indexes
+    into the current snapshot, bucketed by the tiles they touch.
+    """
+
+    snapshot: StateVectorSnapshot
+    # tile -> rows added or changed in (or moved out of) that tile
+    changed: Dict[int, np.ndarray]
+    # tile -> icao24 of the aircraft gone from the snapshot
+    removed: Dict[int, np.ndarray]
+    # rows whose full record must be sent (new or with changed metadata)
+    full: Set[int]
+    records: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    moved_records: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+
+
+class VectorStreamHub:
+    """
+    Fans state-vector diffs out to bbox subscribers.
+
+    After every poll the diff against the previous snapshot is computed
+    once and bucketed by tile; each subscriber only looks at the buckets of
+    the tiles its bbox overlaps and receives added, moved and removed
+    aircraft instead of the whole area. A subscriber whose queue overflows
+    is resynced with a fresh snapshot of its bbox.
+    """
+
+    def __init__(
+        self,
+        poller: StateVectorPoller,
+        tile_deg: float = 5.0,
+        queue_size: int = 8,
+    ):
+        """
+        Args:
+            poller: Poller whose snapshots are streamed.
+            tile_deg: Size in degrees of the tiles diffs are bucketed by.
+            queue_size: Messages a subscriber may have pending.
+        """
+        self.poller = poller
+        self.tile_deg = tile_deg
+        self.queue_size = queue_size
+        self.n_cols = math.ceil(360 / tile_deg)
+        self.n_rows = math.ceil(180 / tile_deg)
+        self._subscribers: Set[StreamSubscriber] = set()
+        poller.add_listener(self.publish)
+
+    def subscribe(self, bbox: BBox) -> StreamSubscriber:
+        """
+        Registers a subscriber. Its first message is a snapshot of bbox, sent
+        right away if the poller already has one.
+        """
+        subscriber = StreamSubscriber(
+            bbox=bbox,
+            tiles=self._tiles_for_bbox(bbox),
+            queue=asyncio.Queue(maxsize=self.queue_size),
+        )
+        self._subscribers.add(subscriber)
+        if self.poller.snapshot is not None:
+            self._resync(subscriber, self.poller.snapshot)
+        return subscriber
+
+    def update(self, subscriber: StreamSubscriber, bbox: BBox) -> None:
+        """Moves a subscriber to a new bbox and resyncs it."""
+        subscriber.bbox = bbox
+        subscriber.tiles = self._tiles_for_bbox(bbox)
+        if self.poller.snapshot is not None:
+            self._resync(subscriber, self.poller.snapshot)
+
+    def unsubscribe(self, subscriber: StreamSubscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def publish(
+        self, previous: Optional[StateVectorSnapshot], snapshot: StateVectorSnapshot
+    ) -> None:
+        """Poller listener: sends the new cycle to every subscriber."""
+        if not self._subscribers:
+            return
+        if previous is None:
+            for subscriber in self._subscribers:
+                self._resync(subscriber, snapshot)
+            return
+
+        diff = self._diff(previous, snapshot)
+        for subscriber in list(self._subscribers):
+            message = self._subscriber_diff(subscriber, diff)
+            if message is not None:
+                self._send(subscriber, message, snapshot)
+
+    def _diff(
+        self, previous: StateVectorSnapshot, snapshot: StateVectorSnapshot
+    ) -> _CycleDiff:
+        old, new = previous.columns, snapshot.columns
+        _, old_common, new_common = np.intersect1d(
+            old.icao24, new.icao24, return_indices=True
+        )
+
+        added = np.ones(len(new), dtype=bool)
+        added[new_common] = False
+        gone = np.ones(len(old), dtype=bool)
+        gone[old_common] = False
+
+        moved = np.zeros(len(old_common), dtype=bool)
+        for name in _POSITION_COLUMNS:
+            moved |= _differs(getattr(old, name)[old_common], getattr(new, name)[new_common])
+        relabelled = np.zeros(len(old_common), dtype=bool)
+        for name in _RECORD_COLUMNS:
+            relabelled |= getattr(old, name)[old_common] != getattr(new, name)[new_common]
+        changed = moved | relabelled
+
+        old_tiles = self._tile_ids(old.longitude, old.latitude)
+        new_tiles = self._tile_ids(new.longitude, new.latitude)
+        changed_rows = new_common[changed]
+        changed_rows_old = old_common[changed]
+        # Rows are listed under their new tile, and also under the old one so
+        # that subscribers there see the aircraft leave
+        upserts = np.concatenate([np.flatnonzero(added), changed_rows, changed_rows])
+        upsert_tiles = np.concatenate(
+            [new_tiles[added], new_tiles[changed_rows], old_tiles[changed_rows_old]]
+        )
+        removed_rows = np.flatnonzero(gone)
+
+        return _CycleDiff(
+            snapshot=snapshot,
+            changed=_bucket(upsert_tiles, upserts),
+            removed=_bucket(old_tiles[removed_rows], old.icao24[removed_rows]),
+            full=set(np.flatnonzero(added).tolist()) | set(new_common[relabelled].tolist()),
+        )
+
+    def _subscriber_diff(
+        self, subscriber: StreamSubscriber, diff: _CycleDiff
+    ) -> Optional[Dict[str, Any]]:
+        changed = [diff.changed[t] for t in subscriber.tiles if t in diff.changed]
+        removed_parts = [diff.removed[t] for t in subscriber.tiles if t in diff.removed]
+        if not changed and not removed_parts:
+            return None
+
+        columns = diff.snapshot.columns
+        rows = np.unique(np.concatenate(changed)) if changed else np.empty(0, dtype=np.int64)
+        inside = bbox_mask(columns.longitude[rows], columns.latitude[rows], subscriber.bbox)
+        self._ensure_records(diff, rows[inside])
+
+        known = subscriber.known
+        added: List[Dict[str, Any]] = []
+        moved: List[Dict[str, Any]] = []
+        removed: List[str] = []
+        for row in rows[inside].tolist():
+            record = diff.records[row]
+            if record["icao24"] not in known:
+                known.add(record["icao24"])
+                added.append(record)
+            elif row in diff.full:
+                added.append(record)
+            else:
+                moved.append(diff.moved_records[row])
+        for icao24 in columns.icao24[rows[~inside]].tolist():
+            if icao24 in known:
+                known.discard(icao24)
+                removed.append(icao24)
+        for part in removed_parts:
+            for icao24 in part.tolist():
+                if icao24 in known:
+                    known.discard(icao24)
+                    removed.append(icao24)
+
+        if not added and not moved and not removed:
+            return None
+        return {
+            "type": "diff",
+            "time": diff.snapshot.time,
+            "added": added,
+            "moved": moved,
+            "removed": removed,
+        }
+
+    def _ensure_records(self, diff: _CycleDiff, rows: np.ndarray) -> None:
+        """Serializes rows not yet serialized this cycle; shared by subscribers."""
+        missing = np.array(
+            [row for row in rows.tolist() if row not in diff.records], dtype=np.int64
+        )
+        if len(missing) == 0:
+            return
+        columns = diff.snapshot.columns
+        rows_list = missing.tolist()
+        diff.records.update(zip(rows_list, columns.to_records(missing)))
+        diff.moved_records.update(
+            zip(rows_list, columns.to_records(missing, names=MOVED_FIELDS))
+        )
+
+    def _resync(self, subscriber: StreamSubscriber, snapshot: StateVectorSnapshot) -> None:
+        _drain(subscriber.queue)
+        columns: StateVectorColumns = snapshot.in_bbox(subscriber.bbox)
+        subscriber.known = set(columns.icao24.tolist())
+        subscriber.queue.put_nowait(
+            orjson.dumps(
+                {"type": "snapshot", "time": snapshot.time, **columns.to_vectors()}
+            ).decode()
+        )
+
+    def _send(
+        self,
+        subscriber: StreamSubscriber,
+        message: Dict[str, Any],
+        snapshot: StateVectorSnapshot,
+    ) -> None:
+        try:
+            subscriber.queue.put_nowait(orjson.dumps(message).decode())
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog and start over from a snapshot
+            logger.info("Stream subscriber fell behind, resyncing")
+            self._resync(subscriber, snapshot)
+
+    def _tile_ids(self, longitude: np.ndarray, latitude: np.ndarray) -> np.ndarray:
+        """Tile id of every position; -1 for aircraft without one."""
+        cols = np.clip(np.floor((longitude + 180) / self.tile_deg), 0, self.n_cols - 1)
+        rows = np.clip(np.floor((latitude + 90) / self.tile_deg), 0, self.n_rows - 1)
+        ids = rows * self.n_cols + cols
+        return np.where(np.isnan(ids), -1, ids).astype(np.int64)
+
+    def _tiles_for_bbox(self, bbox: BBox) -> Set[int]:
+        tiles: Set[int] = set()
+        for lomin, lamin, lomax, lamax in split_bbox(bbox):
+            first_col, last_col = self._col(lomin), self._col(lomax)
+            for row in range(self._row(lamin), self._row(lamax) + 1):
+                tiles.update(range(row * self.n_cols + first_col, row * self.n_cols + last_col + 1))
+        return tiles
+
+    def _col(self, longitude: float) -> int:
+        return min(max(int((longitude + 180) // self.tile_deg), 0), self.n_cols - 1)
+
+    def _row(self, latitude: float) -> int:
+        return min(max(int((latitude + 90) // self.tile_deg), 0), self.n_rows - 1)
+
+
+def _differs(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Element-wise inequality treating NaN as equal to NaN."""
+    return ~((old == new) | (np.isnan(old) & np.isnan(new)))
+
+
+def _bucket(tiles: np.ndarray, values: np.ndarray) -> Dict[int, np.ndarray]:
+    """Groups values by tile id, skipping -1 (no position)."""
+    if len(tiles) == 0:
+        return {}
+    order = np.argsort(tiles, kind="stable")
+    tiles, values = tiles[order], values[order]
+    keys, starts = np.unique(tiles, return_index=True)
+    return {
+        int(key): part
+        for key, part in zip(keys.tolist(), np.split(values, starts[1:]))
+        if key >= 0
+    }
+
+
+def _drain(queue: asyncio.Queue) -> None:
+    while not queue.empty():
+        queue.get_nowait()
@@ -0,0 +1,191 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.services.osky_service import OskyService
+from app.services.vectors.columns import BBox, StateVectorColumns, split_bbox
+from app.utils.mappers.vector_mapper import map_columns_from_osky
+
+# (column, row) of a tile, counted from (-180, -90)
+TileKey = tuple[int, int]
+
+
+@dataclass
+class TileEntry:
+    columns: StateVectorColumns
+    time: Optional[int]
+    fetched_at: float
+
+
+@dataclass
+class TileArea:
+    """State vectors answering a bbox, with the age of the oldest tile."""
+
+    columns: StateVectorColumns
+    time: Optional[int]
+    age: float
+
+
+class StateVectorTileCache:
+    """
+    Upstream bbox fetches snapped to a fixed tile grid.
+
+    Concurrent requests for the same tile share one in-flight fetch, and
+    tiles are cached for a short TTL, so overlapping viewports from many
+    users cost one states/all call per tile instead of one per request.
+    """
+
+    def __init__(
+        self,
+        osky_service: OskyService,
+        tile_deg: float = 5.0,
+        ttl: float = 10.0,
+        max_tiles: int = 8,
+        stale_ttl: float = 0.0,
+    ):
+        """
+        Args:
+            osky_service: Shared OpenSky client.
+            tile_deg: Tile size in degrees. 5 degrees keeps every tile in
+                OpenSky's cheapest (<= 25 square degrees) credit bracket.
+            ttl: Seconds a fetched tile is served from cache.
+            max_tiles: Bboxes needing more tiles are fetched directly, since
+                one large query costs fewer credits than many tiles.
+            stale_ttl: Seconds expired tiles are kept for get_stale_area.
+        """
+        self.osky_service = osky_service
+        self.tile_deg = tile_deg
+        self.ttl = ttl
+        self.max_tiles = max_tiles
+        self.stale_ttl = stale_ttl
+        self.n_cols = math.ceil(360 / tile_deg)
+        self.n_rows = math.ceil(180 / tile_deg)
+        self._entries: Dict[TileKey, TileEntry] = {}
+        self._in_flight: Dict[TileKey, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def tile_of(self, longitude: float, latitude: float) -> TileKey:
+        col = int((longitude + 180) // self.tile_deg)
+        row = int((latitude + 90) // self.tile_deg)
+        return min(max(col, 0), self.n_cols - 1), min(max(row, 0), self.n_rows - 1)
+
+    def tiles_for_bbox(self, bbox: BBox) -> List[TileKey]:
+        """Tiles overlapping bbox; lomin > lomax crosses the antimeridian."""
+        keys: List[TileKey] = []
+        for lomin, lamin, lomax, lamax in split_bbox(bbox):
+            first_col, first_row = self.tile_of(lomin, lamin)
+            last_col, last_row = self.tile_of(lomax, lamax)
+            for col in range(first_col, last_col + 1):
+                for row in range(first_row, last_row + 1):
+                    if (col, row) not in keys:
+                        keys.append((col, row))
+        return keys
+
+    def tile_bbox(self, key: TileKey) -> BBox:
+        col, row = key
+        lomin = col * self.tile_deg - 180
+        lamin = row * self.tile_deg - 90
+        return (
+            lomin,
+            lamin,
+            min(lomin + self.tile_deg, 180.0),
+            min(lamin + self.tile_deg, 90.0),
+        )
+
+    async def get_area(self, bbox: BBox) -> TileArea:
+        """
+        State vectors inside bbox (lomin, lamin, lomax, lamax), merged from
+        cached or freshly fetched tiles.
+        """
+        keys = self.tiles_for_bbox(bbox)
+        if len(keys) > self.max_tiles:
+            return await self._fetch_direct(bbox)
+
+        entries = await asyncio.gather(*[self._get_tile(key) for key in keys])
+        return self._merge(bbox, list(entries))
+
+    def get_stale_area(self, bbox: BBox) -> Optional[TileArea]:
+        """
+        bbox from the tiles held, however old, without going upstream.
+        None unless every tile of bbox is held.
+        """
+        keys = self.tiles_for_bbox(bbox)
+        if len(keys) > self.max_tiles:
+            return None
+        entries = [self._entries.get(key) for key in keys]
+        if any(entry is None for entry in entries):
+            return None
+        return self._merge(bbox, entries)
+
+    def _merge(self, bbox: BBox, entries: List[TileEntry]) -> TileArea:
+        if not entries:
+            # A bbox with lamin > lamax covers no tile
+            return TileArea(columns=StateVectorColumns.empty(), time=None, age=0.0)
+        # Aircraft on a shared tile edge are returned by both tiles
+        columns = StateVectorColumns.concat([entry.columns for entry in entries])
+        columns = columns.deduplicate()
+        times = [entry.time for entry in entries if entry.time]
+        return TileArea(
+            columns=columns.take(columns.bbox_indices(bbox)),
+            time=min(times) if times else None,
+            age=time.time() - min(entry.fetched_at for entry in entries),
+        )
+
+    async def _get_tile(self, key: TileKey) -> TileEntry:
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.fetched_at <= self.ttl:
+            self.hits += 1
+            return entry
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch_tile(key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield: a cancelled request must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _fetch_tile(self, key: TileKey) -> TileEntry:
+        osky_data = await self.osky_service.get_state_vectors_area(self.tile_bbox(key))
+        entry = TileEntry(
+            columns=map_columns_from_osky(osky_data),
+            time=osky_data.get("time"),
+            fetched_at=time.time(),
+        )
+        self._evict_expired()
+        self._entries[key] = entry
+        return entry
+
+    async def _fetch_direct(self, bbox: BBox) -> TileArea:
+        # OpenSky can't query across the antimeridian, so ask for each side
+        responses = await asyncio.gather(
+            *[self.osky_service.get_state_vectors_area(part) for part in split_bbox(bbox)]
+        )
+        times = [r["time"] for r in responses if r.get("time")]
+        return TileArea(
+            columns=StateVectorColumns.concat([map_columns_from_osky(r) for r in responses]),
+            time=min(times) if times else None,
+            age=0.0,
+        )
+
+    def _evict_expired(self) -> None:
+        now = time.time()
+        expired = [
+            key
+            for key, entry in self._entries.items()
+            if now - entry.fetched_at > self.ttl + self.stale_ttl
+        ]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
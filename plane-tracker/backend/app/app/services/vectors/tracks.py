@@ -0,0 +1,312 @@
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services.vectors.columns import MISSING_INT
+from app.services.vectors.snapshot import StateVectorSnapshot
+
+
+class TrackStore:
+    """
+    Recent positions of every aircraft seen by the poller, in fixed-size
+    ring buffers.
+
+    All buffers live in (capacity, points) arrays. Each aircraft owns one
+    row ("slot"); slots of aircraft not seen for stale_after seconds are
+    freed. When a snapshot brings more new aircraft than there are free
+    slots, the arrays grow to fit the snapshot (with some headroom), so the
+    store is sized by the fleet the poller actually reports. Memory is about
+    21 bytes per point and stays below max_aircraft rows; at that cap the
+    least recently seen aircraft no longer reported are evicted, and if
+    every held aircraft is still reported, new ones are not tracked until
+    slots free up.
+    """
+
+    def __init__(
+        self,
+        max_aircraft: int = 50000,
+        points: int = 120,
+        stale_after: float = 900.0,
+        initial_aircraft: int = 1024,
+    ):
+        """
+        Args:
+            max_aircraft: Most aircraft held at the same time.
+            points: Positions kept per aircraft; older ones are overwritten.
+            stale_after: Seconds without a position before an aircraft's
+                track is dropped.
+            initial_aircraft: Slots allocated before the first snapshot.
+        """
+        self.max_aircraft = max_aircraft
+        self.points = points
+        self.stale_after = stale_after
+
+        capacity = min(initial_aircraft, max_aircraft)
+        shape = (capacity, points)
+        self._time = np.zeros(shape, dtype=np.uint32)
+        self._latitude = np.zeros(shape, dtype=np.float32)
+        self._longitude = np.zeros(shape, dtype=np.float32)
+        self._baro_altitude = np.zeros(shape, dtype=np.float32)
+        self._true_track = np.zeros(shape, dtype=np.float32)
+        self._on_ground = np.zeros(shape, dtype=bool)
+        # Next position to write and number of positions held, per slot
+        self._head = np.zeros(capacity, dtype=np.int32)
+        self._count = np.zeros(capacity, dtype=np.int32)
+        # Time of the first position recorded since the slot was taken
+        self._tracked_since = np.zeros(capacity, dtype=np.uint32)
+        # Wall clock time the aircraft was last in a snapshot
+        self._last_seen = np.full(capacity, -np.inf)
+        self._callsign = np.full(capacity, None, dtype=object)
+        self._icao24 = np.full(capacity, None, dtype=object)
+
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def capacity(self) -> int:
+        """Slots currently allocated."""
+        return len(self._head)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def on_snapshot(
+        self, previous: Optional[StateVectorSnapshot], snapshot: StateVectorSnapshot
+    ) -> None:
+        """Poller listener: records the positions of a new snapshot."""
+        self.record(snapshot)
+
+    def record(self, snapshot: StateVectorSnapshot) -> None:
+        """
+        Appends the position of every aircraft in the snapshot, skipping the
+        ones whose position report did not change since the last poll.
+        """
+        now = time.time()
+        self._evict_stale(now)
+
+        columns = snapshot.columns
+        rows = np.flatnonzero(
+            ~np.isnan(columns.longitude)
+            & ~np.isnan(columns.latitude)
+            & (columns.time_position != MISSING_INT)
+        )
+        if len(rows) == 0:
+            return
+
+        slots = self._slots_for(columns.icao24[rows].tolist(), now)
+        taken = slots >= 0
+        rows, slots = rows[taken], slots[taken]
+        self._last_seen[slots] = now
+        self._callsign[slots] = columns.callsign[rows]
+
+        times = columns.time_position[rows].astype(np.uint32)
+        last = self._time[slots, (self._head[slots] - 1) % self.points]
+        new = (self._count[slots] == 0) | (times > last)
+        rows, slots, times = rows[new], slots[new], times[new]
+
+        head = self._head[slots]
+        self._time[slots, head] = times
+        self._latitude[slots, head] = columns.latitude[rows]
+        self._longitude[slots, head] = columns.longitude[rows]
+        self._baro_altitude[slots, head] = columns.baro_altitude[rows]
+        self._true_track[slots, head] = columns.true_track[rows]
+        self._on_ground[slots, head] = columns.on_ground[rows]
+
+        started = self._count[slots] == 0
+        self._tracked_since[slots[started]] = times[started]
+        self._head[slots] = (head + 1) % self.points
+        self._count[slots] = np.minimum(self._count[slots] + 1, self.points)
+
+    def get_track(self, icao24: str, since: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Track of an aircraft in the OpenSky tracks/all format: from since
+        (unix seconds) on or, without since, the current flight from the
+        last position held on the ground. None when the aircraft isn't held
+        or the buffer doesn't reach back that far, e.g. it was first seen in
+        the air, so the caller knows to ask OpenSky.
+        """
+        slot = self._slots.get(icao24)
+        start = since if since is not None else self._flight_start(slot)
+        track = None if start is None else self._get_track(icao24, start)
+        if track is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return track
+
+    def get_held_track(self, icao24: str) -> Optional[Dict[str, Any]]:
+        """Every position held for an aircraft, however few; None if not held."""
+        return self._get_track(icao24, None)
+
+    def _ordered(self, slot: int) -> np.ndarray:
+        """Ring positions of a slot's points, oldest first."""
+        count = int(self._count[slot])
+        return (self._head[slot] - count + np.arange(count)) % self.points
+
+    def _flight_start(self, slot: Optional[int]) -> Optional[int]:
+        """
+        Time of the last position on the ground before the aircraft's
+        current flight, or None if none is held or it hasn't taken off.
+        """
+        if slot is None or self._count[slot] == 0:
+            return None
+        order = self._ordered(slot)
+        on_ground = np.flatnonzero(self._on_ground[slot, order])
+        if len(on_ground) == 0 or on_ground[-1] == len(order) - 1:
+            return None
+        return int(self._time[slot, order[on_ground[-1]]])
+
+    def _get_track(self, icao24: str, since: Optional[int]) -> Optional[Dict[str, Any]]:
+        slot = self._slots.get(icao24)
+        if slot is None or self._count[slot] == 0:
+            return None
+
+        order = self._ordered(slot)
+        times = self._time[slot, order]
+        # Once the ring wrapped, positions before the oldest one are lost
+        held_since = times[0] if len(order) == self.points else self._tracked_since[slot]
+        if since is not None and since < held_since:
+            return None
+
+        keep = times >= since if since is not None else slice(None)
+        order, times = order[keep], times[keep]
+        if len(times) == 0:
+            return None
+        path = zip(
+            times.tolist(),
+            _rounded(self._latitude[slot, order], 5),
+            _rounded(self._longitude[slot, order], 5),
+            _rounded(self._baro_altitude[slot, order], 1),
+            _rounded(self._true_track[slot, order], 1),
+            self._on_ground[slot, order].tolist(),
+        )
+        return {
+            "icao24": icao24,
+            "startTime": int(times[0]),
+            "endTime": int(times[-1]),
+            "callsign": self._callsign[slot],
+            "path": [list(point) for point in path],
+        }
+
+    def _slots_for(self, icao24s: List[str], now: float) -> np.ndarray:
+        """Slot of every aircraft, taking new slots as needed (-1 if none)."""
+        slots = np.array([self._slots.get(icao24, -1) for icao24 in icao24s], dtype=np.int64)
+        # Held aircraft still being reported are never evicted for new ones
+        self._last_seen[slots[slots >= 0]] = now
+        missing = np.flatnonzero(slots < 0)
+        if len(missing) > len(self._free):
+            # A quarter of headroom, so a growing fleet doesn't resize every poll
+            self._grow(min(self.max_aircraft, (len(self._slots) + len(missing)) * 5 // 4))
+        if len(missing) > len(self._free):
+            self._evict_least_recent(len(missing) - len(self._free), now)
+        for position in missing.tolist():
+            icao24 = icao24s[position]
+            # Already taken if the aircraft appears twice in the snapshot
+            slot = self._slots.get(icao24)
+            if slot is None:
+                if not self._free:
+                    break
+                slot = self._free.pop()
+                self._slots[icao24] = slot
+                self._icao24[slot] = icao24
+            slots[position] = slot
+        return slots
+
+    def _grow(self, capacity: int) -> None:
+        """Reallocates every buffer with room for capacity aircraft."""
+        old = self.capacity
+        if capacity <= old:
+            return
+        for name, fill in (
+            ("_time", 0),
+            ("_latitude", 0),
+            ("_longitude", 0),
+            ("_baro_altitude", 0),
+            ("_true_track", 0),
+            ("_on_ground", False),
+            ("_head", 0),
+            ("_count", 0),
+            ("_tracked_since", 0),
+            ("_last_seen", -np.inf),
+            ("_callsign", None),
+            ("_icao24", None),
+        ):
+            array = getattr(self, name)
+            grown = np.full((capacity, *array.shape[1:]), fill, dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self._free.extend(range(capacity - 1, old - 1, -1))
+
+    def _held(self) -> np.ndarray:
+        return self._icao24 != None  # noqa: E711 (element-wise)
+
+    def _evict_stale(self, now: float) -> None:
+        self._release(
+            np.flatnonzero(self._held() & (self._last_seen < now - self.stale_after))
+        )
+
+    def _evict_least_recent(self, needed: int, now: float) -> None:
+        # Aircraft seen in this poll already have last_seen == now
+        candidates = np.flatnonzero(self._held() & (self._last_seen < now))
+        if len(candidates) > needed:
+            oldest = np.argpartition(self._last_seen[candidates], needed - 1)[:needed]
+            candidates = candidates[oldest]
+        self._release(candidates)
+
+    def _release(self, slots: np.ndarray) -> None:
+        self.evictions += len(slots)
+        for slot in slots.tolist():
+            del self._slots[self._icao24[slot]]
+            self._free.append(slot)
+        self._icao24[slots] = None
+        self._callsign[slots] = None
+        self._count[slots] = 0
+        self._head[slots] = 0
+        self._last_seen[slots] = -np.inf
+
+
+def trim_track(track: Dict[str, Any], since: Optional[int]) -> Dict[str, Any]:
+    """
+    A tracks/all track limited to the positions from since (unix seconds)
+    on. OpenSky returns a whole flight whatever the time asked for.
+    """
+    if since is None:
+        return track
+    path = [point for point in track.get("path") or [] if point[0] >= since]
+    start_time = path[0][0] if path else track.get("endTime")
+    return {**track, "startTime": start_time, "path": path}
+
+
+def merge_tracks(
+    upstream: Dict[str, Any], local: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    A tracks/all track from OpenSky extended with the local positions newer
+    than its last one: OpenSky's tracks lag behind the polled state vectors.
+    """
+    if not local or not upstream:
+        return upstream
+    end_time = upstream.get("endTime") or 0
+    newer = [point for point in local["path"] if point[0] > end_time]
+    if not newer:
+        return upstream
+    return {
+        **upstream,
+        "startTime": upstream.get("startTime") or newer[0][0],
+        "endTime": newer[-1][0],
+        "path": [*(upstream.get("path") or []), *newer],
+    }
+
+
+def _rounded(values: np.ndarray, decimals: int) -> List[Optional[float]]:
+    """float32 values as Python floats, with NaN as None."""
+    rounded = values.astype(np.float64).round(decimals)
+    if not np.isnan(rounded).any():
+        return rounded.tolist()
+    objects = rounded.astype(object)
+    objects[np.isnan(rounded)] = None
+    return objects.tolist()
@@ -0,0 +1,50 @@
+from typing import Any, Dict
+
+import httpx
+
+from app.core.config import settings
+from app.utils.ttl_cache import AsyncTTLCache
+
+
+class WeatherService:
+    """
+    wttr.in client shared by every request of a worker.
+
+    Reports are cached per city: wttr.in only updates them every few
+    minutes, so repeated and concurrent requests for a city cost a single
+    upstream call, and expired reports are refreshed in the background
+    while the previous one is served.
+    """
+
+    def __init__(self):
+        self.base_url = settings.WHEATER_URL
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(settings.WEATHER_TIMEOUT))
+        self.cache: AsyncTTLCache[str, Dict[str, Any]] = AsyncTTLCache(
+            self._fetch_weather,
+            ttl=settings.WEATHER_CACHE_TTL,
+            stale_ttl=settings.WEATHER_CACHE_STALE_TTL,
+            max_entries=settings.WEATHER_CACHE_MAX_ENTRIES,
+        )
+
+    async def get_weather(self, city: str) -> Dict[str, Any]:
+        """
+        Gets the wttr.in report of a city.
+
+        Args:
+            city: City name, in any case.
+
+        Returns:
+            The j1 report, with the requested city under "city".
+        """
+        weather = await self.cache.get(city.strip().lower())
+        # Copy: the cached report is shared between callers
+        return {**weather, "city": city}
+
+    async def _fetch_weather(self, city: str) -> Dict[str, Any]:
+        response = await self.client.get(f"{self.base_url}/{city}", params={"format": "j1"})
+        # Errors are raised, not cached
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -10,3 +10,5 @@ from .user_follow_exceptions import (
     UserFollowedException,
     UserNotFollowedException,
 )
+from .upstream_exceptions import UpstreamRateLimitedException, UpstreamUnavailableException
+from .airport_exceptions import AirportIndexUnavailableException
@@ -0,0 +1,16 @@
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+
+
+class AirportIndexUnavailableException(HTTPException):
+    def __init__(
+        self,
+        detail: str = "The airport index is not loaded yet, try again later.",
+        headers: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers=headers,
+        )
@@ -0,0 +1,33 @@
+import math
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+
+
+class UpstreamUnavailableException(HTTPException):
+    def __init__(
+        self,
+        retry_after: Optional[float] = None,
+        detail: str = "OpenSky is unavailable, try again later.",
+        headers: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if retry_after is not None:
+            headers = {**(headers or {}), "Retry-After": str(max(1, math.ceil(retry_after)))}
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers=headers,
+        )
+
+
+class UpstreamRateLimitedException(UpstreamUnavailableException):
+    def __init__(
+        self,
+        retry_after: Optional[float] = None,
+        headers: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(
+            retry_after=retry_after,
+            detail="OpenSky rate limit reached, try again later.",
+            headers=headers,
+        )
@@ -0,0 +1,151 @@
+import heapq
+from typing import List, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vectors(longitude: np.ndarray, latitude: np.ndarray) -> np.ndarray:
+    """
+    (n, 3) points on the unit sphere. Euclidean (chord) distance between
+    them grows with the great-circle distance, so a KD-tree over them
+    answers geographic nearest-neighbour queries, across the antimeridian
+    and near the poles too.
+    """
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def km_to_chord(km: float) -> float:
+    return 2 * float(np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2))
+
+
+class KDTree:
+    """
+    Static KD-tree over an (n, d) array of points.
+
+    Nodes are kept in flat lists and leaves hold up to leaf_size points,
+    compared with numpy in one go, so queries spend little time in Python.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 16):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.leaf_size = leaf_size
+        self._order = np.arange(len(self.points))
+        # Per node: [start, end) of its points in _order, split axis and
+        # value, and children (-1 for leaves)
+        self._start: List[int] = []
+        self._end: List[int] = []
+        self._axis: List[int] = []
+        self._split: List[float] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        if len(self.points):
+            self._build(0, len(self.points))
+        # Points in tree order, so a leaf is a contiguous slice
+        self._sorted = self.points[self._order]
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self._start)
+        self._start.append(start)
+        self._end.append(end)
+        self._axis.append(-1)
+        self._split.append(0.0)
+        self._left.append(-1)
+        self._right.append(-1)
+        if end - start <= self.leaf_size:
+            return node
+
+        indexes = self._order[start:end]
+        values = self.points[indexes]
+        axis = int(np.argmax(values.max(axis=0) - values.min(axis=0)))
+        middle = (end - start) // 2
+        partition = np.argpartition(values[:, axis], middle)
+        self._order[start:end] = indexes[partition]
+        self._axis[node] = axis
+        self._split[node] = float(values[partition[middle], axis])
+        self._left[node] = self._build(start, start + middle)
+        self._right[node] = self._build(start + middle, end)
+        return node
+
+    def query(self, point: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distances and indexes (into points) of the k nearest points, closest
+        first.
+        """
+        if len(self.points) == 0 or k <= 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        point = np.asarray(point, dtype=np.float64)
+        # Max-heap of the best candidates as (-squared distance, index)
+        best: List[Tuple[float, int]] = []
+        # (node, lower bound of the squared distance to its points)
+        stack: List[Tuple[int, float]] = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            axis = self._axis[node]
+            if axis < 0:
+                start, end = self._start[node], self._end[node]
+                distances = ((self._sorted[start:end] - point) ** 2).sum(axis=1)
+                for distance, index in zip(distances.tolist(), self._order[start:end].tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, index))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, index))
+                continue
+
+            gap = point[axis] - self._split[node]
+            near, far = (
+                (self._left[node], self._right[node])
+                if gap < 0
+                else (self._right[node], self._left[node])
+            )
+            # Near side popped first; the far side is skipped if by then
+            # nothing on it can beat the k-th best
+            stack.append((far, max(bound, gap * gap)))
+            stack.append((near, bound))
+
+        best.sort(key=lambda item: -item[0])
+        distances = np.sqrt([-distance for distance, _ in best])
+        return distances, np.array([index for _, index in best], dtype=np.int64)
+
+    def query_radius(self, point: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances and indexes of the points within radius, closest first."""
+        if len(self.points) == 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        point = np.asarray(point, dtype=np.float64)
+        radius_sq = radius * radius
+        found_distances = []
+        found_indexes = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            axis = self._axis[node]
+            if axis < 0:
+                start, end = self._start[node], self._end[node]
+                distances = ((self._sorted[start:end] - point) ** 2).sum(axis=1)
+                inside = distances <= radius_sq
+                found_distances.append(distances[inside])
+                found_indexes.append(self._order[start:end][inside])
+                continue
+            gap = point[axis] - self._split[node]
+            if gap <= radius:
+                stack.append(self._left[node])
+            if gap >= -radius:
+                stack.append(self._right[node])
+
+        distances = np.concatenate(found_distances) if found_distances else np.empty(0)
+        indexes = np.concatenate(found_indexes) if found_indexes else np.empty(0, dtype=np.int64)
+        order = np.argsort(distances, kind="stable")
+        return np.sqrt(distances[order]), indexes[order]
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class _Entry(Generic[V]):
+    value: V
+    loaded_at: float
+
+
+class AsyncTTLCache(Generic[K, V]):
+    """
+    Async cache of loader results with stale-while-revalidate.
+
+    - Fresh entries (younger than ttl) are returned as they are.
+    - Stale entries (up to ttl + stale_ttl) are returned immediately while a
+      background task reloads them.
+    - Missing or expired entries are loaded before returning.
+
+    Concurrent loads of the same key share a single call to the loader, and
+    the least recently used entries are dropped beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[K], Awaitable[V]],
+        ttl: float,
+        stale_ttl: float = 0.0,
+        max_entries: int = 1024,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[K, _Entry[V]]" = OrderedDict()
+        self._loading: Dict[K, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: K) -> V:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.loaded_at
+            if age <= self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                self._load(key).add_done_callback(self._log_background_error)
+                return entry.value
+        self.misses += 1
+        # shield: a cancelled caller must not cancel the load for the others
+        return await asyncio.shield(self._load(key))
+
+    def invalidate(self, key: Optional[K] = None) -> None:
+        """Drops one key, or every entry when key is None."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "loading": len(self._loading),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _load(self, key: K) -> asyncio.Task:
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load_and_store(key))
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        return task
+
+    async def _load_and_store(self, key: K) -> V:
+        value = await self.loader(key)
+        self._entries[key] = _Entry(value=value, loaded_at=time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    @staticmethod
+    def _log_background_error(task: asyncio.Task) -> None:
+        # Stale value keeps being served; the next get() retries
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background cache refresh failed: %r", task.exception())
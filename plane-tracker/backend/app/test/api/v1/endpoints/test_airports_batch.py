@@ -0,0 +1,99 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.v1.endpoints import airports
+from app.core.database import get_session
+from app.services.airport_cache import AirportCache
+from test.services.test_airport_service import create_airports
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    await create_airports(engine)
+    yield engine
+    await engine.dispose()
+
+
+async def make_client(engine, cache_loaded: bool) -> httpx.AsyncClient:
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def session():
+        async with session_factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(airports.router, prefix="/airports")
+    app.dependency_overrides[get_session] = session
+    app.state.airport_cache = AirportCache(session_factory)
+    if cache_loaded:
+        await app.state.airport_cache.reload()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.parametrize("cache_loaded", [True, False], ids=["cache", "database"])
+async def test_codes_batch_resolves_icao_and_iata(engine, cache_loaded):
+    async with await make_client(engine, cache_loaded) as client:
+        response = await client.get(
+            "/airports/batch", params=[("codes", "lemd,LHR"), ("codes", " bcn "), ("codes", "XXXX")]
+        )
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert list(data) == ["LEMD", "LHR", "BCN", "XXXX"]
+    assert data["LEMD"]["name"] == "Madrid"
+    assert data["LEMD"]["location"] == [-3.56, 40.47]
+    assert data["LHR"]["icao"] == "EGLL"
+    assert data["BCN"]["icao"] == "LEBL"
+    assert data["XXXX"] is None
+
+
+async def test_codes_batch_is_capped(engine):
+    async with await make_client(engine, cache_loaded=True) as client:
+        response = await client.get("/airports/batch", params={"codes": ",".join(["LEMD"] * 501)})
+
+    assert response.status_code == 400
+
+
+async def test_nearest_batch_answers_every_point_in_order(engine):
+    async with await make_client(engine, cache_loaded=True) as client:
+        response = await client.post(
+            "/airports/nearest/batch",
+            json={
+                "points": [{"lat": 41.3, "lon": 2.1}, {"lat": 40.5, "lon": -3.6}, {"lat": -37.0, "lon": 174.8}],
+                "k": 2,
+            },
+        )
+
+    assert response.status_code == 200
+    results = response.json()["data"]
+    assert [[airport["icao"] for airport in nearest] for nearest in results] == [
+        ["LEBL", "LEMD"],
+        ["LEMD", "LEBL"],
+        ["NZAA", "NFFN"],
+    ]
+    assert results[1][0]["distance_km"] < 10
+
+
+async def test_nearest_batch_validates_the_request(engine):
+    async with await make_client(engine, cache_loaded=True) as client:
+        too_many = await client.post(
+            "/airports/nearest/batch", json={"points": [{"lat": 0, "lon": 0}] * 1001}
+        )
+        bad_point = await client.post("/airports/nearest/batch", json={"points": [{"lat": 91, "lon": 0}]})
+
+    assert too_many.status_code == 422
+    assert bad_point.status_code == 422
+
+
+async def test_nearest_batch_waits_for_the_index_without_postgis(engine):
+    async with await make_client(engine, cache_loaded=False) as client:
+        response = await client.post("/airports/nearest/batch", json={"points": [{"lat": 0, "lon": 0}]})
+
+    assert response.status_code == 503
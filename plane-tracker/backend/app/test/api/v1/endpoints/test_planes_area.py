@@ -0,0 +1,109 @@
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1.endpoints import planes
+from app.core.config import settings
+from app.services.vectors.tiles import StateVectorTileCache
+from test.services.vectors.factories import FakeOsky, make_snapshot, make_state
+
+pytestmark = pytest.mark.anyio
+
+MADRID = {"lomin": -4.0, "lamin": 40.0, "lomax": -3.0, "lamax": 41.0}
+
+
+@pytest.fixture
+def osky():
+    return FakeOsky(make_state("live", -3.7, 40.4))
+
+
+@pytest.fixture
+def poller():
+    return SimpleNamespace(snapshot=None)
+
+
+@pytest.fixture
+async def client(osky, poller):
+    app = FastAPI()
+    app.include_router(planes.router, prefix="/planes")
+    app.state.state_vector_poller = poller
+    app.state.state_vector_tiles = StateVectorTileCache(osky, ttl=0, stale_ttl=600)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def old_snapshot(*states):
+    snapshot = make_snapshot(900, *states)
+    snapshot.fetched_at = time.time() - settings.STATE_VECTOR_MAX_AGE - 60
+    return snapshot
+
+
+def icao24s(response) -> list:
+    return sorted(vector["icao24"] for vector in response.json()["data"]["vectors"])
+
+
+async def test_swapped_latitudes_are_rejected(client, osky):
+    response = await client.get("/planes/vectors/area", params={**MADRID, "lamin": 41.0, "lamax": 40.0})
+    assert response.status_code == 422
+    assert osky.calls == []
+
+
+async def test_fresh_snapshot_is_served(client, osky, poller):
+    poller.snapshot = make_snapshot(1000, make_state("polled", -3.5, 40.5))
+
+    response = await client.get("/planes/vectors/area", params=MADRID)
+
+    assert icao24s(response) == ["polled"]
+    assert response.json()["meta"]["source"] == "snapshot"
+    assert osky.calls == []
+
+
+async def test_stale_snapshot_goes_upstream(client, poller):
+    poller.snapshot = old_snapshot(make_state("polled", -3.5, 40.5))
+
+    response = await client.get("/planes/vectors/area", params=MADRID)
+
+    assert icao24s(response) == ["live"]
+    assert response.json()["meta"] == {
+        "source": "upstream",
+        "stale": False,
+        "snapshot_age": 0.0,
+        "snapshot_time": 1000,
+    }
+
+
+async def test_upstream_down_serves_the_newest_tiles(client, osky, poller):
+    poller.snapshot = old_snapshot(make_state("polled", -3.5, 40.5))
+    await client.get("/planes/vectors/area", params=MADRID)
+    osky.down = True
+
+    response = await client.get("/planes/vectors/area", params=MADRID)
+
+    assert response.status_code == 200
+    assert icao24s(response) == ["live"]
+    assert response.json()["meta"]["source"] == "tiles"
+    assert response.json()["meta"]["stale"] is True
+
+
+async def test_upstream_down_without_tiles_serves_the_old_snapshot(client, osky, poller):
+    poller.snapshot = old_snapshot(make_state("polled", -3.5, 40.5))
+    osky.down = True
+
+    response = await client.get("/planes/vectors/area", params=MADRID)
+
+    assert icao24s(response) == ["polled"]
+    assert response.json()["meta"]["source"] == "snapshot"
+    assert response.json()["meta"]["stale"] is True
+
+
+async def test_upstream_down_with_nothing_held_is_a_503(client, osky):
+    osky.down = True
+
+    response = await client.get("/planes/vectors/area", params=MADRID)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
@@ -0,0 +1,110 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1.endpoints import planes
+from app.services.vectors.tracks import TrackStore
+from app.utils.exceptions import UpstreamUnavailableException
+from test.services.vectors.factories import make_snapshot, make_state
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeOskyTracks:
+    """tracks/all returning a flight that ends at 110."""
+
+    def __init__(self):
+        self.calls = 0
+        self.down = False
+
+    async def get_state_vector_from_flight(self, icao):
+        self.calls += 1
+        if self.down:
+            raise UpstreamUnavailableException(retry_after=30)
+        return {
+            "icao24": icao,
+            "startTime": 50,
+            "endTime": 110,
+            "callsign": "IBE1",
+            "path": [[50, 40.0, -3.0, 0, 0, True], [80, 40.1, -3.1, 1000, 0, False], [110, 40.2, -3.2, 2000, 0, False]],
+        }
+
+
+@pytest.fixture
+def osky():
+    return FakeOskyTracks()
+
+
+@pytest.fixture
+def track_store():
+    return TrackStore()
+
+
+@pytest.fixture
+async def client(osky, track_store):
+    app = FastAPI()
+    app.include_router(planes.router, prefix="/planes")
+    app.state.osky_service = osky
+    app.state.track_store = track_store
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def record(store, *positions):
+    for t, on_ground in positions:
+        store.record(make_snapshot(t, make_state("abc123", -3.7, 40.4, time_position=t, on_ground=on_ground)))
+
+
+def times(response) -> list:
+    return [point[0] for point in response.json()["data"]["path"]]
+
+
+async def test_flight_held_since_takeoff_is_served_locally(client, osky, track_store):
+    record(track_store, (100, True), (110, False), (120, False))
+
+    response = await client.get("/planes/vector", params={"icao": "ABC123"})
+
+    assert response.json()["meta"]["source"] == "tracks"
+    assert times(response) == [100, 110, 120]
+    assert osky.calls == 0
+
+
+async def test_flight_joined_in_the_air_comes_from_upstream(client, osky, track_store):
+    # Polled only from 100 on: the takeoff is missing locally
+    record(track_store, (100, False), (110, False), (120, False))
+
+    response = await client.get("/planes/vector", params={"icao": "abc123"})
+
+    assert osky.calls == 1
+    assert response.json()["meta"]["source"] == "upstream"
+    # OpenSky's flight, extended with the positions polled after it
+    assert times(response) == [50, 80, 110, 120]
+    assert response.json()["data"]["endTime"] == 120
+
+
+async def test_since_before_the_buffer_comes_from_upstream(client, osky, track_store):
+    record(track_store, (100, True), (110, False), (120, False))
+
+    response = await client.get("/planes/vector", params={"icao": "abc123", "since": 70})
+
+    assert osky.calls == 1
+    assert times(response) == [80, 110, 120]
+
+
+async def test_upstream_down_serves_what_is_held(client, osky, track_store):
+    record(track_store, (100, False), (110, False))
+    osky.down = True
+
+    response = await client.get("/planes/vector", params={"icao": "abc123"})
+
+    assert response.status_code == 200
+    assert response.json()["meta"]["source"] == "tracks"
+    assert response.json()["meta"]["stale"] is True
+    assert times(response) == [100, 110]
+
+
+async def test_upstream_down_and_nothing_held_is_a_503(client, osky):
+    osky.down = True
+    response = await client.get("/planes/vector", params={"icao": "abc123"})
+    assert response.status_code == 503
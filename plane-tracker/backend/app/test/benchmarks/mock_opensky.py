@@ -0,0 +1,233 @@
+"""
+Local stand-in for the OpenSky API, serving a synthetic fleet.
+
+    app = create_mock_opensky(make_fleet(10_000))
+    with MockOpenSkyServer(app) as server:
+        settings.OSKY_BASE_URL = server.base_url
+        settings.OSKY_TOKEN_ENDPOINT = server.token_endpoint
+
+Implements the token, states/all (with bbox), tracks/all and flights/all
+endpoints the backend calls, with payloads shaped like OpenSky's.
+"""
+
+import asyncio
+import random
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import orjson
+import uvicorn
+from fastapi import FastAPI, Query, Response
+
+COUNTRIES = ("United States", "Germany", "United Kingdom", "France", "China", "Brazil", "Spain")
+AIRPORTS = ("KJFK", "KLAX", "EGLL", "LFPG", "EDDF", "ZBAA", "SBGR", "LEMD", "MMMX", "MGGT")
+
+FLEET_SIZES = (1_000, 10_000, 50_000)
+
+
+class Fleet:
+    """Synthetic aircraft whose positions drift a little on every poll."""
+
+    def __init__(self, size: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.size = size
+        self.icao24 = [f"{i:06x}" for i in range(size)]
+        self.callsign = [f"SYN{i:05d}" for i in range(size)]
+        self.country = [COUNTRIES[i % len(COUNTRIES)] for i in range(size)]
+        # Denser around the mid latitudes, like real traffic
+        self.longitude = rng.uniform(-180, 180, size)
+        self.latitude = np.clip(rng.normal(35, 20, size), -85, 85)
+        self.altitude = rng.uniform(0, 12_000, size)
+        self.velocity = rng.uniform(60, 260, size)
+        self.true_track = rng.uniform(0, 360, size)
+        self.on_ground = rng.random(size) < 0.05
+        self.category = rng.integers(0, 8, size)
+        self._rng = rng
+
+    def states(self, bbox: Optional[tuple] = None) -> Dict[str, Any]:
+        """states/all payload, optionally limited to (lomin, lamin, lomax, lamax)."""
+        now = int(time.time())
+        self.longitude = (self.longitude + self._rng.normal(0, 0.01, self.size) + 180) % 360 - 180
+        self.latitude = np.clip(self.latitude + self._rng.normal(0, 0.01, self.size), -85, 85)
+        rows = np.arange(self.size)
+        if bbox is not None:
+            lomin, lamin, lomax, lamax = bbox
+            rows = rows[
+                (self.longitude >= lomin)
+                & (self.longitude <= lomax)
+                & (self.latitude >= lamin)
+                & (self.latitude <= lamax)
+            ]
+        longitude = self.longitude[rows].round(4).tolist()
+        latitude = self.latitude[rows].round(4).tolist()
+        altitude = self.altitude[rows].round(1).tolist()
+        velocity = self.velocity[rows].round(2).tolist()
+        true_track = self.true_track[rows].round(1).tolist()
+        on_ground = self.on_ground[rows].tolist()
+        category = self.category[rows].tolist()
+        # Field order of OpenSky's state vectors
+        states = [
+            [
+                self.icao24[row],
+                self.callsign[row],
+                self.country[row],
+                now,
+                now,
+                longitude[i],
+                latitude[i],
+                altitude[i],
+                on_ground[i],
+                velocity[i],
+                true_track[i],
+                0.0,
+                None,
+                altitude[i],
+                None,
+                False,
+                0,
+                category[i],
+            ]
+            for i, row in enumerate(rows.tolist())
+        ]
+        return {"time": now, "states": states}
+
+    def track(self, icao24: str) -> Optional[Dict[str, Any]]:
+        try:
+            row = self.icao24.index(icao24)
+        except ValueError:
+            return None
+        now = int(time.time())
+        path = [
+            [
+                now - 60 * (30 - i),
+                float(self.latitude[row]),
+                float(self.longitude[row]),
+                float(self.altitude[row]),
+                float(self.true_track[row]),
+                False,
+            ]
+            for i in range(30)
+        ]
+        return {
+            "icao24": icao24,
+            "startTime": path[0][0],
+            "endTime": path[-1][0],
+            "callsign": self.callsign[row],
+            "path": path,
+        }
+
+    def flights(self, begin: int, end: int, limit: int = 5_000) -> List[Dict[str, Any]]:
+        flights = []
+        for row in range(min(self.size, limit)):
+            first_seen = begin + (row * 37) % max(end - begin, 1)
+            flights.append(
+                {
+                    "icao24": self.icao24[row],
+                    "callsign": self.callsign[row],
+                    "firstSeen": first_seen,
+                    "lastSeen": min(first_seen + 3_600, end),
+                    "estDepartureAirport": AIRPORTS[row % len(AIRPORTS)],
+                    "estArrivalAirport": AIRPORTS[(row * 7 + 3) % len(AIRPORTS)],
+                }
+            )
+        return flights
+
+
+def make_fleet(size: int, seed: int = 0) -> Fleet:
+    return Fleet(size, seed)
+
+
+def create_mock_opensky(fleet: Fleet, latency: float = 0.0) -> FastAPI:
+    """
+    ASGI app answering like OpenSky for the given fleet.
+
+    Args:
+        fleet: Aircraft served by states/all, tracks/all and flights/all.
+        latency: Extra seconds added to every API response.
+    """
+    app = FastAPI(title="Mock OpenSky")
+    app.state.calls = {"token": 0, "states": 0, "tracks": 0, "flights": 0}
+
+    async def delay() -> None:
+        if latency:
+            await asyncio.sleep(latency * random.uniform(0.8, 1.2))
+
+    @app.post("/token")
+    async def token():
+        app.state.calls["token"] += 1
+        return {"access_token": "mock-token", "expires_in": 1800, "token_type": "Bearer"}
+
+    @app.get("/api/states/all")
+    async def states_all(
+        lamin: Optional[float] = None,
+        lomin: Optional[float] = None,
+        lamax: Optional[float] = None,
+        lomax: Optional[float] = None,
+    ):
+        app.state.calls["states"] += 1
+        await delay()
+        bbox = None
+        if None not in (lamin, lomin, lamax, lomax):
+            bbox = (lomin, lamin, lomax, lamax)
+        # orjson: the mock must not be the bottleneck with large fleets
+        return Response(orjson.dumps(fleet.states(bbox)), media_type="application/json")
+
+    @app.get("/api/tracks/all")
+    async def tracks_all(icao24: str, time: int = 0):
+        app.state.calls["tracks"] += 1
+        await delay()
+        track = fleet.track(icao24)
+        if track is None:
+            return Response(status_code=404)
+        return track
+
+    @app.get("/api/flights/all")
+    async def flights_all(begin: int = Query(...), end: int = Query(...)):
+        app.state.calls["flights"] += 1
+        await delay()
+        if end - begin > 7_200:
+            return Response(status_code=400)
+        return fleet.flights(begin, end)
+
+    return app
+
+
+class MockOpenSkyServer:
+    """Runs an ASGI app with uvicorn on a free local port, in a thread."""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: Optional[int] = None):
+        self.host = host
+        self.port = port or free_port(host)
+        config = uvicorn.Config(app, host=self.host, port=self.port, log_level="warning", lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api"
+
+    @property
+    def token_endpoint(self) -> str:
+        return f"http://{self.host}:{self.port}/token"
+
+    def __enter__(self) -> "MockOpenSkyServer":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Mock OpenSky server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+def free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
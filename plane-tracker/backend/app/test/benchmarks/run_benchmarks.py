@@ -0,0 +1,237 @@
+"""
+Benchmarks of the state-vector hot paths against synthetic fleets.
+
+Usage (from backend/app, with the usual .env):
+    python -m test.benchmarks.run_benchmarks [--sizes 1000 10000 50000]
+        [--output benchmark-results.json]
+
+For every fleet size it measures:
+- mapping: map_vector_from_osky (Pydantic) and map_columns_from_osky.
+- serialization: create_response through FastAPI's response-model path,
+  and create_fast_response.
+- end to end: /planes/vectors/area latency with the app pointed at a local
+  mock OpenSky, served from the poller snapshot and from upstream tiles.
+
+Results are written as JSON, one record per benchmark and fleet size, so
+runs can be diffed to spot regressions.
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.main import app
+from app.schemas.response_schema import IGetResponseBase, create_fast_response, create_response
+from app.utils.mappers.vector_mapper import map_columns_from_osky, map_vector_from_osky
+from test.benchmarks.mock_opensky import (
+    FLEET_SIZES,
+    MockOpenSkyServer,
+    create_mock_opensky,
+    make_fleet,
+)
+
+Record = Dict[str, Any]
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, number: int = 1) -> Dict[str, float]:
+    """Seconds per call of fn: best, median and mean of repeat rounds."""
+    fn()  # warm-up
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number)
+    return {
+        "min_s": min(rounds),
+        "median_s": statistics.median(rounds),
+        "mean_s": statistics.fmean(rounds),
+    }
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "requests": len(ordered),
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def bench_mapping(size: int, repeat: int) -> List[Record]:
+    osky_data = make_fleet(size).states()
+    records = []
+    for name, mapper in (
+        ("map_vector_from_osky", map_vector_from_osky),
+        ("map_columns_from_osky", map_columns_from_osky),
+    ):
+        timing = measure(functools.partial(mapper, osky_data), repeat)
+        records.append(
+            {
+                "benchmark": name,
+                "fleet_size": size,
+                **timing,
+                "aircraft_per_s": size / timing["median_s"],
+            }
+        )
+    return records
+
+
+def bench_serialization(size: int, repeat: int) -> List[Record]:
+    vectors = map_columns_from_osky(make_fleet(size).states()).to_vectors()
+    adapter = TypeAdapter(IGetResponseBase)
+
+    def fastapi_path() -> bytes:
+        # What FastAPI does with an IGetResponseBase return value:
+        # validate, dump in JSON mode, then render with json.dumps
+        value = adapter.validate_python(create_response(data=vectors, message="ok"))
+        return JSONResponse(adapter.dump_python(value, mode="json")).body
+
+    def fast_path() -> bytes:
+        return create_fast_response(data=vectors, message="ok").body
+
+    records = []
+    for name, fn in (("create_response", fastapi_path), ("create_fast_response", fast_path)):
+        timing = measure(fn, repeat)
+        records.append(
+            {
+                "benchmark": name,
+                "fleet_size": size,
+                **timing,
+                "bytes": len(fn()),
+            }
+        )
+    return records
+
+
+def bench_vectors_area(size: int, requests: int, bbox_deg: float) -> List[Record]:
+    mock = create_mock_opensky(make_fleet(size))
+    rng = random.Random(size)
+    bboxes = []
+    for _ in range(requests):
+        lomin = rng.uniform(-180, 180 - bbox_deg)
+        lamin = rng.uniform(-60, 70 - bbox_deg)
+        bboxes.append(
+            {"lomin": lomin, "lamin": lamin, "lomax": lomin + bbox_deg, "lamax": lamin + bbox_deg}
+        )
+
+    records = []
+    with MockOpenSkyServer(mock) as server:
+        _configure_app(server)
+        for source, poll in (("snapshot", True), ("upstream", False)):
+            settings.STATE_VECTOR_POLL_ENABLED = poll
+            with TestClient(app) as client:
+                if poll:
+                    _wait_for_snapshot()
+                else:
+                    # Every request goes upstream
+                    app.state.state_vector_tiles.ttl = 0
+                    app.state.state_vector_tiles.stale_ttl = 0
+                latencies = []
+                for params in bboxes:
+                    started = time.perf_counter()
+                    response = client.get("/api/v1/planes/vectors/area", params=params)
+                    latencies.append(time.perf_counter() - started)
+                    response.raise_for_status()
+                    assert response.json()["meta"]["source"] == source
+            records.append(
+                {
+                    "benchmark": f"vectors_area_{source}",
+                    "fleet_size": size,
+                    "bbox_deg": bbox_deg,
+                    **percentiles(latencies),
+                }
+            )
+    return records
+
+
+def _configure_app(server: MockOpenSkyServer) -> None:
+    settings.OSKY_BASE_URL = server.base_url
+    settings.OSKY_TOKEN_ENDPOINT = server.token_endpoint
+    settings.OSKY_TOKEN_STORE = "memory"
+    # The mock has no quota: every request must reach it
+    settings.OSKY_CREDITS_PER_DAY = 0
+    settings.CLIENT_ID = settings.CLIENT_ID or "benchmark"
+    settings.SECRET = settings.SECRET or "benchmark"
+    settings.AIRPORT_CACHE_ENABLED = False
+    settings.FLIGHT_ENRICHMENT_ENABLED = False
+    settings.STATE_VECTOR_POLL_REGIONS = []
+    # A single poll at startup, served for the whole run
+    settings.STATE_VECTOR_POLL_INTERVAL = 3600
+    settings.STATE_VECTOR_MAX_AGE = 3600
+
+
+def _wait_for_snapshot(timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while app.state.state_vector_poller.snapshot is None:
+        if time.monotonic() > deadline:
+            raise RuntimeError("The poller did not fetch a snapshot")
+        time.sleep(0.05)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the state-vector benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(FLEET_SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds of the micro-benchmarks")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per end-to-end run")
+    parser.add_argument("--bbox-deg", type=float, default=10.0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    args = parser.parse_args()
+
+    results: List[Record] = []
+    for size in args.sizes:
+        for records in (
+            bench_mapping(size, args.repeat),
+            bench_serialization(size, args.repeat),
+            bench_vectors_area(size, args.requests, args.bbox_deg),
+        ):
+            for record in records:
+                print(json.dumps(record), file=sys.stderr)
+            results.extend(records)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"{len(results)} results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
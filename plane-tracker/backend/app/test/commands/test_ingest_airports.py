@@ -0,0 +1,112 @@
+"""
+Airport ingest. The merge tests run against a real PostGIS database given by
+TEST_DATABASE_URL (e.g. the docker-compose one) and are skipped without it;
+they work in a scratch schema that is dropped afterwards.
+"""
+
+import os
+import uuid
+from pathlib import Path
+
+import asyncpg
+import pytest
+
+from app.commands.ingest_airports import asyncpg_dsn, ingest, parse_row
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+INIT_SQL = Path(__file__).resolve().parents[4] / "db_init" / "init.sql"
+
+requires_postgis = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL (PostGIS) not set"
+)
+
+
+def test_parse_row_normalizes_codes():
+    row = {"icao": " lemd ", "iata": "mad", "name": "Madrid", "country": "Spain",
+           "elevation_ft": "1998.4", "latitude": "40.47", "longitude": "-3.56"}
+    assert parse_row(row) == ("LEMD", "MAD", "Madrid", "Spain", 1998, -3.56, 40.47)
+
+
+def test_parse_row_reads_wkt_location_and_altitude():
+    row = {"icao": "EGLL", "iata": "", "name": "Heathrow", "altitude": "83",
+           "location": "SRID=4326;POINT(-0.46 51.47)"}
+    assert parse_row(row) == ("EGLL", None, "Heathrow", None, 83, -0.46, 51.47)
+
+
+def test_parse_row_skips_rows_without_icao_or_name():
+    assert parse_row({"icao": "XX", "name": "Bad"}) is None
+    assert parse_row({"icao": "LEMD", "name": ""}) is None
+
+
+@pytest.fixture
+async def dsn():
+    # Scratch schema first in the search path; PostGIS stays reachable in public
+    schema = f"test_ingest_{uuid.uuid4().hex[:8]}"
+    base = asyncpg_dsn(TEST_DATABASE_URL)
+    connection = await asyncpg.connect(base)
+    try:
+        await connection.execute(f"CREATE SCHEMA {schema}")
+        await connection.execute(f"SET search_path TO {schema}, public")
+        await connection.execute(INIT_SQL.read_text())
+        separator = "&" if "?" in base else "?"
+        yield f"{base}{separator}search_path={schema},public"
+    finally:
+        await connection.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await connection.close()
+
+
+async def fetch_airports(dsn: str):
+    connection = await asyncpg.connect(dsn)
+    try:
+        rows = await connection.fetch(
+            "SELECT icao, iata, name, ST_X(location::geometry) AS longitude,"
+            " ST_Y(location::geometry) AS latitude, updated_at FROM airports"
+        )
+    finally:
+        await connection.close()
+    return {row["icao"]: row for row in rows}
+
+
+def write_csv(path: Path, lines) -> str:
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@requires_postgis
+@pytest.mark.anyio
+async def test_merge_inserts_skips_unchanged_and_updates(dsn, tmp_path):
+    first = write_csv(tmp_path / "first.csv", [
+        "icao,iata,name,country,elevation_ft,latitude,longitude",
+        "LEMD,MAD,Madrid,Spain,1998,40.47,-3.56",
+        "LEBL,BCN,Barcelona,Spain,12,41.29,2.07",
+        "KJFK,JFK,John F Kennedy,United States,13,,",
+        "LEMD,MAD,Madrid Barajas,Spain,1998,40.47,-3.56",
+        "XX,,Bad,Nowhere,,,",
+    ])
+    stats = await ingest(first, dsn, chunk_size=2)
+    assert (stats["read"], stats["skipped"], stats["inserted"], stats["updated"]) == (4, 1, 3, 0)
+    airports = await fetch_airports(dsn)
+    # The last row of a repeated icao wins
+    assert airports["LEMD"]["name"] == "Madrid Barajas"
+    assert (airports["LEBL"]["longitude"], airports["LEBL"]["latitude"]) == pytest.approx((2.07, 41.29))
+    assert airports["KJFK"]["longitude"] is None
+
+    stats = await ingest(first, dsn)
+    assert (stats["inserted"], stats["updated"]) == (0, 0)
+    assert {icao: row["updated_at"] for icao, row in (await fetch_airports(dsn)).items()} == {
+        icao: row["updated_at"] for icao, row in airports.items()
+    }
+
+    second = write_csv(tmp_path / "second.csv", [
+        "icao,iata,name,country,altitude,location",
+        "LEMD,MAD,Madrid Barajas,Spain,1998,SRID=4326;POINT(-3.56 40.47)",
+        "LEBL,BCN,Barcelona El Prat,Spain,12,POINT(2.07 41.29)",
+        "EGLL,LHR,Heathrow,United Kingdom,83,POINT(-0.46 51.47)",
+    ])
+    stats = await ingest(second, dsn)
+    assert (stats["inserted"], stats["updated"]) == (1, 1)
+    updated = await fetch_airports(dsn)
+    assert updated["LEBL"]["name"] == "Barcelona El Prat"
+    # updated_at moves only for the changed row (the airport cache fingerprint)
+    assert updated["LEBL"]["updated_at"] > airports["LEBL"]["updated_at"]
+    assert updated["LEMD"]["updated_at"] == airports["LEMD"]["updated_at"]
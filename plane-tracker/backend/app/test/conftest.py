@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+# Settings required to import the app, for runs without a .env; values
+# already in the environment win
+os.environ.setdefault("BACKEND_CORS_ORIGINS", '["http://localhost"]')
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    # The app only runs on asyncio
+    return "asyncio"
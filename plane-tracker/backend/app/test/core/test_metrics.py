@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+from prometheus_client import REGISTRY
+
+from app.core import metrics
+from app.core.metrics import AppStateCollector, PrometheusMiddleware, setup_metrics
+from app.services.clients.circuit_breaker import CircuitBreaker
+from app.services.clients.upstream_scheduler import UpstreamScheduler
+from test.services.vectors.factories import make_snapshot
+
+pytestmark = pytest.mark.anyio
+
+
+def requests_total(method: str, route: str, status: str) -> float:
+    labels = {"method": method, "route": route, "status": status}
+    return REGISTRY.get_sample_value("http_requests_total", labels) or 0.0
+
+
+def make_app() -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/vector/{icao24}")
+    async def vector(icao24: str):
+        return {"icao24": icao24}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/planes")
+    return app
+
+
+def client_for(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_requests_are_labelled_with_their_route_template():
+    app = make_app()
+    app.add_middleware(PrometheusMiddleware)
+    route = "/api/v1/planes/vector/{icao24}"
+    before = requests_total("GET", route, "200")
+    unmatched = requests_total("GET", "unmatched", "404")
+
+    async with client_for(app) as client:
+        await client.get("/api/v1/planes/vector/abc123")
+        await client.get("/api/v1/planes/vector/def456")
+        await client.get("/no/such/path")
+
+    # One series for every aircraft, not one per raw path
+    assert requests_total("GET", route, "200") == before + 2
+    assert requests_total("GET", "unmatched", "404") == unmatched + 1
+    assert requests_total("GET", "/api/v1/planes/vector/abc123", "200") == 0.0
+
+
+def collect(state) -> dict:
+    app = FastAPI()
+    for name, value in vars(state).items():
+        setattr(app.state, name, value)
+    samples = {}
+    for family in AppStateCollector(app).collect():
+        for sample in family.samples:
+            samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return samples
+
+
+class FakeTiles:
+    """TileCache counters, seven tiles cached."""
+
+    hits, shared, misses, evictions = 4, 1, 2, 0
+
+    def __len__(self):
+        return 7
+
+
+async def test_collector_reads_the_services_on_app_state(monkeypatch):
+    # A queue pool that hasn't filled up reports a negative overflow
+    pool = SimpleNamespace(size=lambda: 5, checkedout=lambda: 1, checkedin=lambda: 1, overflow=lambda: -3)
+    monkeypatch.setattr(metrics, "engine", SimpleNamespace(sync_engine=SimpleNamespace(pool=pool)))
+    osky = SimpleNamespace(
+        oauth_client=SimpleNamespace(token_fetches=2),
+        scheduler=UpstreamScheduler(credits_per_day=400.0),
+        breaker=CircuitBreaker(),
+        flights_cache_hits=3,
+        flights_cache_misses=1,
+    )
+    state = SimpleNamespace(
+        osky_service=osky,
+        state_vector_tiles=FakeTiles(),
+        state_vector_poller=SimpleNamespace(snapshot=make_snapshot(1000)),
+    )
+
+    samples = collect(state)
+
+    assert samples[("cache_hits_total", (("cache", "tiles"),))] == 5
+    assert samples[("cache_entries", (("cache", "tiles"),))] == 7
+    assert samples[("cache_hits_total", (("cache", "flights"),))] == 3
+    assert ("cache_entries", (("cache", "flights"),)) not in samples
+    assert samples[("opensky_token_fetches_total", ())] == 2
+    assert samples[("opensky_circuit_state", (("state", "closed"),))] == 1
+    assert samples[("opensky_queue_depth", (("priority", "poller"),))] == 0
+    assert samples[("db_pool_overflow", ())] == 0
+    assert samples[("state_vector_snapshot_age_seconds", ())] >= 0
+
+
+async def test_metrics_endpoint(monkeypatch, tmp_path):
+    # Multiprocess mode builds a registry per scrape instead of registering
+    # the collector globally
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    app = make_app()
+    app.state.state_vector_tiles = FakeTiles()
+    setup_metrics(app)
+
+    async with client_for(app) as client:
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'cache_entries{cache="tiles"} 7.0' in response.text
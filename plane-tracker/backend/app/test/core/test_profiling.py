@@ -0,0 +1,82 @@
+import os
+
+import httpx
+import orjson
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from app.core.profiling import ProfilingMiddleware
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "s3cret"
+
+
+def make_app(**options) -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/vector/{icao24}")
+    async def vector(icao24: str):
+        return {"icao24": icao24}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/planes")
+    app.add_middleware(ProfilingMiddleware, **options)
+    return app
+
+
+def client_for(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [{}, {"X-Admin-Secret": "wrong"}, {"X-Admin-Secret": SECRET[:-1]}],
+)
+async def test_profiles_need_the_admin_secret(headers):
+    async with client_for(make_app(admin_secret=SECRET)) as client:
+        response = await client.get("/api/v1/planes/vector/abc123?profile=1", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"icao24": "abc123"}
+
+
+async def test_profiles_are_disabled_without_an_admin_secret():
+    async with client_for(make_app(admin_secret=None)) as client:
+        response = await client.get(
+            "/api/v1/planes/vector/abc123", headers={"X-Profile": "1", "X-Admin-Secret": ""}
+        )
+
+    assert response.json() == {"icao24": "abc123"}
+
+
+async def test_admin_gets_the_profile_instead_of_the_response():
+    async with client_for(make_app(admin_secret=SECRET)) as client:
+        html = await client.get(
+            "/api/v1/planes/vector/abc123?profile=1", headers={"X-Admin-Secret": SECRET}
+        )
+        speedscope = await client.get(
+            "/api/v1/planes/vector/abc123?profile_format=speedscope",
+            headers={"X-Profile": "true", "X-Admin-Secret": SECRET},
+        )
+
+    assert html.headers["content-type"].startswith("text/html")
+    assert int(html.headers["content-length"]) == len(html.content)
+    assert speedscope.headers["content-type"] == "application/json"
+    assert "speedscope" in orjson.loads(speedscope.content)["$schema"]
+
+
+async def test_sampled_profiles_are_written_and_rotated(tmp_path):
+    app = make_app(admin_secret=SECRET, output_dir=str(tmp_path), sample_rate=1.0, max_files=2)
+
+    async with client_for(app) as client:
+        for _ in range(3):
+            response = await client.get("/api/v1/planes/vector/abc123")
+            # Sampled requests keep their normal response
+            assert response.json() == {"icao24": "abc123"}
+
+    profiles = os.listdir(tmp_path)
+    assert len(profiles) == 2
+    # Named after the route template, never the raw path
+    assert all("GET_api_v1_planes_vector_icao24_" in name for name in profiles)
+    assert all(name.endswith(".speedscope.json") for name in profiles)
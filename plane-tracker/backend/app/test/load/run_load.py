@@ -0,0 +1,414 @@
+"""
+Load test of the real app against mocked upstreams, per worker count.
+
+Usage (from backend/app):
+    python -m test.load.run_load [--workers 1 2 3] [--concurrency 50]
+        [--duration 30] [--baseline test/load/baseline.json]
+        [--output load-results.json]
+
+For every worker count the app is started as in production (gunicorn with
+uvicorn workers, or uvicorn --workers if gunicorn isn't installed) with:
+- OpenSky and wttr.in served by the mock in test/benchmarks/mock_opensky.py,
+  in its own process so it doesn't compete with the load generator;
+- a throwaway SQLite airports database with synthetic airports.
+
+A closed-loop asyncio generator then replays a weighted mix of viewport,
+track, airport and weather requests at the given concurrency, and reports
+throughput, p50/p95/p99 latency and error rate per endpoint. With a
+baseline, the run exits with status 1 when a threshold is exceeded.
+
+Latencies depend on the machine, so no baseline is committed by default:
+until test/load/baseline.json exists the run only reports. Create it with
+--update-baseline on the host used for sizing, from a known-good commit.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+
+from test.benchmarks.mock_opensky import create_mock_opensky, free_port, make_fleet
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+CITIES = ("Quito", "Tegucigalpa", "Madrid", "London", "Tokyo", "Lima", "Bogota", "Paris")
+
+# (method, path, params) of one request
+Request = Tuple[str, str, Dict[str, Any]]
+
+
+@dataclass
+class Scenario:
+    """A kind of request and its share of the mix."""
+
+    name: str
+    weight: float
+    build: Callable[[random.Random], Request]
+
+
+def build_scenarios(fleet_size: int, airports: List[Tuple[str, float, float]]) -> List[Scenario]:
+    def viewport(rng: random.Random) -> Request:
+        lomin, lamin = rng.uniform(-130, 140), rng.uniform(-40, 60)
+        span = rng.choice((2.0, 5.0, 10.0, 20.0))
+        params = {"lomin": lomin, "lamin": lamin, "lomax": lomin + span, "lamax": lamin + span}
+        return "GET", "/api/v1/planes/vectors/area", params
+
+    def track(rng: random.Random) -> Request:
+        return "GET", "/api/v1/planes/vector", {"icao": f"{rng.randrange(fleet_size):06x}"}
+
+    def airport(rng: random.Random) -> Request:
+        if rng.random() < 0.5:
+            icao = rng.choice(airports)[0]
+            return "GET", "/api/v1/airports/info", {"icao": icao}
+        return "GET", "/api/v1/airports/nearest", {
+            "lat": rng.uniform(-60, 70),
+            "lon": rng.uniform(-180, 180),
+            "k": 5,
+        }
+
+    def weather(rng: random.Random) -> Request:
+        return "GET", "/api/v1/weather/weather_async", {"city": rng.choice(CITIES)}
+
+    return [
+        Scenario("viewport", 0.6, viewport),
+        Scenario("track", 0.15, track),
+        Scenario("airport", 0.15, airport),
+        Scenario("weather", 0.1, weather),
+    ]
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    def report(self, duration: float) -> Dict[str, Any]:
+        requests = len(self.latencies)
+        ordered = sorted(self.latencies)
+
+        def pick(q: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(requests - 1, int(q * requests))] * 1000, 2)
+
+        return {
+            "requests": requests,
+            "rps": round(requests / duration, 1),
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "mean_ms": round(statistics.fmean(ordered) * 1000, 2) if ordered else None,
+            "error_rate": round(self.errors / requests, 4) if requests else 0.0,
+        }
+
+
+async def generate_load(
+    base_url: str,
+    scenarios: List[Scenario],
+    concurrency: int,
+    duration: float,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Runs concurrency clients back to back for duration seconds."""
+    stats = {scenario.name: EndpointStats() for scenario in scenarios}
+    weights = [scenario.weight for scenario in scenarios]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        deadline = time.perf_counter() + duration
+
+        async def user(index: int) -> None:
+            rng = random.Random(seed * 100_003 + index)
+            while time.perf_counter() < deadline:
+                scenario = rng.choices(scenarios, weights)[0]
+                method, path, params = scenario.build(rng)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, params=params)
+                    failed = response.status_code >= 500
+                except httpx.HTTPError:
+                    failed = True
+                stats[scenario.name].latencies.append(time.perf_counter() - started)
+                stats[scenario.name].errors += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*[user(i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    total = EndpointStats()
+    for endpoint_stats in stats.values():
+        total.latencies.extend(endpoint_stats.latencies)
+        total.errors += endpoint_stats.errors
+    return {
+        "endpoints": {name: s.report(elapsed) for name, s in stats.items()},
+        "total": total.report(elapsed),
+    }
+
+
+def seed_airports(path: str, count: int, seed: int = 0) -> List[Tuple[str, float, float]]:
+    """
+    SQLite airports table with synthetic airports. Locations are stored as
+    EWKT text, which the airport cache reads the same as PostGIS output.
+    """
+    rng = random.Random(seed)
+    airports = []
+    for i in range(count):
+        icao = "".join(chr(65 + (i // 26**p) % 26) for p in range(4))
+        airports.append((icao, rng.uniform(-180, 180), rng.uniform(-60, 70)))
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE airports (id INTEGER PRIMARY KEY, icao TEXT UNIQUE NOT NULL, iata TEXT, "
+            "name TEXT NOT NULL, country TEXT, elevation_ft INTEGER, location TEXT, "
+            "updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        connection.executemany(
+            "INSERT INTO airports (icao, iata, name, country, elevation_ft, location) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (icao, icao[:3], f"Airport {icao}", "XX", 100, f"SRID=4326;POINT({lon} {lat})")
+                for icao, lon, lat in airports
+            ],
+        )
+    return airports
+
+
+def serve_mock_upstreams(port: int, fleet_size: int) -> None:
+    """Mock OpenSky plus a wttr.in stand-in under /wttr (run in a subprocess)."""
+    mock = create_mock_opensky(make_fleet(fleet_size))
+
+    @mock.get("/wttr/{city}")
+    async def weather(city: str):
+        return {
+            "current_condition": [{"temp_C": "21", "weatherDesc": [{"value": "Sunny"}]}],
+            "nearest_area": [{"areaName": [{"value": city}]}],
+        }
+
+    uvicorn.run(mock, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+
+
+def app_command(workers: int, port: int) -> List[str]:
+    """The production gunicorn command, or uvicorn when gunicorn is missing."""
+    try:
+        import gunicorn  # noqa: F401
+
+        return [
+            sys.executable, "-m", "gunicorn", "-w", str(workers),
+            "-k", "uvicorn.workers.UvicornWorker", "app.main:app",
+            "--bind", f"127.0.0.1:{port}", "--preload", "--timeout", "120",
+        ]
+    except ImportError:
+        return [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ]
+
+
+def wait_until_ready(url: str, is_alive: Callable[[], bool], timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not is_alive():
+            raise RuntimeError("Process exited")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def run_for_workers(
+    args: argparse.Namespace,
+    scenarios: List[Scenario],
+    workers: int,
+    workdir: str,
+    mock_url: str,
+) -> Dict[str, Any]:
+    port = free_port("127.0.0.1")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'airports.db')}",
+        "OSKY_BASE_URL": f"{mock_url}/api",
+        "OSKY_TOKEN_ENDPOINT": f"{mock_url}/token",
+        "OSKY_TOKEN_STORE": "file",
+        "OSKY_TOKEN_FILE": os.path.join(workdir, f"token_{workers}.json"),
+        "OSKY_FLIGHTS_CACHE_DIR": os.path.join(workdir, "flights"),
+        "STATE_VECTOR_SHARED_DIR": os.path.join(workdir, f"poller_{workers}"),
+        # The mock has no quota: measure the app, not the credit budget
+        "OSKY_CREDITS_PER_DAY": "0",
+        "WHEATER_URL": f"{mock_url}/wttr",
+        "CLIENT_ID": os.environ.get("CLIENT_ID", "load"),
+        "SECRET": os.environ.get("SECRET", "load"),
+        "BACKEND_CORS_ORIGINS": os.environ.get("BACKEND_CORS_ORIGINS", '["http://localhost"]'),
+    }
+    log_path = os.path.join(workdir, f"app_{workers}.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            app_command(workers, port), cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                wait_until_ready(
+                    f"{base_url}/api/v1/planes/upstream/status", lambda: process.poll() is None
+                )
+            except RuntimeError as e:
+                raise RuntimeError(f"App did not start ({e}), see {log_path}")
+            # Let the elected poller fetch its first snapshot and share it
+            time.sleep(args.warmup)
+            result = asyncio.run(
+                generate_load(base_url, scenarios, args.concurrency, args.duration, args.seed)
+            )
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return {"workers": workers, "concurrency": args.concurrency, "duration_s": args.duration, **result}
+
+
+def check_baseline(runs: List[Dict[str, Any]], baseline: Dict[str, Any]) -> List[str]:
+    """
+    Threshold violations. baseline["thresholds"] maps an endpoint (or
+    "total") to maximum p50_ms/p95_ms/p99_ms/error_rate; entries under
+    baseline["workers"][<count>] override them for that worker count.
+    """
+    violations = []
+    if baseline.get("concurrency") not in (None, runs[0]["concurrency"] if runs else None):
+        print(f"Warning: the baseline was measured with {baseline['concurrency']} concurrent clients")
+    for run in runs:
+        overrides = baseline.get("workers", {}).get(str(run["workers"]), {})
+        defaults = baseline.get("thresholds", {})
+        thresholds = {
+            name: {**defaults.get(name, {}), **overrides.get(name, {})}
+            for name in {**defaults, **overrides}
+        }
+        reports = {**run["endpoints"], "total": run["total"]}
+        for name, limits in thresholds.items():
+            report = reports.get(name)
+            if report is None or not report["requests"]:
+                continue
+            for metric, limit in limits.items():
+                value = report.get(metric)
+                if value is not None and value > limit:
+                    violations.append(
+                        f"{run['workers']} workers, {name}: {metric} {value} > {limit}"
+                    )
+    return violations
+
+
+def make_baseline(runs: List[Dict[str, Any]], headroom: float = 1.5) -> Dict[str, Any]:
+    """
+    Baseline from the runs of a known-good build: p95/p99 per worker count
+    with headroom, and a 1% error rate for every endpoint.
+    """
+    names = list(runs[0]["endpoints"]) + ["total"] if runs else []
+    workers = {}
+    for run in runs:
+        reports = {**run["endpoints"], "total": run["total"]}
+        workers[str(run["workers"])] = {
+            name: {
+                metric: round(reports[name][metric] * headroom, 1)
+                for metric in ("p95_ms", "p99_ms")
+                if reports[name][metric] is not None
+            }
+            for name in names
+        }
+    return {
+        "concurrency": runs[0]["concurrency"] if runs else None,
+        "thresholds": {name: {"error_rate": 0.01} for name in names},
+        "workers": workers,
+    }
+
+
+def print_run(run: Dict[str, Any]) -> None:
+    print(f"\n{run['workers']} worker(s), {run['concurrency']} concurrent clients, {run['duration_s']}s")
+    print(f"  {'endpoint':<10} {'req':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for name, report in {**run["endpoints"], "total": run["total"]}.items():
+        print(
+            f"  {name:<10} {report['requests']:>7} {report['rps']:>8} "
+            f"{report['p50_ms'] or '-':>8} {report['p95_ms'] or '-':>8} {report['p99_ms'] or '-':>8} "
+            f"{report['error_rate']:>7.2%}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the app against mocked upstreams.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load per worker count")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--fleet-size", type=int, default=10_000)
+    parser.add_argument("--airports", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Thresholds file; empty to skip")
+    parser.add_argument("--output", default="load-results.json")
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write the baseline from this run (p95/p99 with 50%% headroom) instead of checking it",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="plane-tracker-load-") as workdir:
+        airports = seed_airports(os.path.join(workdir, "airports.db"), args.airports, args.seed)
+        scenarios = build_scenarios(args.fleet_size, airports)
+
+        mock_port = free_port("127.0.0.1")
+        mock_url = f"http://127.0.0.1:{mock_port}"
+        mock = multiprocessing.Process(
+            target=serve_mock_upstreams, args=(mock_port, args.fleet_size), daemon=True
+        )
+        mock.start()
+        try:
+            wait_until_ready(f"{mock_url}/wttr/ready", mock.is_alive)
+            runs = []
+            for workers in args.workers:
+                run = run_for_workers(args, scenarios, workers, workdir, mock_url)
+                print_run(run)
+                runs.append(run)
+        finally:
+            mock.terminate()
+            mock.join()
+
+    violations = []
+    if args.update_baseline:
+        with open(args.baseline or DEFAULT_BASELINE, "w") as f:
+            json.dump(make_baseline(runs), f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline or DEFAULT_BASELINE}")
+    elif args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            violations = check_baseline(runs, json.load(f))
+    elif args.baseline:
+        print(f"No baseline at {args.baseline}: thresholds not checked (see --update-baseline)")
+
+    with open(args.output, "w") as f:
+        json.dump({"runs": runs, "violations": violations}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if violations:
+        print("\nRegressions against the baseline:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import httpx
+import numpy as np
+import orjson
+import pytest
+from fastapi import FastAPI
+
+from app.schemas.response_schema import IGetResponseBase, create_fast_response, create_response
+
+pytestmark = pytest.mark.anyio
+
+
+def test_fast_response_renders_the_get_envelope():
+    response = create_fast_response({"vectors": []}, meta={"count": 0})
+
+    assert response.media_type == "application/json"
+    assert orjson.loads(response.body) == {
+        "message": "Data got correctly",
+        "meta": {"count": 0},
+        "data": {"vectors": []},
+    }
+    assert orjson.loads(create_fast_response(None, message="Cached").body)["message"] == "Cached"
+
+
+def test_fast_response_serializes_numpy_and_int_keys():
+    response = create_fast_response(
+        {"longitude": np.array([1.5, np.nan]), "ids": np.array([1, 2], dtype=np.int64), 7: "x"}
+    )
+
+    assert orjson.loads(response.body)["data"] == {
+        "longitude": [1.5, None],
+        "ids": [1, 2],
+        "7": "x",
+    }
+
+
+async def test_fast_response_matches_create_response():
+    data = {"vectors": [{"icao24": "aaaaaa", "longitude": -3.7, "on_ground": False}]}
+    app = FastAPI()
+
+    @app.get("/model", response_model=IGetResponseBase[dict])
+    async def model():
+        return create_response(data, meta={"age": 1.5})
+
+    @app.get("/fast")
+    async def fast():
+        return create_fast_response(data, meta={"age": 1.5})
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        slow = await client.get("/model")
+        quick = await client.get("/fast")
+
+    assert quick.headers["content-type"] == slow.headers["content-type"]
+    assert quick.json() == slow.json()
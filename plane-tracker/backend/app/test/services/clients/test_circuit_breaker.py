@@ -0,0 +1,120 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.clients.circuit_breaker import CircuitBreaker, CircuitState
+from app.utils.exceptions import UpstreamRateLimitedException, UpstreamUnavailableException
+
+pytestmark = pytest.mark.anyio
+
+
+def returning(status: int):
+    async def send():
+        return httpx.Response(status)
+
+    return send
+
+
+async def failing():
+    raise httpx.ConnectTimeout("timed out")
+
+
+async def fail(breaker: CircuitBreaker, times: int, send=failing) -> None:
+    for _ in range(times):
+        with pytest.raises(UpstreamUnavailableException):
+            await breaker.call(send)
+
+
+async def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    await fail(breaker, 2)
+    await fail(breaker, 1, returning(502))
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.opened == 1
+
+    calls = []
+
+    async def send():
+        calls.append(1)
+        return httpx.Response(200)
+
+    with pytest.raises(UpstreamUnavailableException) as excinfo:
+        await breaker.call(send)
+    assert calls == []
+    assert breaker.short_circuited == 1
+    assert 29 <= breaker.retry_after <= 30
+    assert excinfo.value.headers["Retry-After"] == "30"
+
+
+async def test_success_resets_the_count():
+    breaker = CircuitBreaker(failure_threshold=3)
+    await fail(breaker, 2)
+    await breaker.call(returning(200))
+    await fail(breaker, 2)
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.stats()["consecutive_failures"] == 2
+
+
+async def test_client_errors_are_not_failures():
+    breaker = CircuitBreaker(failure_threshold=1)
+    response = await breaker.call(returning(404))
+    assert response.status_code == 404
+
+    async def rate_limited():
+        raise UpstreamRateLimitedException(retry_after=5)
+
+    with pytest.raises(UpstreamRateLimitedException):
+        await breaker.call(rate_limited)
+    assert breaker.state is CircuitState.CLOSED
+
+
+async def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    await fail(breaker, 1)
+    await asyncio.sleep(0.06)
+    assert breaker.state is CircuitState.HALF_OPEN
+
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return httpx.Response(200)
+
+    probe = asyncio.create_task(breaker.call(slow))
+    await asyncio.sleep(0)
+    # Others fail fast while the probe is in flight
+    with pytest.raises(UpstreamUnavailableException):
+        await breaker.call(returning(200))
+
+    release.set()
+    assert (await probe).status_code == 200
+    assert breaker.state is CircuitState.CLOSED
+    assert (await breaker.call(returning(200))).status_code == 200
+
+
+async def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    await fail(breaker, 3)
+    await asyncio.sleep(0.06)
+
+    # One failure is enough when probing
+    await fail(breaker, 1, returning(503))
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.retry_after > 0.04
+    assert breaker.opened == 1
+
+
+async def test_cancelled_probe_frees_the_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    await fail(breaker, 1)
+    await asyncio.sleep(0.06)
+
+    probe = asyncio.create_task(breaker.call(asyncio.Event().wait))
+    await asyncio.sleep(0)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state is CircuitState.HALF_OPEN
+    assert (await breaker.call(returning(200))).status_code == 200
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.clients.oauth2_client import MIN_PROACTIVE_REFRESH_DELAY, AsyncOAuth2Client
+
+pytestmark = pytest.mark.anyio
+
+
+class TokenServer:
+    """Mock token endpoint counting requests."""
+
+    def __init__(self, expires_in: int = 3600):
+        self.expires_in = expires_in
+        self.requests = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        return httpx.Response(
+            200,
+            json={"access_token": f"token-{self.requests}", "expires_in": self.expires_in},
+        )
+
+    def client(self) -> AsyncOAuth2Client:
+        return AsyncOAuth2Client(
+            client_id="id",
+            client_secret="secret",
+            token_endpoint="https://auth.example.test/token",
+            client_kwargs={"transport": httpx.MockTransport(self)},
+        )
+
+
+def proactive_delay(client: AsyncOAuth2Client) -> float:
+    return client._proactive_refresh.when() - asyncio.get_running_loop().time()
+
+
+async def test_concurrent_callers_share_one_fetch():
+    server = TokenServer()
+    client = server.client()
+    try:
+        await asyncio.gather(*[client.ensure_valid_token() for _ in range(10)])
+        assert server.requests == 1
+        # Renewed refresh_margin (300 s) before it expires
+        assert proactive_delay(client) == pytest.approx(3300, abs=1)
+    finally:
+        await client.close()
+
+
+async def test_short_lived_token_is_renewed_halfway():
+    # Shorter than refresh_margin: a full margin would renew it right away
+    server = TokenServer(expires_in=120)
+    client = server.client()
+    try:
+        await client.ensure_valid_token()
+        assert proactive_delay(client) == pytest.approx(60, abs=1)
+
+        await client.ensure_valid_token()
+        await asyncio.sleep(0.05)
+        assert server.requests == 1
+    finally:
+        await client.close()
+
+
+async def test_renewals_are_spaced_out_however_short_the_token():
+    server = TokenServer(expires_in=2)
+    client = server.client()
+    try:
+        await client.refresh_token()
+        assert proactive_delay(client) >= MIN_PROACTIVE_REFRESH_DELAY - 0.1
+        await asyncio.sleep(0.05)
+        assert server.requests == 1
+    finally:
+        await client.close()
+
+
+async def test_401_refreshes_once_and_replays():
+    tokens = TokenServer()
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "auth.example.test":
+            return tokens(request)
+        seen.append(request.headers["Authorization"])
+        status = 401 if request.headers["Authorization"] == "Bearer token-1" else 200
+        return httpx.Response(status)
+
+    client = AsyncOAuth2Client(
+        client_id="id",
+        client_secret="secret",
+        token_endpoint="https://auth.example.test/token",
+        client_kwargs={"transport": httpx.MockTransport(handler)},
+    )
+    try:
+        responses = await asyncio.gather(
+            *[client.get("https://api.example.test/states") for _ in range(5)]
+        )
+        assert [response.status_code for response in responses] == [200] * 5
+        assert tokens.requests == 2
+        assert seen.count("Bearer token-1") == 5
+    finally:
+        await client.close()
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import threading
+import time
+
+import fakeredis
+import httpx
+import pytest
+
+from app.services.clients import token_store as token_store_module
+from app.services.clients.oauth2_client import AsyncOAuth2Client
+from app.services.clients.token_store import FileTokenStore, RedisTokenStore
+
+pytestmark = pytest.mark.anyio
+
+TOKEN_ENDPOINT = "https://auth.example.test/token"
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    # Every RedisTokenStore gets its own client on one shared fake server,
+    # like workers connected to the same Redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        token_store_module.aioredis,
+        "from_url",
+        lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server),
+    )
+    return server
+
+
+@pytest.fixture(params=["file", "redis"])
+async def make_store(request, tmp_path, redis_server):
+    """Factory of stores sharing one token, as the workers of a deployment do."""
+    stores = []
+
+    def make(lock_timeout: float = 5.0):
+        if request.param == "file":
+            store = FileTokenStore(str(tmp_path / "token.json"), lock_timeout=lock_timeout)
+        else:
+            store = RedisTokenStore("redis://test", lock_timeout=lock_timeout)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        await store.close()
+
+
+def make_token(access_token: str, expires_in: float = 3600) -> dict:
+    return {"access_token": access_token, "expires_at": time.time() + expires_in}
+
+
+class TokenServer:
+    """Mock token endpoint counting requests; each one takes `delay` seconds."""
+
+    def __init__(self, delay: float = 0.05, expires_in: int = 3600):
+        self.delay = delay
+        self.expires_in = expires_in
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        number = self.requests
+        await asyncio.sleep(self.delay)
+        return httpx.Response(
+            200, json={"access_token": f"token-{number}", "expires_in": self.expires_in}
+        )
+
+    def client(self, store) -> AsyncOAuth2Client:
+        return AsyncOAuth2Client(
+            client_id="id",
+            client_secret="secret",
+            token_endpoint=TOKEN_ENDPOINT,
+            client_kwargs={"transport": httpx.MockTransport(self)},
+            token_store=store,
+        )
+
+
+async def test_round_trip(make_store):
+    writer, reader = make_store(), make_store()
+    assert await reader.load() is None
+
+    token = make_token("abc")
+    await writer.save(token)
+    assert await reader.load() == token
+
+    await writer.save(make_token("def"))
+    assert (await reader.load())["access_token"] == "def"
+
+
+async def test_file_store_ignores_corrupt_file(tmp_path):
+    path = tmp_path / "token.json"
+    path.write_text('{"access_token": ')
+    assert await FileTokenStore(str(path)).load() is None
+
+
+async def test_file_store_write_is_atomic(tmp_path):
+    path = tmp_path / "token.json"
+    store = FileTokenStore(str(path))
+    # Large enough that a non-atomic write would be seen half done
+    tokens = [{"access_token": str(i) * 20000, "expires_at": i} for i in range(50)]
+    seen = []
+    done = threading.Event()
+
+    def read_until_done():
+        while not done.is_set():
+            seen.append(store._read())
+
+    reader = threading.Thread(target=read_until_done)
+    reader.start()
+    try:
+        for token in tokens:
+            await store.save(token)
+    finally:
+        done.set()
+        reader.join()
+
+    assert all(token is None or token in tokens for token in seen)
+    # No temporary file is left behind
+    assert os.listdir(tmp_path) == ["token.json"]
+
+
+async def test_lock_contention(make_store):
+    holder, waiter = make_store(), make_store(lock_timeout=0.2)
+    async with holder.lock() as acquired:
+        assert acquired
+        async with waiter.lock() as waiter_acquired:
+            assert not waiter_acquired
+
+    async with waiter.lock() as acquired:
+        assert acquired
+
+
+async def test_lock_serializes_holders(make_store):
+    stores = [make_store() for _ in range(4)]
+    inside = 0
+    overlaps = 0
+
+    async def hold(store):
+        nonlocal inside, overlaps
+        async with store.lock() as acquired:
+            assert acquired
+            inside += 1
+            overlaps += inside > 1
+            await asyncio.sleep(0.02)
+            inside -= 1
+
+    await asyncio.gather(*[hold(store) for store in stores])
+    assert overlaps == 0
+
+
+async def test_redis_token_expires_with_the_token(redis_server):
+    store = RedisTokenStore("redis://test")
+    try:
+        await store.save(make_token("abc", expires_in=120))
+        assert 115 <= await store._redis.ttl(store.key) <= 120
+        # Already expired: kept for a second at most, never without a TTL
+        await store.save(make_token("old", expires_in=-10))
+        assert await store._redis.ttl(store.key) == 1
+        await asyncio.sleep(1.1)
+        assert await store.load() is None
+    finally:
+        await store.close()
+
+
+async def test_refresh_once_across_concurrent_clients(make_store):
+    server = TokenServer()
+    clients = [server.client(make_store()) for _ in range(8)]
+    try:
+        await asyncio.gather(*[client.ensure_valid_token() for client in clients])
+        assert server.requests == 1
+        assert {client.token["access_token"] for client in clients} == {"token-1"}
+
+        # All of them see the token rejected (401) at once: one refresh
+        await asyncio.gather(
+            *[client.refresh_token(stale_token="token-1") for client in clients]
+        )
+        assert server.requests == 2
+        assert {client.token["access_token"] for client in clients} == {"token-2"}
+    finally:
+        await asyncio.gather(*[client.close() for client in clients])
+
+
+async def test_expired_shared_token_is_not_reused(make_store):
+    server = TokenServer()
+    store = make_store()
+    # Within the client's refresh margin (300 s): due for renewal
+    await store.save(make_token("shared", expires_in=60))
+    client = server.client(store)
+    try:
+        await client.ensure_valid_token()
+        assert server.requests == 1
+        assert client.token["access_token"] == "token-1"
+        assert (await store.load())["access_token"] == "token-1"
+    finally:
+        await client.close()
+
+
+async def test_valid_shared_token_is_reused(make_store):
+    server = TokenServer()
+    store = make_store()
+    await store.save(make_token("shared"))
+    client = server.client(store)
+    try:
+        await client.ensure_valid_token()
+        assert server.requests == 0
+        assert client.token["access_token"] == "shared"
+    finally:
+        await client.close()
+
+
+async def test_redis_down_falls_back_to_a_local_refresh(redis_server):
+    redis_server.connected = False
+    server = TokenServer()
+    client = server.client(RedisTokenStore("redis://test"))
+    try:
+        await client.ensure_valid_token()
+        assert client.token["access_token"] == "token-1"
+
+        # Still a single refresh within the worker
+        await asyncio.gather(*[client.refresh_token(stale_token="token-1") for _ in range(5)])
+        assert server.requests == 2
+    finally:
+        await client.close()
+        await client.token_store.close()
+
+
+async def test_unusable_token_file_falls_back_to_a_local_refresh(tmp_path):
+    (tmp_path / "not-a-dir").write_text("")
+    server = TokenServer()
+    client = server.client(FileTokenStore(str(tmp_path / "not-a-dir" / "token.json")))
+    try:
+        await client.ensure_valid_token()
+        assert server.requests == 1
+        assert client.token["access_token"] == "token-1"
+    finally:
+        await client.close()
+
+
+async def test_token_kept_when_only_publishing_fails(make_store, monkeypatch):
+    server = TokenServer()
+    store = make_store()
+
+    async def broken_save(token):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "save", broken_save)
+    client = server.client(store)
+    try:
+        await client.ensure_valid_token()
+        assert server.requests == 1
+        assert client.token["access_token"] == "token-1"
+    finally:
+        await client.close()
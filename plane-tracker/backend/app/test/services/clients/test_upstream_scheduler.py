@@ -0,0 +1,202 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services.clients.upstream_scheduler import (
+    FLIGHTS_CREDITS,
+    STATES_GLOBAL_CREDITS,
+    TRACKS_CREDITS,
+    UpstreamPriority,
+    UpstreamScheduler,
+    estimate_credits,
+)
+from app.utils.exceptions import UpstreamRateLimitedException
+
+pytestmark = pytest.mark.anyio
+
+STATES_URL = "https://opensky-network.org/api/states/all"
+
+
+def area(side: float) -> dict:
+    return {"lamin": 0, "lamax": side, "lomin": 0, "lomax": side}
+
+
+@pytest.mark.parametrize(
+    "url, params, credits",
+    [
+        (STATES_URL, area(5), 1),
+        (STATES_URL, area(10), 2),
+        (STATES_URL, area(20), 3),
+        (STATES_URL, area(21), STATES_GLOBAL_CREDITS),
+        (STATES_URL, None, STATES_GLOBAL_CREDITS),
+        (STATES_URL, {"lamin": "x", "lamax": 1, "lomin": 0, "lomax": 1}, STATES_GLOBAL_CREDITS),
+        ("https://opensky-network.org/api/tracks/all", {"icao24": "abc"}, TRACKS_CREDITS),
+        ("https://opensky-network.org/api/flights/all", None, FLIGHTS_CREDITS),
+        ("https://opensky-network.org/api/other", None, 1),
+    ],
+)
+def test_estimate_credits(url, params, credits):
+    assert estimate_credits(url, params) == credits
+
+
+def responses(*statuses, headers=None):
+    """send() returning the given statuses in turn, counting the calls."""
+    calls = []
+
+    async def send():
+        calls.append(time.monotonic())
+        return httpx.Response(statuses[len(calls) - 1], headers=headers)
+
+    return send, calls
+
+
+async def test_queue_follows_priority():
+    scheduler = UpstreamScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    order = []
+
+    async def blocking():
+        await release.wait()
+        return httpx.Response(200)
+
+    def recording(name):
+        async def send():
+            order.append(name)
+            return httpx.Response(200)
+
+        return send
+
+    first = asyncio.create_task(scheduler.request(blocking))
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.create_task(scheduler.request(recording(priority.name), priority))
+        for priority in (UpstreamPriority.BULK, UpstreamPriority.TRACKS, UpstreamPriority.POLLER)
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth() == {"poller": 1, "interactive": 0, "tracks": 1, "bulk": 1}
+
+    release.set()
+    await asyncio.gather(first, *queued)
+    assert order == ["POLLER", "TRACKS", "BULK"]
+    assert scheduler.stats()["active"] == 0
+
+
+async def test_retries_a_429_after_the_advertised_wait():
+    scheduler = UpstreamScheduler()
+    send, calls = responses(429, 200, headers={"X-Rate-Limit-Retry-After-Seconds": "0.05"})
+
+    response = await scheduler.request(send)
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.05
+    assert (scheduler.rate_limited, scheduler.retries, scheduler.rejected) == (1, 1, 0)
+
+
+async def test_gives_up_after_max_retries():
+    scheduler = UpstreamScheduler(max_retries=2, backoff_base=0.01)
+    send, calls = responses(429, 429, 429, 200)
+
+    with pytest.raises(UpstreamRateLimitedException):
+        await scheduler.request(send)
+
+    assert len(calls) == 3
+    assert (scheduler.rate_limited, scheduler.retries, scheduler.rejected) == (3, 2, 1)
+
+
+async def test_long_retry_after_fails_at_once_and_pauses_everyone():
+    scheduler = UpstreamScheduler(max_backoff=10, max_wait=0.05)
+    send, calls = responses(429, headers={"X-Rate-Limit-Retry-After-Seconds": "60"})
+
+    with pytest.raises(UpstreamRateLimitedException) as excinfo:
+        await scheduler.request(send)
+    assert len(calls) == 1
+    assert excinfo.value.headers["Retry-After"] == "60"
+
+    # The pause holds back the next requests too
+    other, other_calls = responses(200)
+    with pytest.raises(UpstreamRateLimitedException):
+        await scheduler.request(other)
+    assert other_calls == []
+    assert scheduler.stats()["paused_for"] > 50
+
+
+async def test_request_fails_when_its_turn_does_not_come_in_max_wait():
+    scheduler = UpstreamScheduler(max_concurrency=1, max_wait=0.05)
+    release = asyncio.Event()
+
+    async def blocking():
+        await release.wait()
+        return httpx.Response(200)
+
+    first = asyncio.create_task(scheduler.request(blocking))
+    await asyncio.sleep(0)
+    send, calls = responses(200)
+    with pytest.raises(UpstreamRateLimitedException):
+        await scheduler.request(send)
+    assert calls == []
+    assert scheduler.rejected == 1
+
+    release.set()
+    await first
+    assert scheduler.queue_depth()["interactive"] == 0
+
+
+async def test_budget_spaces_requests_out():
+    # 20 credits per second with room for one
+    scheduler = UpstreamScheduler(credits_per_day=20 * 86400, burst=1)
+    send, calls = responses(200, 200, 200)
+
+    await asyncio.gather(*[scheduler.request(send, cost=1) for _ in range(3)])
+
+    assert calls[2] - calls[0] >= 0.09
+    assert scheduler.credits_spent == 3
+
+
+async def test_upstream_remaining_caps_the_bucket():
+    scheduler = UpstreamScheduler(credits_per_day=4000, burst=400)
+    send, _ = responses(200, headers={"X-Rate-Limit-Remaining": "10"})
+
+    await scheduler.request(send, cost=1)
+
+    assert scheduler.upstream_remaining == 10
+    assert scheduler.tokens == pytest.approx(10, abs=0.01)
+
+
+async def test_without_budget_credits_are_only_counted():
+    scheduler = UpstreamScheduler(credits_per_day=None, burst=1)
+    send, calls = responses(200, 200)
+
+    await scheduler.request(send, cost=4)
+    await scheduler.request(send, cost=4)
+
+    assert len(calls) == 2
+    assert scheduler.credits_spent == 8
+    assert scheduler.stats()["tokens"] is None
+
+
+async def test_cancelled_waiter_does_not_keep_its_place():
+    scheduler = UpstreamScheduler(max_concurrency=1)
+    release = asyncio.Event()
+
+    async def blocking():
+        await release.wait()
+        return httpx.Response(200)
+
+    first = asyncio.create_task(scheduler.request(blocking))
+    await asyncio.sleep(0)
+    cancelled_send, cancelled_calls = responses(200)
+    cancelled = asyncio.create_task(scheduler.request(cancelled_send, UpstreamPriority.POLLER))
+    send, calls = responses(200)
+    waiting = asyncio.create_task(scheduler.request(send))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    release.set()
+    await asyncio.gather(first, waiting)
+
+    assert cancelled_calls == []
+    assert len(calls) == 1
+    assert scheduler.stats()["active"] == 0
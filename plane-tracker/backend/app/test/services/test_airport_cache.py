@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.services.airport_cache import AirportCache
+from app.services.airport_service import AirportService
+from test.services.test_airport_service import create_airports
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    await create_airports(engine)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def cache(engine):
+    cache = AirportCache(sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    await cache.reload()
+    return cache
+
+
+async def execute(engine, sql: str) -> None:
+    async with engine.begin() as connection:
+        await connection.exec_driver_sql(sql)
+
+
+async def test_reload_indexes_every_airport_by_icao_and_iata(cache):
+    assert len(cache.index) == 7
+
+    madrid = cache.get_by_icao(" lemd ")
+    assert madrid["name"] == "Madrid"
+    assert madrid["location"] == [-3.56, 40.47]
+    assert cache.get_by_iata("jfk")["location"] is None
+    assert cache.get_by_icao("XXXX") is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+async def test_fingerprint_only_reloads_on_changes(engine, cache):
+    assert await cache.reload_if_changed() is False
+
+    await execute(
+        engine,
+        "INSERT INTO airports (icao, iata, name, location) VALUES ('LPPT', 'LIS', 'Lisbon', 'POINT(-9.13 38.77)')",
+    )
+    assert await cache.reload_if_changed() is True
+    assert cache.get_by_iata("LIS")["icao"] == "LPPT"
+    assert await cache.reload_if_changed() is False
+
+
+async def test_fingerprint_sees_in_place_updates(engine, cache):
+    # Same row count and max id: only updated_at moves (a trigger on PostGIS)
+    await execute(
+        engine,
+        "UPDATE airports SET name = 'Madrid-Barajas', updated_at = '2999-01-01 00:00:00'"
+        " WHERE icao = 'LEMD'",
+    )
+
+    assert await cache.reload_if_changed() is True
+    assert cache.get_by_icao("LEMD")["name"] == "Madrid-Barajas"
+
+
+async def test_fingerprint_sees_a_delete_and_an_insert(engine, cache):
+    await execute(engine, "DELETE FROM airports WHERE icao = 'NFFN'")
+    await execute(
+        engine,
+        "INSERT INTO airports (icao, name, updated_at) VALUES ('LPPT', 'Lisbon', '2000-01-01 00:00:00')",
+    )
+
+    assert await cache.reload_if_changed() is True
+    assert cache.get_by_icao("NFFN") is None
+
+
+async def test_index_answers_spatial_queries(cache):
+    nearest = cache.index.nearest(-3.6, 40.5, 2)
+    assert [airport["icao"] for airport in nearest] == ["LEMD", "LEBL"]
+    assert nearest[0]["distance_km"] < 5
+
+    within = cache.index.within(-3.6, 40.5, 1000.0)
+    assert [airport["icao"] for airport in within] == ["LEMD", "LEBL"]
+
+
+async def test_service_reads_from_the_loaded_cache(engine, cache):
+    await execute(engine, "UPDATE airports SET name = 'Not reloaded yet' WHERE icao = 'LEMD'")
+
+    async with AsyncSession(engine) as session:
+        cached = AirportService(session, cache)
+        assert (await cached.get_airport_data("lemd"))["name"] == "Madrid"
+        assert (await cached.get_airports_by_codes(["LHR", "LEBL", "XXX"]))["XXX"] is None
+        # Without the cache the database answers
+        assert (await AirportService(session).get_airport_data("LEMD"))["name"] == "Not reloaded yet"
@@ -0,0 +1,191 @@
+"""
+Airport service. Without PostGIS it runs on SQLite, with the locations
+stored as (E)WKT text. The PostGIS tests run against TEST_DATABASE_URL like
+the ingest ones (see test/commands/test_ingest_airports.py) and are skipped
+without it.
+"""
+
+import math
+import uuid
+
+import asyncpg
+import numpy as np
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.commands.ingest_airports import asyncpg_dsn
+from app.services.airport_service import AirportService, _geodesic_envelope
+from test.commands.test_ingest_airports import INIT_SQL, TEST_DATABASE_URL, requires_postgis
+
+AIRPORTS = [
+    ("LEMD", "MAD", "Madrid", "Spain", "SRID=4326;POINT(-3.56 40.47)"),
+    ("EGLL", "LHR", "Heathrow", "United Kingdom", "POINT(-0.46 51.47)"),
+    ("LEBL", "BCN", "Barcelona", "spain", "POINT(2.07 41.29)"),
+    ("NZAA", "AKL", "Auckland", "New Zealand", "POINT(174.79 -37.01)"),
+    ("KJFK", "JFK", "John F Kennedy", "United States", None),
+    ("NFFN", "NAN", "Nadi", "Fiji", "POINT(177.44 -17.76)"),
+    ("PHNL", "HNL", "Honolulu", "United States", "POINT(-157.92 21.32)"),
+]
+
+
+async def create_airports(engine, airports=AIRPORTS) -> None:
+    """The airports table on SQLite, ids in the order of airports."""
+    async with engine.begin() as connection:
+        await connection.exec_driver_sql(
+            "CREATE TABLE airports (id INTEGER PRIMARY KEY, icao TEXT UNIQUE, iata TEXT,"
+            " name TEXT, country TEXT, elevation_ft INTEGER, location TEXT,"
+            " updated_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+        )
+        await connection.exec_driver_sql(
+            "INSERT INTO airports (icao, iata, name, country, location) VALUES (?, ?, ?, ?, ?)",
+            list(airports),
+        )
+
+
+@pytest.fixture
+async def sqlite_session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    await create_airports(engine)
+    async with AsyncSession(engine) as session:
+        yield session
+    await engine.dispose()
+
+
+async def walk_pages(service, size, **filters):
+    pages, cursor = [], None
+    while True:
+        airports, cursor = await service.get_airports_page(size, cursor, **filters)
+        pages.append([airport["icao"] for airport in airports])
+        if cursor is None:
+            return pages
+
+
+def unit_vector(longitude, latitude):
+    lon, lat = math.radians(longitude), math.radians(latitude)
+    return np.array([math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)])
+
+
+def arc_midpoint_latitude(west, east, latitude):
+    """Latitude of the middle of the great circle between two corners."""
+    middle = unit_vector(west, latitude) + unit_vector(east, latitude)
+    return math.degrees(math.asin(middle[2] / np.linalg.norm(middle)))
+
+
+@pytest.mark.parametrize("west, east", [(-45.0, 45.0), (10.0, 30.0), (170.0, 180.0)])
+def test_geodesic_envelope_reaches_the_equator_side_edge(west, east):
+    _, south, _, north = _geodesic_envelope(west, 40.0, east, 60.0)
+    # The great circle edge peaks at the box's latitude in the middle
+    assert arc_midpoint_latitude(west, east, south) == pytest.approx(40.0)
+    assert south < 40.0 and north == 60.0
+
+    _, south, _, north = _geodesic_envelope(west, -60.0, east, -40.0)
+    assert arc_midpoint_latitude(west, east, north) == pytest.approx(-40.0)
+    assert south == -60.0 and north > -40.0
+
+
+def test_geodesic_envelope_across_the_equator_is_unchanged():
+    # Both edges bow away from the box
+    assert _geodesic_envelope(-45.0, -10.0, 45.0, 10.0) == (-45.0, -10.0, 45.0, 10.0)
+
+
+@pytest.mark.anyio
+async def test_pages_walk_every_airport_once_in_id_order(sqlite_session):
+    service = AirportService(sqlite_session)
+
+    pages = await walk_pages(service, 3)
+
+    assert pages == [["LEMD", "EGLL", "LEBL"], ["NZAA", "KJFK", "NFFN"], ["PHNL"]]
+    first, cursor = await service.get_airports_page(3)
+    assert cursor == first[-1]["id"] == 3
+    assert first[0]["location"] == [-3.56, 40.47]
+
+
+@pytest.mark.anyio
+async def test_last_full_page_has_no_next_cursor(sqlite_session):
+    service = AirportService(sqlite_session)
+
+    airports, cursor = await service.get_airports_page(7)
+
+    assert len(airports) == 7 and cursor is None
+    assert await service.get_airports_page(5, cursor=7) == ([], None)
+
+
+@pytest.mark.anyio
+async def test_pages_filter_by_country_case_insensitively(sqlite_session):
+    service = AirportService(sqlite_session)
+
+    assert await walk_pages(service, 1, country="SPAIN") == [["LEMD"], ["LEBL"]]
+
+
+@pytest.mark.anyio
+async def test_pages_stay_full_when_the_bbox_drops_rows(sqlite_session):
+    service = AirportService(sqlite_session)
+    # Without PostGIS the bbox is checked after the query: pages keep
+    # reading batches until they are full
+    pages = await walk_pages(service, 2, bbox=(-10.0, 35.0, 5.0, 55.0))
+
+    assert pages == [["LEMD", "EGLL"], ["LEBL"]]
+
+
+@pytest.mark.anyio
+async def test_bbox_across_the_antimeridian_skips_airports_without_location(sqlite_session):
+    service = AirportService(sqlite_session)
+
+    pages = await walk_pages(service, 10, bbox=(170.0, -40.0, -150.0, 30.0))
+
+    assert pages == [["NZAA", "NFFN", "PHNL"]]
+
+
+@pytest.mark.anyio
+async def test_batches_start_after_the_given_id(sqlite_session):
+    service = AirportService(sqlite_session)
+
+    batches = [
+        [airport["icao"] for airport in batch]
+        async for batch in service.iter_airport_batches(after_id=2, batch_size=2)
+    ]
+
+    assert batches == [["LEBL", "NZAA"], ["KJFK", "NFFN"], ["PHNL"]]
+
+
+@pytest.fixture
+async def postgis_session():
+    schema = f"test_airports_{uuid.uuid4().hex[:8]}"
+    connection = await asyncpg.connect(asyncpg_dsn(TEST_DATABASE_URL))
+    engine = create_async_engine(
+        asyncpg_dsn(TEST_DATABASE_URL).replace("postgresql://", "postgresql+asyncpg://", 1),
+        connect_args={"server_settings": {"search_path": f"{schema},public"}},
+    )
+    try:
+        await connection.execute(f"CREATE SCHEMA {schema}")
+        await connection.execute(f"SET search_path TO {schema}, public")
+        await connection.execute(INIT_SQL.read_text())
+        async with AsyncSession(engine) as session:
+            yield session, connection
+    finally:
+        await engine.dispose()
+        await connection.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await connection.close()
+
+
+@requires_postgis
+@pytest.mark.anyio
+async def test_bbox_keeps_airports_just_poleward_of_a_wide_span(postgis_session):
+    session, connection = postgis_session
+    await connection.executemany(
+        "INSERT INTO airports (icao, name, location) VALUES ($1, $2, $3::geography)",
+        [
+            ("NMID", "North middle", "SRID=4326;POINT(0 40.01)"),
+            ("SMID", "South middle", "SRID=4326;POINT(0 -40.01)"),
+            ("NOUT", "North outside", "SRID=4326;POINT(0 39.99)"),
+            ("NEDG", "North corner", "SRID=4326;POINT(44.9 40.01)"),
+        ],
+    )
+    service = AirportService(session)
+
+    north, _ = await service.get_airports_page(10, bbox=(-45.0, 40.0, 45.0, 60.0))
+    south, _ = await service.get_airports_page(10, bbox=(-45.0, -60.0, 45.0, -40.0))
+
+    assert {airport["icao"] for airport in north} == {"NMID", "NEDG"}
+    assert [airport["icao"] for airport in south] == ["SMID"]
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.osky_service import FLIGHTS_MAX_INTERVAL, OskyService
+
+pytestmark = pytest.mark.anyio
+
+# Aligned to FLIGHTS_MAX_INTERVAL and long settled
+DAY = 1_700_006_400
+
+
+class FakeFlightsApi:
+    """flights/all: the flights seen in each requested interval."""
+
+    def __init__(self, flights, delay=0.0):
+        self.flights = flights
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.missing = set()
+
+    async def get(self, url, params=None):
+        self.calls.append((params["begin"], params["end"]))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        request = httpx.Request("GET", url)
+        if params["begin"] in self.missing:
+            return httpx.Response(404, request=request)
+        flights = [
+            flight for flight in self.flights
+            if flight["firstSeen"] <= params["end"] and flight["lastSeen"] >= params["begin"]
+        ]
+        return httpx.Response(200, json=flights, request=request)
+
+
+def flight(icao24, first_seen, last_seen):
+    return {"icao24": icao24, "firstSeen": first_seen, "lastSeen": last_seen}
+
+
+@pytest.fixture
+async def service(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "OSKY_TOKEN_STORE", "memory")
+    monkeypatch.setattr(settings, "OSKY_FLIGHTS_CACHE_DIR", str(tmp_path))
+    service = OskyService("client", "secret")
+    yield service
+    await service.close()
+
+
+def use_api(monkeypatch, service, api):
+    monkeypatch.setattr(service.oauth_client, "get", api.get)
+    return api
+
+
+async def test_range_is_fetched_in_aligned_chunks_with_bounded_concurrency(monkeypatch, service):
+    monkeypatch.setattr(settings, "OSKY_FLIGHTS_CONCURRENCY", 2)
+    api = use_api(monkeypatch, service, FakeFlightsApi([], delay=0.01))
+
+    await service.get_flights(DAY + 1000, DAY + 4 * FLIGHTS_MAX_INTERVAL + 1000)
+
+    assert sorted(api.calls) == [
+        (DAY + i * FLIGHTS_MAX_INTERVAL, DAY + (i + 1) * FLIGHTS_MAX_INTERVAL) for i in range(4)
+    ] + [(DAY + 4 * FLIGHTS_MAX_INTERVAL, DAY + 4 * FLIGHTS_MAX_INTERVAL + 1000)]
+    assert api.max_in_flight == 2
+
+
+async def test_flights_across_chunk_borders_are_returned_once(monkeypatch, service):
+    use_api(monkeypatch, service, FakeFlightsApi([
+        flight("aaaaaa", DAY + 7000, DAY + 7400),
+        flight("bbbbbb", DAY + 100, DAY + 500),
+        flight("cccccc", DAY + 1500, DAY + 9000),
+    ]))
+
+    flights = await service.get_flights(DAY + 1000, DAY + 2 * FLIGHTS_MAX_INTERVAL)
+
+    # bbbbbb landed before the range: only its aligned chunk saw it
+    assert sorted(f["icao24"] for f in flights) == ["aaaaaa", "cccccc"]
+
+
+async def test_settled_chunks_are_cached_on_disk(monkeypatch, service, tmp_path):
+    api = use_api(monkeypatch, service, FakeFlightsApi([flight("aaaaaa", DAY + 100, DAY + 500)]))
+    api.missing.add(DAY + FLIGHTS_MAX_INTERVAL)
+
+    first = await service.get_flights(DAY, DAY + 3 * FLIGHTS_MAX_INTERVAL)
+    calls = len(api.calls)
+    second = await service.get_flights(DAY, DAY + 3 * FLIGHTS_MAX_INTERVAL)
+
+    assert first == second == [flight("aaaaaa", DAY + 100, DAY + 500)]
+    # The empty chunks and the 404 may not be final: they are asked again
+    assert calls == 3 and len(api.calls) == 5
+    assert [p.name for p in tmp_path.iterdir()] == [f"flights_{DAY}_{DAY + FLIGHTS_MAX_INTERVAL}.json"]
+    assert (service.flights_cache_hits, service.flights_cache_misses) == (1, 5)
+
+
+async def test_recent_chunks_are_not_cached(monkeypatch, service, tmp_path):
+    now = int(time.time())
+    api = use_api(monkeypatch, service, FakeFlightsApi([flight("aaaaaa", now - 600, now - 60)]))
+
+    assert len(await service.get_current_flights(hours_back=1)) == 1
+    assert len(await service.get_current_flights(hours_back=1)) == 1
+
+    assert len(api.calls) >= 2
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_cache_keeps_the_newest_chunks(monkeypatch, service, tmp_path):
+    monkeypatch.setattr(settings, "OSKY_FLIGHTS_CACHE_MAX_FILES", 2)
+    use_api(monkeypatch, service, FakeFlightsApi(
+        [flight(f"{i:06x}", DAY + i * FLIGHTS_MAX_INTERVAL, DAY + i * FLIGHTS_MAX_INTERVAL + 60) for i in range(4)]
+    ))
+    monkeypatch.setattr(settings, "OSKY_FLIGHTS_CONCURRENCY", 1)
+
+    await service.get_flights(DAY, DAY + 4 * FLIGHTS_MAX_INTERVAL)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        f"flights_{DAY + i * FLIGHTS_MAX_INTERVAL}_{DAY + (i + 1) * FLIGHTS_MAX_INTERVAL}.json"
+        for i in (2, 3)
+    ]
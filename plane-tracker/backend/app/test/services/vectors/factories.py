@@ -0,0 +1,72 @@
+import asyncio
+from typing import Optional
+
+from app.services.clients.upstream_scheduler import UpstreamScheduler
+from app.services.vectors.snapshot import StateVectorSnapshot
+from app.utils.exceptions import UpstreamUnavailableException
+
+
+def make_state(
+    icao24: str,
+    longitude: Optional[float],
+    latitude: Optional[float],
+    time_position: Optional[int] = 1000,
+    callsign: str = "TEST1",
+    on_ground: bool = False,
+    altitude: Optional[float] = 10000.0,
+    true_track: Optional[float] = 90.0,
+) -> list:
+    """An OpenSky state vector (extended=1 layout)."""
+    return [
+        icao24,
+        callsign,
+        "Spain",
+        time_position,
+        time_position,
+        longitude,
+        latitude,
+        altitude,
+        on_ground,
+        230.0,
+        true_track,
+        0.0,
+        None,
+        altitude,
+        "1000",
+        False,
+        0,
+        3,
+    ]
+
+
+def make_snapshot(time: int, *states: list) -> StateVectorSnapshot:
+    return StateVectorSnapshot.from_osky({"time": time, "states": list(states)})
+
+
+class FakeOsky:
+    """states/all over a fixed fleet, counting the bboxes asked for."""
+
+    def __init__(self, *states, delay: float = 0.0):
+        self.states = list(states)
+        self.delay = delay
+        self.calls = []
+        self.down = False
+        self.scheduler = UpstreamScheduler()
+
+    async def get_all_state_vectors(self):
+        return await self.get_state_vectors_area((-180.0, -90.0, 180.0, 90.0))
+
+    async def get_state_vectors_area(self, bbox):
+        self.calls.append(bbox)
+        await asyncio.sleep(self.delay)
+        if self.down:
+            raise UpstreamUnavailableException(retry_after=30)
+        lomin, lamin, lomax, lamax = bbox
+        return {
+            "time": 1000,
+            "states": [
+                state
+                for state in self.states
+                if lomin <= state[5] <= lomax and lamin <= state[6] <= lamax
+            ],
+        }
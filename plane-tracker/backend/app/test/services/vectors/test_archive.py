@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from app.services.vectors.archive import SnapshotArchive, SnapshotArchiveReader
+from test.services.vectors.factories import make_snapshot, make_state
+
+# 2024-05-01T00:00:00Z
+MAY_1 = 1714521600
+HOUR = 3600
+DAY = 24 * HOUR
+
+MAD = {"icao": "LEMD", "iata": "MAD", "name": "Madrid-Barajas", "location": [-3.56, 40.47]}
+
+
+def snapshot_at(time, *icao24s):
+    snapshot = make_snapshot(
+        time, *[make_state(icao24, -3.7, 40.4, time_position=time) for icao24 in icao24s]
+    )
+    snapshot.columns.departure = np.array([MAD] * len(snapshot.columns), dtype=object)
+    return snapshot
+
+
+def archive_files(directory):
+    return sorted(
+        str(path.relative_to(directory)) for path in directory.rglob("*.arrow*") if path.is_file()
+    )
+
+
+@pytest.mark.parametrize("compression", [None, "lz4", "zstd"])
+def test_replay_returns_the_snapshots_appended(tmp_path, compression):
+    archive = SnapshotArchive(str(tmp_path), compression=compression)
+    snapshots = [
+        snapshot_at(MAY_1 + 13 * HOUR, "aaaaaa", "bbbbbb"),
+        snapshot_at(MAY_1 + 13 * HOUR + 120, "aaaaaa"),
+        snapshot_at(MAY_1 + 14 * HOUR + 60, "cccccc"),
+    ]
+    for snapshot in snapshots:
+        assert archive.append(snapshot)
+    archive.close()
+
+    replayed = list(SnapshotArchiveReader(str(tmp_path)).replay(MAY_1, MAY_1 + DAY))
+
+    assert archive_files(tmp_path) == [
+        "2024-05-01/13.arrow", "2024-05-01/13.arrow.idx",
+        "2024-05-01/14.arrow", "2024-05-01/14.arrow.idx",
+    ]
+    assert [snapshot.time for snapshot in replayed] == [s.time for s in snapshots]
+    assert [snapshot.fetched_at for snapshot in replayed] == [s.fetched_at for s in snapshots]
+    assert replayed[0].columns.icao24.tolist() == ["aaaaaa", "bbbbbb"]
+    assert replayed[0].columns.to_records() == [
+        {**record, "departure": {"icao": "LEMD"}} for record in snapshots[0].columns.to_records()
+    ]
+
+
+def test_reads_only_the_snapshots_in_range(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    for minute in range(0, 60, 10):
+        archive.append(snapshot_at(MAY_1 + 13 * HOUR + minute * 60, "aaaaaa"))
+    archive.close()
+    reader = SnapshotArchiveReader(str(tmp_path))
+
+    start, end = MAY_1 + 13 * HOUR + 600, MAY_1 + 13 * HOUR + 1800
+    table = reader.read_table(start, end, columns=["snapshot_time", "icao24"])
+
+    assert table.column_names == ["snapshot_time", "icao24"]
+    assert table.column("snapshot_time").to_pylist() == [start, start + 600]
+    assert [s.time for s in reader.replay(MAY_1 + 14 * HOUR, MAY_1 + DAY)] == []
+
+
+def test_one_writer_per_directory_and_a_new_part_on_takeover(tmp_path):
+    first = SnapshotArchive(str(tmp_path))
+    second = SnapshotArchive(str(tmp_path))
+
+    assert first.append(snapshot_at(MAY_1 + 13 * HOUR, "aaaaaa"))
+    # Another worker skips its snapshots while the first one writes
+    assert not second.append(snapshot_at(MAY_1 + 13 * HOUR + 60, "bbbbbb"))
+    assert first.is_writer and not second.is_writer
+
+    first.close()
+    assert second.append(snapshot_at(MAY_1 + 13 * HOUR + 120, "cccccc"))
+    second.close()
+
+    assert "2024-05-01/13.1.arrow" in archive_files(tmp_path)
+    replayed = SnapshotArchiveReader(str(tmp_path)).replay(MAY_1, MAY_1 + DAY)
+    assert [s.columns.icao24.tolist() for s in replayed] == [["aaaaaa"], ["cccccc"]]
+
+
+def test_retention_deletes_the_old_days_when_an_hour_starts(tmp_path):
+    (tmp_path / "notes").mkdir()
+    archive = SnapshotArchive(str(tmp_path), retention_days=2)
+    for day in range(3):
+        archive.append(snapshot_at(MAY_1 + day * DAY + 13 * HOUR, "aaaaaa"))
+    archive.close()
+    folders = sorted(path.name for path in tmp_path.iterdir() if path.is_dir())
+
+    # The current day and the one before; other folders are left alone
+    assert folders == ["2024-05-02", "2024-05-03", "notes"]
+    replayed = SnapshotArchiveReader(str(tmp_path)).replay(MAY_1, MAY_1 + 3 * DAY)
+    assert [s.time for s in replayed] == [MAY_1 + DAY + 13 * HOUR, MAY_1 + 2 * DAY + 13 * HOUR]
@@ -0,0 +1,81 @@
+import numpy as np
+
+from app.schemas.vector_schema import VectorsResponse
+from app.services.vectors.columns import MISSING_INT, StateVectorColumns
+from test.services.vectors.factories import make_state
+
+
+def test_states_without_category_are_kept():
+    # OpenSky only sends the 18th field (category) with extended=1
+    extended = make_state("aaaaaa", -3.7, 40.4)
+    plain = make_state("bbbbbb", 2.1, 41.3)[:17]
+    short = make_state("cccccc", 0.0, 0.0)[:16]
+
+    columns = StateVectorColumns.from_states([extended, plain, short])
+
+    assert columns.icao24.tolist() == ["aaaaaa", "bbbbbb"]
+    assert columns.category.tolist() == [3, 0]
+
+
+def test_missing_values_round_trip_to_none():
+    state = make_state("aaaaaa", None, None, time_position=None, altitude=None, true_track=None)
+    state[1] = None
+
+    columns = StateVectorColumns.from_states([state])
+
+    assert np.isnan(columns.longitude[0]) and columns.time_position[0] == MISSING_INT
+    record = columns.to_records()[0]
+    assert record["callsign"] is None
+    assert record["time_position"] is None
+    assert record["longitude"] is None and record["baro_altitude"] is None
+    assert record["true_track"] is None
+
+
+def test_to_records_matches_the_pydantic_models():
+    states = [
+        make_state("aaaaaa", -3.7, 40.4),
+        make_state("bbbbbb", None, None, time_position=None, on_ground=True),
+        make_state("cccccc", 2.1, 41.3, altitude=None),
+    ]
+    columns = StateVectorColumns.from_states(states)
+    expected = VectorsResponse(
+        vectors=[
+            {
+                "icao24": s[0], "callsign": s[1], "origin_country": s[2], "time_position": s[3],
+                "longitude": s[5], "latitude": s[6], "baro_altitude": s[7], "on_ground": s[8],
+                "velocity": s[9], "true_track": s[10], "category": s[17],
+            }
+            for s in states
+        ]
+    ).model_dump()
+
+    assert columns.to_vectors() == expected
+    assert columns.to_records(np.array([2, 0])) == [expected["vectors"][2], expected["vectors"][0]]
+    assert columns.to_records(names=("icao24", "on_ground")) == [
+        {"icao24": "aaaaaa", "on_ground": False},
+        {"icao24": "bbbbbb", "on_ground": True},
+        {"icao24": "cccccc", "on_ground": False},
+    ]
+
+
+def test_deduplicate_keeps_the_last_row_of_every_aircraft():
+    columns = StateVectorColumns.from_states(
+        [
+            make_state("aaaaaa", 1.0, 1.0),
+            make_state("bbbbbb", 2.0, 2.0),
+            make_state("aaaaaa", 3.0, 3.0),
+        ]
+    )
+
+    deduplicated = columns.deduplicate()
+
+    assert deduplicated.icao24.tolist() == ["bbbbbb", "aaaaaa"]
+    assert deduplicated.longitude.tolist() == [2.0, 3.0]
+
+
+def test_empty_states():
+    columns = StateVectorColumns.from_states([])
+
+    assert len(columns) == 0
+    assert columns.to_vectors() == {"vectors": []}
+    assert len(StateVectorColumns.concat([columns, columns])) == 0
@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.vectors import enrichment as enrichment_module
+from app.services.vectors.enrichment import FlightEnrichment, build_route_index
+from test.services.vectors.factories import make_snapshot, make_state
+
+pytestmark = pytest.mark.anyio
+
+AIRPORTS = {
+    "LEMD": {"icao": "LEMD", "iata": "MAD", "name": "Madrid", "location": [-3.56, 40.47]},
+    "EGLL": {"icao": "EGLL", "iata": "LHR", "name": "Heathrow", "location": [-0.46, 51.47]},
+}
+
+
+class FakeAirportCache:
+    """AirportCache before and after it loads (index is None until then)."""
+
+    def __init__(self):
+        self.index = None
+
+    @property
+    def loaded(self):
+        return self.index is not None
+
+    def get_by_icao(self, icao):
+        return self.index.get(icao)
+
+
+class FakeOsky:
+    """flights/all history, counting the ranges asked for."""
+
+    def __init__(self, *flights):
+        self.flights = list(flights)
+        self.calls = []
+
+    async def get_flights(self, begin, end):
+        self.calls.append((begin, end))
+        return self.flights
+
+
+def flight(callsign, departure, arrival, first_seen=100, icao24="aaaaaa"):
+    return {
+        "icao24": icao24,
+        "callsign": callsign,
+        "firstSeen": first_seen,
+        "estDepartureAirport": departure,
+        "estArrivalAirport": arrival,
+    }
+
+
+def test_route_index_keeps_the_latest_flight_of_every_callsign():
+    routes = build_route_index(
+        [
+            flight("IBE3166 ", "LEMD", "EGLL", first_seen=200),
+            flight("IBE3166", "EGLL", "LEMD", first_seen=100),
+            flight("BAW461  ", "EGLL", "LEMD"),
+            flight(None, "LEMD", "EGLL"),
+            flight("   ", "LEMD", "EGLL"),
+        ]
+    )
+
+    assert routes == {"IBE3166": ("LEMD", "EGLL"), "BAW461": ("EGLL", "LEMD")}
+
+
+async def test_refresh_reads_the_flights_of_a_day_earlier(monkeypatch):
+    # flights/all is filled overnight: the last hours are nearly always empty
+    monkeypatch.setattr(enrichment_module, "time", SimpleNamespace(time=lambda: 200000.0))
+    osky = FakeOsky(flight("IBE3166", "LEMD", "EGLL"))
+    enrichment = FlightEnrichment(osky, FakeAirportCache(), hours_back=16.0, delay=86400.0)
+
+    assert await enrichment.refresh() == 1
+    assert osky.calls == [(200000 - 86400 - 16 * 3600, 200000 - 86400)]
+
+
+async def test_process_joins_routes_by_callsign():
+    cache = FakeAirportCache()
+    cache.index = AIRPORTS
+    enrichment = FlightEnrichment(FakeOsky(), cache)
+    enrichment.set_routes({"IBE3166": ("LEMD", "EGLL"), "BAW461": ("EGLL", "XXXX")})
+    snapshot = make_snapshot(
+        1000,
+        # Another aircraft than the day before: the callsign decides
+        make_state("bbbbbb", -3.7, 40.4, callsign="IBE3166 "),
+        make_state("cccccc", -0.5, 51.5, callsign="BAW461"),
+        make_state("dddddd", 2.1, 41.3, callsign="VLG1234"),
+    )
+
+    enrichment.process(snapshot)
+
+    assert snapshot.columns.departure.tolist() == [AIRPORTS["LEMD"], AIRPORTS["EGLL"], None]
+    # Codes the cache doesn't know keep the code alone
+    assert snapshot.columns.arrival.tolist() == [
+        AIRPORTS["EGLL"],
+        {"icao": "XXXX", "iata": None, "name": None, "location": None},
+        None,
+    ]
+
+
+async def test_routes_are_resolved_again_once_the_airport_cache_loads():
+    cache = FakeAirportCache()
+    enrichment = FlightEnrichment(FakeOsky(), cache)
+    enrichment.set_routes({"IBE3166": ("LEMD", "EGLL")})
+    snapshot = make_snapshot(1000, make_state("aaaaaa", -3.7, 40.4, callsign="IBE3166"))
+
+    enrichment.process(snapshot)
+    assert snapshot.columns.departure[0]["name"] is None
+
+    cache.index = AIRPORTS
+    enrichment.process(snapshot)
+    assert snapshot.columns.departure[0] == AIRPORTS["LEMD"]
+
+    # And again on every reload
+    cache.index = {**AIRPORTS, "LEMD": {**AIRPORTS["LEMD"], "name": "Adolfo Suárez Madrid-Barajas"}}
+    enrichment.process(snapshot)
+    assert snapshot.columns.departure[0]["name"] == "Adolfo Suárez Madrid-Barajas"
+
+
+async def test_refreshes_only_while_active():
+    osky = FakeOsky(flight("IBE3166", "LEMD", "EGLL"))
+    active = False
+    enrichment = FlightEnrichment(
+        osky, FakeAirportCache(), interval=60.0, is_active=lambda: active, idle_interval=0.01
+    )
+
+    await enrichment.start()
+    try:
+        await asyncio.sleep(0.05)
+        assert osky.calls == []
+        active = True
+        await asyncio.sleep(0.05)
+    finally:
+        await enrichment.stop()
+
+    assert len(osky.calls) == 1 and len(enrichment) == 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from app.services.vectors.columns import bbox_mask, split_bbox
+from app.services.vectors.grid_index import GridIndex
+
+
+@pytest.fixture
+def positions():
+    rng = np.random.default_rng(3)
+    longitude = rng.uniform(-180, 180, 5000)
+    latitude = rng.uniform(-90, 90, 5000)
+    # Missing positions, the edges of the map and cell borders
+    longitude[:10] = np.nan
+    latitude[10:20] = np.nan
+    longitude[20:24] = [-180.0, 180.0, 179.99, -179.99]
+    latitude[20:24] = [0.0, 0.0, 90.0, -90.0]
+    longitude[24:28] = [10.0, 11.0, 10.5, 10.0]
+    latitude[24:28] = [45.0, 45.0, 46.0, 44.0]
+    return longitude, latitude
+
+
+BBOXES = [
+    (-10.0, 35.0, 5.0, 44.0),
+    (10.0, 44.0, 11.0, 46.0),
+    (10.2, 45.1, 10.7, 45.9),
+    (-180.0, -90.0, 180.0, 90.0),
+    (170.0, -50.0, -170.0, 10.0),
+    (179.5, -90.0, -179.5, 90.0),
+    (0.0, 10.0, 0.0, 10.0),
+    (5.0, 20.0, 6.0, 10.0),
+]
+
+
+@pytest.mark.parametrize("cell_deg", [0.5, 1.0, 7.0])
+@pytest.mark.parametrize("bbox", BBOXES)
+def test_query_matches_the_mask(positions, cell_deg, bbox):
+    longitude, latitude = positions
+    index = GridIndex(longitude, latitude, cell_deg=cell_deg)
+    expected = np.flatnonzero(bbox_mask(longitude, latitude, bbox))
+    np.testing.assert_array_equal(index.query(bbox), expected)
+
+
+def test_candidates_cover_the_result(positions):
+    index = GridIndex(*positions, cell_deg=2.0)
+    for bbox in BBOXES:
+        assert set(index.query(bbox).tolist()) <= set(index.candidates(bbox).tolist())
+
+
+def test_missing_positions_are_never_returned(positions):
+    index = GridIndex(*positions)
+    assert not set(range(20)) & set(index.query((-180.0, -90.0, 180.0, 90.0)).tolist())
+
+
+def test_antimeridian_box_returns_both_sides():
+    longitude = np.array([179.5, -179.5, 0.0, 178.0, -178.0])
+    latitude = np.zeros(5)
+    index = GridIndex(longitude, latitude)
+    assert index.query((179.0, -1.0, -179.0, 1.0)).tolist() == [0, 1]
+    assert index.query((177.0, -1.0, -177.0, 1.0)).tolist() == [0, 1, 3, 4]
+
+
+def test_split_bbox():
+    assert split_bbox((-10.0, 0.0, 10.0, 5.0)) == [(-10.0, 0.0, 10.0, 5.0)]
+    assert split_bbox((170.0, -5.0, -170.0, 5.0)) == [
+        (170.0, -5.0, 180.0, 5.0),
+        (-180.0, -5.0, -170.0, 5.0),
+    ]
+
+
+def test_bbox_mask_crossing_the_antimeridian():
+    longitude = np.array([175.0, -175.0, 0.0, np.nan])
+    latitude = np.array([0.0, 0.0, 0.0, 0.0])
+    assert bbox_mask(longitude, latitude, (170.0, -1.0, -170.0, 1.0)).tolist() == [
+        True,
+        True,
+        False,
+        False,
+    ]
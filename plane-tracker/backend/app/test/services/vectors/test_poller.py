@@ -0,0 +1,122 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.clients.upstream_scheduler import UpstreamScheduler
+from app.services.vectors import shared
+from app.services.vectors.poller import StateVectorPoller
+from test.services.vectors.factories import FakeOsky, make_snapshot, make_state
+
+pytestmark = pytest.mark.anyio
+
+MAD = {"icao": "LEMD", "iata": "MAD", "name": "Madrid-Barajas", "location": [-3.56, 40.47]}
+
+
+def make_poller(osky, shared_dir, interval=0.05):
+    return StateVectorPoller(osky, interval=interval, shared_dir=str(shared_dir), follow_interval=0.01)
+
+
+async def wait_for(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+def add_route(snapshot):
+    snapshot.columns.departure = np.array([MAD] * len(snapshot.columns), dtype=object)
+
+
+def test_shared_snapshot_round_trip(tmp_path):
+    snapshot = make_snapshot(
+        1000, make_state("aaaaaa", -3.7, 40.4), make_state("bbbbbb", 2.1, 41.3, altitude=None)
+    )
+    add_route(snapshot)
+    path = tmp_path / shared.SNAPSHOT_FILE
+
+    shared.write_snapshot(path, snapshot)
+    loaded = shared.read_snapshot(path)
+
+    assert loaded.time == 1000
+    assert loaded.fetched_at == snapshot.fetched_at
+    assert loaded.columns.icao24.tolist() == ["aaaaaa", "bbbbbb"]
+    assert np.isnan(loaded.columns.baro_altitude[1])
+    # The whole airport record, not only the code the archive keeps
+    assert loaded.columns.departure.tolist() == [MAD, MAD]
+    assert loaded.columns.arrival.tolist() == [None, None]
+    assert loaded.in_bbox((-5.0, 38.0, 0.0, 42.0)).icao24.tolist() == ["aaaaaa"]
+    assert [p.name for p in tmp_path.iterdir()] == [shared.SNAPSHOT_FILE]
+
+
+async def test_one_worker_polls_and_the_others_follow(tmp_path):
+    leader_osky = FakeOsky(make_state("aaaaaa", -3.7, 40.4))
+    follower_osky = FakeOsky(make_state("aaaaaa", -3.7, 40.4))
+    leader = make_poller(leader_osky, tmp_path)
+    follower = make_poller(follower_osky, tmp_path)
+    # Processors run only where the snapshot is polled
+    leader.add_processor(add_route)
+    follower.add_processor(add_route)
+    seen = []
+    follower.add_listener(lambda previous, snapshot: seen.append(snapshot))
+
+    await leader.start()
+    await wait_for(lambda: leader.snapshot is not None)
+    await follower.start()
+    try:
+        await wait_for(lambda: len(seen) >= 2)
+        assert leader.is_leader and not follower.is_leader
+    finally:
+        await follower.stop()
+        await leader.stop()
+
+    assert leader_osky.calls and not follower_osky.calls
+    # One listener call per published snapshot, none for unchanged files
+    assert len({snapshot.fetched_at for snapshot in seen}) == len(seen)
+    assert seen[-1].columns.icao24.tolist() == ["aaaaaa"]
+    assert seen[-1].columns.departure.tolist() == [MAD]
+
+
+async def test_a_follower_takes_over_when_the_leader_stops(tmp_path):
+    leader = make_poller(FakeOsky(make_state("aaaaaa", -3.7, 40.4)), tmp_path)
+    follower_osky = FakeOsky(make_state("aaaaaa", -3.7, 40.4))
+    follower = make_poller(follower_osky, tmp_path)
+
+    await leader.start()
+    await wait_for(lambda: leader.snapshot is not None)
+    await follower.start()
+    try:
+        await leader.stop()
+        await wait_for(lambda: follower_osky.calls)
+        assert follower.is_leader
+    finally:
+        await follower.stop()
+    assert not follower.is_leader
+
+
+async def test_the_polling_worker_gets_the_poll_credits(tmp_path):
+    osky = FakeOsky()
+    osky.scheduler = UpstreamScheduler(credits_per_day=400.0)
+    poller = make_poller(osky, tmp_path, interval=120.0)
+
+    await poller.start()
+    await wait_for(lambda: poller.is_leader)
+    # 4 credits every 120s
+    assert osky.scheduler.credits_per_day == pytest.approx(400.0 + 2880.0)
+    await poller.stop()
+    assert osky.scheduler.credits_per_day == pytest.approx(400.0)
+
+
+async def test_a_failed_poll_keeps_the_shared_snapshot(tmp_path):
+    osky = FakeOsky(make_state("aaaaaa", -3.7, 40.4))
+    poller = make_poller(osky, tmp_path)
+    first = await poller.poll_once()
+    osky.down = True
+
+    await poller.start()
+    await wait_for(lambda: len(osky.calls) >= 3)
+    await poller.stop()
+
+    assert poller.snapshot is first
+    assert shared.read_snapshot(tmp_path / shared.SNAPSHOT_FILE).fetched_at == first.fetched_at
@@ -0,0 +1,197 @@
+from typing import Optional
+
+import orjson
+import pytest
+
+from app.services.vectors.snapshot import StateVectorSnapshot
+from app.services.vectors.stream import MOVED_FIELDS, VectorStreamHub
+from test.services.vectors.factories import make_snapshot, make_state
+
+MADRID = (-5.0, 38.0, 0.0, 42.0)
+
+
+class FakePoller:
+    """Hands snapshots to the hub the way StateVectorPoller does."""
+
+    def __init__(self):
+        self.snapshot: Optional[StateVectorSnapshot] = None
+        self.listeners = []
+
+    def add_listener(self, listener) -> None:
+        self.listeners.append(listener)
+
+    def poll(self, snapshot: StateVectorSnapshot) -> None:
+        previous, self.snapshot = self.snapshot, snapshot
+        for listener in self.listeners:
+            listener(previous, snapshot)
+
+
+@pytest.fixture
+def poller():
+    return FakePoller()
+
+
+def messages(subscriber) -> list:
+    received = []
+    while not subscriber.queue.empty():
+        received.append(orjson.loads(subscriber.queue.get_nowait()))
+    return received
+
+
+def icao24s(records) -> list:
+    return sorted(record["icao24"] for record in records)
+
+
+def test_first_message_is_a_snapshot_of_the_bbox(poller):
+    poller.poll(make_snapshot(1, make_state("a", -3.7, 40.4), make_state("b", 2.2, 41.4)))
+    hub = VectorStreamHub(poller)
+
+    subscriber = hub.subscribe(MADRID)
+
+    [message] = messages(subscriber)
+    assert message["type"] == "snapshot"
+    assert icao24s(message["vectors"]) == ["a"]
+    assert subscriber.known == {"a"}
+
+
+def test_subscriber_before_the_first_poll_gets_its_snapshot(poller):
+    hub = VectorStreamHub(poller)
+    subscriber = hub.subscribe(MADRID)
+    assert messages(subscriber) == []
+
+    poller.poll(make_snapshot(1, make_state("a", -3.7, 40.4)))
+
+    [message] = messages(subscriber)
+    assert message["type"] == "snapshot"
+    assert icao24s(message["vectors"]) == ["a"]
+
+
+def test_diff_has_added_moved_and_removed(poller):
+    hub = VectorStreamHub(poller)
+    poller.poll(
+        make_snapshot(
+            1,
+            make_state("stays", -3.7, 40.4),
+            make_state("moves", -4.0, 39.0),
+            make_state("lands", -2.0, 41.0),
+            make_state("leaves", -1.0, 40.0),
+        )
+    )
+    subscriber = hub.subscribe(MADRID)
+    messages(subscriber)
+
+    poller.poll(
+        make_snapshot(
+            2,
+            make_state("stays", -3.7, 40.4),
+            make_state("moves", -4.1, 39.1),
+            make_state("leaves", 3.0, 40.0),
+            make_state("new", -3.0, 40.0),
+        )
+    )
+
+    [message] = messages(subscriber)
+    assert message["type"] == "diff"
+    assert message["time"] == 2
+    assert icao24s(message["added"]) == ["new"]
+    assert [tuple(record) for record in message["moved"]] == [MOVED_FIELDS]
+    assert message["moved"][0]["icao24"] == "moves"
+    assert message["moved"][0]["longitude"] == pytest.approx(-4.1)
+    assert sorted(message["removed"]) == ["lands", "leaves"]
+    assert subscriber.known == {"stays", "moves", "new"}
+
+
+def test_nothing_is_sent_without_changes_in_the_bbox(poller):
+    hub = VectorStreamHub(poller)
+    poller.poll(make_snapshot(1, make_state("a", -3.7, 40.4), make_state("b", 20.0, 50.0)))
+    subscriber = hub.subscribe(MADRID)
+    messages(subscriber)
+
+    # Only an aircraft far away moves
+    poller.poll(make_snapshot(2, make_state("a", -3.7, 40.4), make_state("b", 21.0, 50.0)))
+
+    assert messages(subscriber) == []
+
+
+def test_relabelled_aircraft_is_resent_in_full(poller):
+    hub = VectorStreamHub(poller)
+    poller.poll(make_snapshot(1, make_state("a", -3.7, 40.4, callsign="OLD")))
+    subscriber = hub.subscribe(MADRID)
+    messages(subscriber)
+
+    poller.poll(make_snapshot(2, make_state("a", -3.7, 40.4, callsign="NEW")))
+
+    [message] = messages(subscriber)
+    assert message["moved"] == []
+    [record] = message["added"]
+    assert record["callsign"] == "NEW"
+    assert set(MOVED_FIELDS) < set(record)
+
+
+def test_aircraft_crossing_tiles_is_seen_by_both_sides(poller):
+    hub = VectorStreamHub(poller, tile_deg=5.0)
+    poller.poll(make_snapshot(1, make_state("a", -0.5, 40.0)))
+    west = hub.subscribe((-5.0, 38.0, -0.1, 42.0))
+    east = hub.subscribe((0.1, 38.0, 5.0, 42.0))
+    messages(west), messages(east)
+
+    poller.poll(make_snapshot(2, make_state("a", 0.5, 40.0)))
+
+    [left] = messages(west)
+    [entered] = messages(east)
+    assert left["removed"] == ["a"]
+    assert icao24s(entered["added"]) == ["a"]
+
+
+def test_antimeridian_bbox(poller):
+    hub = VectorStreamHub(poller)
+    poller.poll(make_snapshot(1, make_state("a", 179.0, 0.0)))
+    subscriber = hub.subscribe((175.0, -5.0, -175.0, 5.0))
+    assert icao24s(messages(subscriber)[0]["vectors"]) == ["a"]
+
+    poller.poll(make_snapshot(2, make_state("a", -179.0, 0.0)))
+
+    [message] = messages(subscriber)
+    assert message["removed"] == []
+    assert [record["icao24"] for record in message["moved"]] == ["a"]
+
+
+def test_update_moves_the_bbox_and_resyncs(poller):
+    hub = VectorStreamHub(poller)
+    poller.poll(make_snapshot(1, make_state("a", -3.7, 40.4), make_state("b", 2.2, 48.8)))
+    subscriber = hub.subscribe(MADRID)
+    messages(subscriber)
+
+    hub.update(subscriber, (0.0, 46.0, 5.0, 50.0))
+
+    [message] = messages(subscriber)
+    assert message["type"] == "snapshot"
+    assert icao24s(message["vectors"]) == ["b"]
+    assert subscriber.known == {"b"}
+
+
+def test_slow_subscriber_is_resynced(poller):
+    hub = VectorStreamHub(poller, queue_size=2)
+    poller.poll(make_snapshot(1, make_state("a", -3.7, 40.0)))
+    subscriber = hub.subscribe(MADRID)
+
+    # Never read: the third message overflows the queue
+    for step in range(1, 3):
+        poller.poll(make_snapshot(1 + step, make_state("a", -3.7, 40.0 + step / 10)))
+
+    [message] = messages(subscriber)
+    assert message["type"] == "snapshot"
+    assert message["time"] == 3
+    assert message["vectors"][0]["latitude"] == pytest.approx(40.2)
+
+
+def test_unsubscribed_clients_get_nothing(poller):
+    hub = VectorStreamHub(poller)
+    poller.poll(make_snapshot(1, make_state("a", -3.7, 40.4)))
+    subscriber = hub.subscribe(MADRID)
+    messages(subscriber)
+    hub.unsubscribe(subscriber)
+
+    poller.poll(make_snapshot(2, make_state("a", -3.8, 40.4)))
+
+    assert messages(subscriber) == []
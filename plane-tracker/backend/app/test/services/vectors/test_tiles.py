@@ -0,0 +1,145 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.vectors import tiles as tiles_module
+from app.services.vectors.tiles import StateVectorTileCache
+from app.utils.exceptions import UpstreamUnavailableException
+from test.services.vectors.factories import FakeOsky, make_state
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock seen by the tile cache, moved by hand."""
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(tiles_module, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def icao24s(area) -> list:
+    return sorted(area.columns.icao24.tolist())
+
+
+def test_tiles_for_bbox():
+    cache = StateVectorTileCache(None, tile_deg=5.0)
+    assert cache.tiles_for_bbox((-4.0, 40.0, 1.0, 41.0)) == [(35, 26), (36, 26)]
+    # Across the antimeridian: the last column and the first one
+    assert cache.tiles_for_bbox((178.0, 0.0, -178.0, 1.0)) == [(71, 18), (0, 18)]
+    assert cache.tile_bbox((71, 18)) == (175.0, 0.0, 180.0, 5.0)
+    assert cache.tiles_for_bbox((0.0, 50.0, 10.0, 40.0)) == []
+
+
+async def test_swapped_latitudes_return_an_empty_area():
+    osky = FakeOsky()
+    cache = StateVectorTileCache(osky)
+    area = await cache.get_area((0.0, 50.0, 10.0, 40.0))
+    assert len(area.columns) == 0
+    assert cache.get_stale_area((0.0, 50.0, 10.0, 40.0)).columns.icao24.tolist() == []
+    assert osky.calls == []
+
+
+async def test_area_is_merged_from_tiles_and_cut_to_the_bbox(clock):
+    osky = FakeOsky(
+        make_state("inside", -3.7, 40.4),
+        # On the edge between two tiles: returned by both
+        make_state("edge", 0.0, 40.5),
+        make_state("outside", -4.5, 40.5),
+    )
+    cache = StateVectorTileCache(osky)
+
+    area = await cache.get_area((-4.0, 40.0, 1.0, 41.0))
+
+    assert icao24s(area) == ["edge", "inside"]
+    assert sorted(osky.calls) == [(-5.0, 40.0, 0.0, 45.0), (0.0, 40.0, 5.0, 45.0)]
+    assert area.time == 1000
+    assert area.age == 0
+
+
+async def test_tiles_are_cached_for_the_ttl(clock):
+    osky = FakeOsky(make_state("a", -3.7, 40.4))
+    cache = StateVectorTileCache(osky, ttl=10)
+    bbox = (-4.0, 40.0, -3.0, 41.0)
+
+    await cache.get_area(bbox)
+    clock.now += 5
+    area = await cache.get_area(bbox)
+    assert len(osky.calls) == 1
+    assert area.age == 5
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    clock.now += 10
+    await cache.get_area(bbox)
+    assert len(osky.calls) == 2
+
+
+async def test_concurrent_requests_share_one_fetch():
+    osky = FakeOsky(make_state("a", -3.7, 40.4), delay=0.05)
+    cache = StateVectorTileCache(osky)
+
+    areas = await asyncio.gather(
+        *[cache.get_area((-4.0, 40.0, -3.5 + i / 10, 41.0)) for i in range(5)]
+    )
+
+    assert len(osky.calls) == 1
+    assert cache.shared == 4
+    assert all(icao24s(area) == ["a"] for area in areas)
+
+
+async def test_cancelled_request_does_not_cancel_the_shared_fetch():
+    osky = FakeOsky(make_state("a", -3.7, 40.4), delay=0.05)
+    cache = StateVectorTileCache(osky)
+    bbox = (-4.0, 40.0, -3.0, 41.0)
+
+    first = asyncio.create_task(cache.get_area(bbox))
+    second = asyncio.create_task(cache.get_area(bbox))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert icao24s(await second) == ["a"]
+    assert len(osky.calls) == 1
+
+
+async def test_large_bboxes_are_fetched_directly():
+    osky = FakeOsky(make_state("a", 170.0, 10.0), make_state("b", -170.0, 10.0))
+    cache = StateVectorTileCache(osky, max_tiles=8)
+
+    area = await cache.get_area((160.0, 0.0, -160.0, 20.0))
+
+    # One query per side of the antimeridian, nothing cached
+    assert sorted(osky.calls) == [(-180.0, 0.0, -160.0, 20.0), (160.0, 0.0, 180.0, 20.0)]
+    assert icao24s(area) == ["a", "b"]
+    assert len(cache) == 0
+
+
+async def test_stale_area_while_upstream_is_down(clock):
+    osky = FakeOsky(make_state("a", -3.7, 40.4))
+    cache = StateVectorTileCache(osky, ttl=10, stale_ttl=60)
+    bbox = (-4.0, 40.0, -3.0, 41.0)
+    await cache.get_area(bbox)
+
+    clock.now += 30
+    osky.down = True
+    with pytest.raises(UpstreamUnavailableException):
+        await cache.get_area(bbox)
+
+    stale = cache.get_stale_area(bbox)
+    assert icao24s(stale) == ["a"]
+    assert stale.age == 30
+    # Tiles never fetched can't be served
+    assert cache.get_stale_area((0.0, 40.0, 1.0, 41.0)) is None
+
+
+async def test_expired_tiles_are_evicted_after_the_stale_ttl(clock):
+    osky = FakeOsky(make_state("a", -3.7, 40.4), make_state("b", 10.0, 50.0))
+    cache = StateVectorTileCache(osky, ttl=10, stale_ttl=60)
+    await cache.get_area((-4.0, 40.0, -3.0, 41.0))
+
+    clock.now += 71
+    await cache.get_area((10.0, 50.0, 11.0, 51.0))
+
+    assert len(cache) == 1
+    assert cache.evictions == 1
+    assert cache.get_stale_area((-4.0, 40.0, -3.0, 41.0)) is None
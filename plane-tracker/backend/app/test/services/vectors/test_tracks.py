@@ -0,0 +1,222 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.vectors import tracks as tracks_module
+from app.services.vectors.tracks import TrackStore, merge_tracks, trim_track
+from test.services.vectors.factories import make_snapshot, make_state
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock seen by TrackStore, moved by hand."""
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(tracks_module, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def position(icao24: str, t: int, longitude: float = -3.7, latitude: float = 40.4, **kwargs):
+    return make_state(icao24, longitude, latitude, time_position=t, **kwargs)
+
+
+def record(store: TrackStore, *states) -> None:
+    store.record(make_snapshot(0, *states))
+
+
+def test_track_in_opensky_format(clock):
+    store = TrackStore()
+    record(store, position("a", 100, -3.7, 40.4, callsign="IBE1"))
+    record(store, position("a", 110, -3.8, 40.5, altitude=None, on_ground=True))
+
+    track = store.get_held_track("a")
+
+    assert track == {
+        "icao24": "a",
+        "startTime": 100,
+        "endTime": 110,
+        # Callsign of the latest report
+        "callsign": "TEST1",
+        "path": [
+            [100, 40.4, -3.7, 10000.0, 90.0, False],
+            [110, 40.5, -3.8, None, 90.0, True],
+        ],
+    }
+
+
+def test_current_flight_starts_at_the_last_ground_position(clock):
+    store = TrackStore()
+    record(store, position("a", 90, on_ground=True))
+    record(store, position("a", 100, on_ground=True))
+    for t in (110, 120):
+        record(store, position("a", t))
+
+    track = store.get_track("a")
+
+    assert [point[0] for point in track["path"]] == [100, 110, 120]
+    assert (store.hits, store.misses) == (1, 0)
+
+
+def test_flight_not_seen_from_takeoff_is_a_miss(clock):
+    store = TrackStore(points=3)
+    # First seen in the air
+    record(store, position("a", 100))
+    assert store.get_track("a") is None
+    # Still on the ground
+    record(store, position("b", 100, on_ground=True))
+    assert store.get_track("b") is None
+    # The takeoff was overwritten in the ring
+    record(store, position("c", 100, on_ground=True))
+    for t in (110, 120, 130):
+        record(store, position("c", t))
+    assert store.get_track("c") is None
+
+    assert store.misses == 3
+    assert store.get_held_track("c") is not None
+
+
+def test_unknown_aircraft_is_a_miss(clock):
+    store = TrackStore()
+    assert store.get_track("nope") is None
+    assert store.get_held_track("nope") is None
+    assert store.misses == 1
+
+
+def test_unchanged_and_missing_positions_are_skipped(clock):
+    store = TrackStore()
+    record(store, position("a", 100), make_state("b", None, None))
+    # Same report polled again, then an older one
+    record(store, position("a", 100))
+    record(store, position("a", 90))
+    record(store, make_state("a", -3.7, 40.4, time_position=None))
+
+    assert [point[0] for point in store.get_held_track("a")["path"]] == [100]
+    assert store.get_held_track("b") is None
+
+
+def test_ring_keeps_the_latest_points(clock):
+    store = TrackStore(points=4)
+    for t in range(100, 170, 10):
+        record(store, position("a", t))
+
+    track = store.get_held_track("a")
+
+    assert [point[0] for point in track["path"]] == [130, 140, 150, 160]
+    assert track["startTime"] == 130
+
+
+def test_since(clock):
+    store = TrackStore(points=4)
+    for t in (100, 110, 120):
+        record(store, position("a", t))
+
+    assert [point[0] for point in store.get_track("a", since=105)["path"]] == [110, 120]
+    assert store.get_track("a", since=100)["startTime"] == 100
+    # Before the aircraft was first seen: the buffer can't answer
+    assert store.get_track("a", since=50) is None
+    # After the last position
+    assert store.get_track("a", since=130) is None
+
+    for t in (130, 140):
+        record(store, position("a", t))
+    # The ring wrapped: 100 is gone
+    assert store.get_track("a", since=100) is None
+    assert store.get_track("a", since=110)["startTime"] == 110
+
+
+def test_grows_with_the_fleet(clock):
+    store = TrackStore(initial_aircraft=2, max_aircraft=100)
+    record(store, *[position(f"a{i}", 100) for i in range(10)])
+
+    assert len(store) == 10
+    assert 10 <= store.capacity <= 100
+    assert store.evictions == 0
+    assert all(store.get_held_track(f"a{i}") is not None for i in range(10))
+
+
+def test_duplicated_aircraft_takes_one_slot(clock):
+    store = TrackStore(initial_aircraft=4)
+    record(store, position("a", 100), position("a", 100))
+    assert len(store) == 1
+
+
+def test_cap_evicts_aircraft_no_longer_reported(clock):
+    store = TrackStore(initial_aircraft=2, max_aircraft=3)
+    record(store, position("a", 100), position("b", 100))
+    clock.now += 10
+    record(store, position("c", 110))
+    clock.now += 10
+    record(store, position("c", 120), position("d", 120), position("e", 120))
+
+    assert store.capacity == 3
+    assert store.evictions == 2
+    assert store.get_held_track("a") is None and store.get_held_track("b") is None
+    assert store.get_held_track("c") is not None
+
+
+def test_reported_aircraft_are_not_evicted_for_new_ones(clock):
+    store = TrackStore(initial_aircraft=2, max_aircraft=2)
+    record(store, position("a", 100), position("b", 100))
+    clock.now += 10
+    record(store, position("a", 110), position("b", 110), position("c", 110))
+
+    assert store.evictions == 0
+    assert store.get_held_track("c") is None
+    assert len(store.get_held_track("a")["path"]) == 2
+
+
+def test_stale_aircraft_are_dropped(clock):
+    store = TrackStore(stale_after=60)
+    record(store, position("a", 100), position("b", 100))
+    clock.now += 50
+    record(store, position("b", 150))
+    clock.now += 30
+    record(store, position("b", 180))
+
+    assert store.get_held_track("a") is None
+    assert store.get_held_track("b") is not None
+    assert store.evictions == 1
+
+    # A freed slot starts a new track
+    record(store, position("a", 200))
+    assert store.get_held_track("a")["startTime"] == 200
+
+
+def test_trim_track():
+    track = {
+        "icao24": "a",
+        "startTime": 100,
+        "endTime": 120,
+        "callsign": "IBE1",
+        "path": [[100, 0, 0, 0, 0, False], [110, 0, 0, 0, 0, False], [120, 0, 0, 0, 0, False]],
+    }
+
+    assert trim_track(track, None) is track
+    trimmed = trim_track(track, 105)
+    assert trimmed["startTime"] == 110
+    assert [point[0] for point in trimmed["path"]] == [110, 120]
+    empty = trim_track(track, 130)
+    assert empty["path"] == [] and empty["startTime"] == 120
+
+
+def test_merge_tracks_appends_newer_local_positions():
+    upstream = {
+        "icao24": "a",
+        "startTime": 100,
+        "endTime": 110,
+        "callsign": "IBE1",
+        "path": [[100, 0, 0, 0, 0, True], [110, 0, 0, 0, 0, False]],
+    }
+    local = {
+        "icao24": "a",
+        "startTime": 105,
+        "endTime": 130,
+        "callsign": "IBE1",
+        "path": [[105, 0, 0, 0, 0, False], [110, 0, 0, 0, 0, False], [130, 1, 1, 1, 1, False]],
+    }
+
+    merged = merge_tracks(upstream, local)
+
+    assert [point[0] for point in merged["path"]] == [100, 110, 130]
+    assert (merged["startTime"], merged["endTime"]) == (100, 130)
+    assert merge_tracks(upstream, None) is upstream
+    assert merge_tracks(local, upstream) is local
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from app.utils.kdtree import KDTree, chord_to_km, km_to_chord, to_unit_vectors
+
+
+@pytest.fixture
+def positions():
+    rng = np.random.default_rng(7)
+    longitude = rng.uniform(-180, 180, 2000)
+    # Uniform on the sphere, so the poles are covered as densely as the rest
+    latitude = np.degrees(np.arcsin(rng.uniform(-1, 1, 2000)))
+    return longitude, latitude
+
+
+def brute_force(points: np.ndarray, point: np.ndarray) -> np.ndarray:
+    return np.sqrt(((points - point) ** 2).sum(axis=1))
+
+
+@pytest.mark.parametrize("leaf_size", [1, 4, 16, 5000])
+def test_query_matches_brute_force(positions, leaf_size):
+    points = to_unit_vectors(*positions)
+    tree = KDTree(points, leaf_size=leaf_size)
+    rng = np.random.default_rng(11)
+    for point in to_unit_vectors(rng.uniform(-180, 180, 50), rng.uniform(-90, 90, 50)):
+        distances, indexes = tree.query(point, k=5)
+        expected = np.sort(brute_force(points, point))[:5]
+        np.testing.assert_allclose(distances, expected)
+        np.testing.assert_allclose(brute_force(points[indexes], point), distances)
+
+
+def test_query_radius_matches_brute_force(positions):
+    points = to_unit_vectors(*positions)
+    tree = KDTree(points)
+    radius = km_to_chord(800)
+    for point in points[:50]:
+        distances, indexes = tree.query_radius(point, radius)
+        all_distances = brute_force(points, point)
+        assert set(indexes.tolist()) == set(np.flatnonzero(all_distances <= radius).tolist())
+        assert np.all(np.diff(distances) >= 0)
+
+
+def test_nearest_across_the_antimeridian():
+    # Just east of 180° the nearest point lies on the other side of it
+    longitude = np.array([178.6, 166.4, -179.9, 0.0])
+    latitude = np.array([-17.8, -22.3, -16.5, 0.0])
+    tree = KDTree(to_unit_vectors(longitude, latitude))
+
+    distances, indexes = tree.query(to_unit_vectors([179.9], [-17.0])[0], k=2)
+
+    assert indexes.tolist() == [2, 0]
+    assert chord_to_km(distances[0]) < 100
+
+
+def test_nearest_near_the_pole():
+    # At 89.9° latitude, 180° of longitude apart is about 22 km
+    tree = KDTree(to_unit_vectors(np.array([0.0, 180.0, 0.0]), np.array([89.9, 89.9, 85.0])))
+    distances, indexes = tree.query(to_unit_vectors([180.0], [89.8])[0], k=3)
+    assert indexes.tolist() == [1, 0, 2]
+    assert chord_to_km(distances[1]) == pytest.approx(33.4, abs=0.5)
+
+
+def test_km_chord_round_trip():
+    for km in (0.0, 1.0, 500.0, 10000.0, 20000.0):
+        assert chord_to_km(np.array(km_to_chord(km))) == pytest.approx(km, abs=1e-6)
+    # Beyond half the circumference nothing is farther than the antipode
+    assert km_to_chord(50000.0) == pytest.approx(2.0)
+
+
+def test_empty_tree_and_k_larger_than_the_points():
+    empty = KDTree(np.empty((0, 3)))
+    assert len(empty.query(np.zeros(3), k=3)[1]) == 0
+    assert len(empty.query_radius(np.zeros(3), 1.0)[1]) == 0
+
+    tree = KDTree(np.eye(3))
+    distances, indexes = tree.query(np.array([1.0, 0.0, 0.0]), k=10)
+    assert indexes.tolist()[0] == 0
+    assert sorted(indexes.tolist()) == [0, 1, 2]
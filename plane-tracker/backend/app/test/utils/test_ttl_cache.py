@@ -0,0 +1,123 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import ttl_cache
+from app.utils.ttl_cache import AsyncTTLCache
+
+pytestmark = pytest.mark.anyio
+
+
+class Loader:
+    """Returns "<key>:<call number>", optionally waiting or failing."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = None
+        self.fail = False
+
+    async def __call__(self, key):
+        self.calls.append(key)
+        if self.release is not None:
+            await self.release.wait()
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return f"{key}:{len(self.calls)}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(ttl_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def loader():
+    return Loader()
+
+
+async def test_fresh_entries_are_served_from_the_cache(clock, loader):
+    cache = AsyncTTLCache(loader, ttl=10)
+
+    assert await cache.get("mad") == "mad:1"
+    clock.now += 10
+    assert await cache.get("mad") == "mad:1"
+
+    assert loader.calls == ["mad"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+async def test_stale_entries_are_served_while_they_reload(clock, loader):
+    cache = AsyncTTLCache(loader, ttl=10, stale_ttl=60)
+    await cache.get("mad")
+    clock.now += 30
+
+    assert await cache.get("mad") == "mad:1"
+    await asyncio.sleep(0)
+    assert await cache.get("mad") == "mad:2"
+    assert cache.stale_hits == 1 and cache.hits == 1
+
+
+async def test_expired_entries_are_loaded_before_returning(clock, loader):
+    cache = AsyncTTLCache(loader, ttl=10, stale_ttl=60)
+    await cache.get("mad")
+    clock.now += 71
+
+    assert await cache.get("mad") == "mad:2"
+    assert cache.misses == 2
+
+
+async def test_concurrent_misses_share_one_load(clock, loader):
+    cache = AsyncTTLCache(loader, ttl=10)
+    loader.release = asyncio.Event()
+
+    waiting = [asyncio.create_task(cache.get("mad")) for _ in range(5)]
+    await asyncio.sleep(0)
+    # A caller giving up doesn't cancel the load of the others
+    waiting[0].cancel()
+    loader.release.set()
+    results = await asyncio.gather(*waiting[1:])
+
+    assert results == ["mad:1"] * 4
+    assert loader.calls == ["mad"]
+
+
+async def test_failed_background_reload_keeps_the_stale_value(clock, loader):
+    cache = AsyncTTLCache(loader, ttl=10, stale_ttl=60)
+    await cache.get("mad")
+    clock.now += 30
+    loader.fail = True
+
+    assert await cache.get("mad") == "mad:1"
+    await asyncio.sleep(0)
+    assert await cache.get("mad") == "mad:1"
+
+    # Once expired the error reaches the caller
+    clock.now += 60
+    with pytest.raises(RuntimeError):
+        await cache.get("mad")
+
+
+async def test_least_recently_used_entries_are_evicted(clock, loader):
+    cache = AsyncTTLCache(loader, ttl=10, max_entries=2)
+    await cache.get("mad")
+    await cache.get("bcn")
+    await cache.get("mad")
+    await cache.get("lhr")
+
+    assert len(cache) == 2 and cache.evictions == 1
+    assert await cache.get("mad") == "mad:1"
+    assert await cache.get("bcn") == "bcn:4"
+
+
+async def test_invalidate(clock, loader):
+    cache = AsyncTTLCache(loader, ttl=10)
+    await cache.get("mad")
+    await cache.get("bcn")
+
+    cache.invalidate("mad")
+    assert await cache.get("mad") == "mad:3"
+    cache.invalidate()
+    assert len(cache) == 0
@@ -6,9 +6,26 @@ CREATE TABLE airports (
   name TEXT NOT NULL,
   country TEXT,
   elevation_ft INTEGER,
-  location GEOGRAPHY(Point, 4326)
+  location GEOGRAPHY(Point, 4326),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
 
+-- Bumped on every update, so the API workers' airport caches notice
+-- in-place changes (their fingerprint includes max(updated_at))
+CREATE FUNCTION airports_set_updated_at() RETURNS trigger AS $$
+BEGIN
+  NEW.updated_at := now();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER airports_updated_at
+BEFORE UPDATE ON airports
+FOR EACH ROW EXECUTE FUNCTION airports_set_updated_at();
+
+CREATE INDEX idx_airports_updated_at
+ON airports (updated_at);
+
 CREATE INDEX idx_airports_location
 ON airports
 USING GIST (location);